@@ -88,6 +88,8 @@ class Action:
         self.output_file_parsers = output_file_parsers or []
         self.conditions = conditions or []
 
+        self._resolved_actions = None  # assigned on first call to `resolve_actions`
+
     @classmethod
     def from_spec(cls, spec, all_envs, parameters, cmd_files):
         """Parse an Action definition from a JSON-like dict.
@@ -145,15 +147,7 @@ class Action:
         output_file_parser: OutputFileParser = None,
         commands: List[Command] = None,
     ):
-        print(f"relevant_scopes: {relevant_scopes}")
-        print(f"self.environments: {self.environments}")
-        print(
-            f"[i.scope.typ for i in self.environments]: {[i.scope.typ for i in self.environments]}"
-        )
-        possible = [
-            i.scope.type for i in self.environments if i.scope.typ in relevant_scopes
-        ]
-        print(f"possible: {possible}")
+        possible = [i for i in self.environments if i.scope.typ in relevant_scopes]
         if not possible:
             if input_file_generator:
                 msg = f"input file generator {input_file_generator!r}."
@@ -166,7 +160,7 @@ class Action:
             )
 
         # sort by scope specificity:
-        possible_srt = sorted(possible, key=lambda i: i.scope.value, reverse=True)
+        possible_srt = sorted(possible, key=lambda i: i.scope.typ.value, reverse=True)
         return possible_srt[0]
 
     def get_input_file_generator_action_env(
@@ -197,66 +191,77 @@ class Action:
             commands=self.commands,
         )
 
-    def resolve_actions(self):
+    def resolve_actions(self) -> Tuple["ResolvedAction"]:
+        """Get the resolved actions of this action.
+
+        Resolution depends only on the action definition, so the result is computed once
+        and the same (immutable) resolved actions are returned on subsequent calls.
+
+        """
+        if self._resolved_actions is not None:
+            return self._resolved_actions
 
+        conditions = tuple(self.conditions)
         cmd_acts = []
         for i in self.input_file_generators:
             act_i = InputFileGeneratorAction(
                 input_file_generator=i,
-                conditions=self.conditions,
-                environment=self.get_input_file_generator_action_env(i),
+                conditions=conditions,
+                environment=self.get_input_file_generator_action_env(i).environment,
             )
             cmd_acts.append(act_i)
 
         cmd_acts.append(
             CommandsAction(
-                commands=self.commands,
-                environment=self.get_commands_action_env(),
-                conditions=self.conditions,
+                commands=tuple(self.commands),
+                environment=self.get_commands_action_env().environment,
+                conditions=conditions,
             )
         )
 
         for i in self.output_file_parsers:
             act_i = OutputFileParserAction(
                 output_file_parser=i,
-                environment=self.get_output_file_parser_action_env(i),
-                conditions=self.conditions,
+                environment=self.get_output_file_parser_action_env(i).environment,
+                conditions=conditions,
             )
             cmd_acts.append(act_i)
 
-        return cmd_acts
+        self._resolved_actions = tuple(cmd_acts)
+        return self._resolved_actions
 
 
-@dataclass
+@dataclass(frozen=True)
 class ResolvedAction:
-    """"""
+    """Resolved actions are immutable, so they can be shared between all elements (and
+    tasks) that use the same action."""
 
     environment: Environment
-    conditions: List[ActionCondition]
+    conditions: Tuple[ActionCondition]
 
     def __post_init__(self):
         # select correct environment
         pass
 
 
-@dataclass
+@dataclass(frozen=True)
 class CommandsAction(ResolvedAction):
     """Represents an action without any associated input file generators and output
     parsers."""
 
-    commands: List[Command]
+    commands: Tuple[Command]
 
 
-@dataclass
+@dataclass(frozen=True)
 class InputFileGeneratorAction(ResolvedAction):
     input_file_generator: InputFileGenerator
 
     def __post_init__(self):
-        self.conditions = (
-            []
+        object.__setattr__(
+            self, "conditions", ()
         )  # TODO: add a condition, according to non-presence of input file?
 
 
-@dataclass
+@dataclass(frozen=True)
 class OutputFileParserAction(ResolvedAction):
     output_file_parser: OutputFileParser
@@ -0,0 +1,140 @@
+"""Module containing a content-addressed store of files that are shared between element
+directories."""
+
+import errno
+import hashlib
+import os
+from pathlib import Path
+import stat
+import tempfile
+from typing import Union
+
+_HASH_BUFFER_SIZE = 2**20
+
+
+def hash_file(path: Union[Path, str]) -> str:
+    """Get the SHA-256 hex digest of a file's contents."""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while True:
+            buf = fh.read(_HASH_BUFFER_SIZE)
+            if not buf:
+                break
+            hasher.update(buf)
+    return hasher.hexdigest()
+
+
+class BlobStore:
+    """A directory of files named by the SHA-256 hash of their contents.
+
+    Files with identical contents are stored once and hard-linked into their
+    destinations. If a hard link cannot be made (e.g. if the destination is on a
+    different file system), a symbolic link is made instead. Stored files are made
+    read-only, so that modifying a linked file in place fails rather than changing the
+    contents seen by other elements.
+
+    Parameters
+    ----------
+    root
+        Directory in which to store files.
+
+    """
+
+    def __init__(self, root: Union[Path, str]):
+        self.root = Path(root)
+
+    def get_blob_path(self, content_hash: str) -> Path:
+        return self.root.joinpath(content_hash[:2], content_hash[2:])
+
+    def __contains__(self, content_hash: str):
+        return self.get_blob_path(content_hash).is_file()
+
+    def _store(self, tmp_path: Path, content_hash: str) -> Path:
+        """Move a temporary file into the store, unless a blob with the same hash is
+        already present. Concurrent stores of the same contents are safe, since the
+        move is atomic and the contents are identical."""
+        blob = self.get_blob_path(content_hash)
+        if blob.is_file():
+            tmp_path.unlink()
+        else:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(tmp_path, blob)
+        return blob
+
+    def _make_temp_path(self) -> Path:
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp_")
+        os.close(fd)
+        return Path(tmp_path)
+
+    def add_bytes(self, data: bytes) -> str:
+        """Store data and return its hash."""
+        content_hash = hashlib.sha256(data).hexdigest()
+        if content_hash not in self:
+            tmp_path = self._make_temp_path()
+            tmp_path.write_bytes(data)
+            self._store(tmp_path, content_hash)
+        return content_hash
+
+    def add_file(self, path: Union[Path, str]) -> str:
+        """Store a copy of an existing file, unless its contents are already stored, and
+        return its hash.
+
+        The file is hashed as it is copied, in a single pass, so the stored contents
+        always match their hash, even if the file is modified concurrently.
+
+        """
+        tmp_path = self._make_temp_path()
+        hasher = hashlib.sha256()
+        try:
+            with open(path, "rb") as src, open(tmp_path, "wb") as dst:
+                while True:
+                    buf = src.read(_HASH_BUFFER_SIZE)
+                    if not buf:
+                        break
+                    hasher.update(buf)
+                    dst.write(buf)
+        except BaseException:
+            tmp_path.unlink()
+            raise
+        content_hash = hasher.hexdigest()
+        self._store(tmp_path, content_hash)
+        return content_hash
+
+    def link(self, content_hash: str, dest: Union[Path, str]):
+        """Link a stored file to a destination path, replacing any existing file."""
+        blob = self.get_blob_path(content_hash)
+        dest = Path(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if dest.is_symlink() or dest.exists():
+            dest.unlink()
+        try:
+            os.link(blob, dest)
+        except OSError as err:
+            if err.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+            dest.symlink_to(blob.resolve())
+
+    def ingest(self, path: Union[Path, str]) -> str:
+        """Replace an existing file with a link to its stored contents, and return the
+        hash of the contents."""
+        path = Path(path)
+        content_hash = hash_file(path)
+        blob = self.get_blob_path(content_hash)
+        if blob.is_file():
+            self.link(content_hash, path)
+        else:
+            # move the file itself into the store, avoiding a copy:
+            tmp_path = self._make_temp_path()
+            try:
+                os.replace(path, tmp_path)
+            except OSError as err:
+                if err.errno != errno.EXDEV:
+                    raise
+                tmp_path.unlink()
+                content_hash = self.add_file(path)
+            else:
+                self._store(tmp_path, content_hash)
+            self.link(content_hash, path)
+        return content_hash
@@ -20,5 +20,20 @@ def make_workflow():
     pass
 
 
+@cli.command()
+@click.argument("path", type=click.Path(file_okay=False))
+@click.option("--num-elements", default=100_000, show_default=True)
+@click.option("--num-element-ops", default=100, show_default=True)
+def benchmark_store(path, num_elements, num_element_ops):
+    """Benchmark the chunking and compression settings of workflow store arrays on the
+    file system of PATH."""
+    from hpcflow.store_benchmark import format_benchmark_results, run_store_benchmark
+
+    results = run_store_benchmark(
+        path, num_elements=num_elements, num_element_ops=num_element_ops
+    )
+    click.echo(format_benchmark_results(results))
+
+
 if __name__ == "__main__":
     cli()
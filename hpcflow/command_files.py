@@ -1,4 +1,9 @@
+from collections import OrderedDict
 from dataclasses import dataclass
+import hashlib
+import locale
+import mmap
+import os
 from pathlib import Path
 from re import I
 from typing import Dict, List, Union
@@ -98,6 +103,136 @@ class OutputFileParser:
         return cls(output, output_files)
 
 
+# files at least this large (in bytes) are memory-mapped rather than read:
+MMAP_THRESHOLD = 2**20
+
+# map of absolute file path to a content entry, ordered by most recent use:
+_FILE_CONTENTS_CACHE = OrderedDict()
+FILE_CONTENTS_CACHE_SIZE = 256  # maximum number of entries
+FILE_CONTENTS_CACHE_BYTES = 2**26  # maximum total size of the files of cached contents
+_file_contents_cache_bytes = 0
+
+
+def hash_contents(data) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _encode_contents(text: str) -> bytes:
+    # the inverse of `_decode_contents`, i.e. as when writing in text mode:
+    return text.encode(locale.getpreferredencoding(False))
+
+
+def _decode_contents(data) -> str:
+    # as when reading in text mode, with universal newlines:
+    text = str(data, locale.getpreferredencoding(False))
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def _get_cache_entry(key: str, stat: os.stat_result):
+    """Get the cache entry of a file, or `None` if there is no entry or the file has
+    been modified since the entry was made."""
+    entry = _FILE_CONTENTS_CACHE.get(key)
+    if entry is None or (entry["mtime"], entry["size"]) != (
+        stat.st_mtime_ns,
+        stat.st_size,
+    ):
+        return None
+    _FILE_CONTENTS_CACHE.move_to_end(key)
+    return entry
+
+
+def _get_entry_bytes(entry: Dict) -> int:
+    return entry["size"] if "contents" in entry else 0
+
+
+def _put_cache_entry(key: str, entry: Dict):
+    """Add an entry to the cache, evicting the least recently used entries while the
+    cache has too many entries, or the cached contents are too large in total. The
+    contents of files larger than the whole cache are not cached, only their hash."""
+    global _file_contents_cache_bytes
+    old = _FILE_CONTENTS_CACHE.pop(key, None)
+    if old is not None:
+        _file_contents_cache_bytes -= _get_entry_bytes(old)
+    if _get_entry_bytes(entry) > FILE_CONTENTS_CACHE_BYTES:
+        entry = {k: v for k, v in entry.items() if k != "contents"}
+    _FILE_CONTENTS_CACHE[key] = entry
+    _file_contents_cache_bytes += _get_entry_bytes(entry)
+    while (
+        len(_FILE_CONTENTS_CACHE) > FILE_CONTENTS_CACHE_SIZE
+        or _file_contents_cache_bytes > FILE_CONTENTS_CACHE_BYTES
+    ):
+        _, evicted = _FILE_CONTENTS_CACHE.popitem(last=False)
+        _file_contents_cache_bytes -= _get_entry_bytes(evicted)
+
+
+def get_file_hash(path: Path) -> str:
+    """Get the SHA-256 hex digest of a file's bytes, without decoding the file.
+
+    The hash is cached by path, as by `get_file_contents`, and the file is only read
+    again if its modification time or size has changed.
+
+    """
+    key = os.path.abspath(path)
+    stat = os.stat(key)
+    entry = _get_cache_entry(key, stat)
+    if entry is None:
+        with open(key, "rb") as fh:
+            if stat.st_size >= MMAP_THRESHOLD:
+                with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    content_hash = hash_contents(mm)
+            else:
+                content_hash = hash_contents(fh.read())
+        entry = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "hash": content_hash}
+        _put_cache_entry(key, entry)
+    return entry["hash"]
+
+
+def get_file_contents(path: Path) -> Dict:
+    """Get the text contents and content hash of a file.
+
+    Contents are cached by path, and the file is only read again if its modification
+    time or size has changed. The cache is bounded by number of entries and by the
+    total size of the cached files (see `FILE_CONTENTS_CACHE_BYTES`). Large files are
+    memory-mapped, so the hash is computed without reading the file into a buffer; the
+    decoded text is a copy, as for small files.
+
+    Returns
+    -------
+    entry : dict with keys:
+        contents : str
+        hash : str
+            SHA-256 hex digest of the file's bytes.
+
+    """
+    key = os.path.abspath(path)
+    stat = os.stat(key)
+    entry = _get_cache_entry(key, stat)
+    if entry is None or "contents" not in entry:
+        with open(key, "rb") as fh:
+            if stat.st_size >= MMAP_THRESHOLD:
+                with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    contents, content_hash = _decode_contents(mm), hash_contents(mm)
+            else:
+                data = fh.read()
+                contents, content_hash = _decode_contents(data), hash_contents(data)
+        entry = {
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "contents": contents,
+            "hash": content_hash,
+        }
+        _put_cache_entry(key, entry)
+    return entry
+
+
+def clear_file_contents_cache():
+    global _file_contents_cache_bytes
+    _FILE_CONTENTS_CACHE.clear()
+    _file_contents_cache_bytes = 0
+
+
 class _FileContentsSpecifier:
     """Class to represent the contents of a file, either via a file-system path or directly."""
 
@@ -106,6 +241,7 @@ class _FileContentsSpecifier:
     ):
         self.path = Path(path) if path is not None else path
         self._contents = contents
+        self._contents_hash = None
         self.extension = extension
 
         if (path is not None and contents is not None) or (
@@ -116,11 +252,26 @@ class _FileContentsSpecifier:
     @property
     def contents(self):
         if self.path is not None:
-            with self.path.open("r") as fh:
-                contents = fh.read()
-        else:
-            contents = self._contents
-        return contents
+            return get_file_contents(self.path)["contents"]
+        return self._contents
+
+    @property
+    def contents_hash(self):
+        """SHA-256 hex digest of the contents as bytes, e.g. for detecting identical
+        sources; see `contents_bytes`."""
+        if self.path is not None:
+            return get_file_hash(self.path)
+        if self._contents_hash is None:
+            self._contents_hash = hash_contents(self.contents_bytes)
+        return self._contents_hash
+
+    @property
+    def contents_bytes(self) -> bytes:
+        """The bytes of the file, or of the directly specified contents encoded as a file
+        of those contents would be decoded (see `contents`)."""
+        if self.path is not None:
+            return self.path.read_bytes()
+        return _encode_contents(self._contents)
 
 
 class InputFile(_FileContentsSpecifier):
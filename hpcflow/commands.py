@@ -1,5 +1,219 @@
 from dataclasses import dataclass
-from typing import List, Any
+import re
+import shlex
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+from hpcflow.command_files import FileSpec
+from hpcflow.parameters import Parameter
+
+PLACEHOLDER_PATTERN = re.compile(r"<<(executable|parameter|file):(\w+)>>")
+
+
+@dataclass(frozen=True)
+class Placeholder:
+    """A reference within a command to a value that is substituted on rendering.
+
+    Attributes
+    ----------
+    kind : str
+        One of "executable", "parameter" or "file".
+    name : str
+        Executable label, parameter type or file label.
+
+    """
+
+    kind: str
+    name: str
+
+
+def _parse_segments(string: str) -> Tuple[Union[str, Placeholder]]:
+    segments = []
+    pos = 0
+    for match in PLACEHOLDER_PATTERN.finditer(string):
+        if match.start() > pos:
+            segments.append(string[pos : match.start()])
+        segments.append(Placeholder(match.group(1), match.group(2)))
+        pos = match.end()
+    if pos < len(string):
+        segments.append(string[pos:])
+    return tuple(segments)
+
+
+def _get_argument_segments(argument) -> Tuple[Union[str, Placeholder]]:
+    if isinstance(argument, str):
+        return _parse_segments(argument)
+    segments = []
+    for part in argument.parts:
+        if isinstance(part, Parameter):
+            segments.append(Placeholder("parameter", part.typ))
+        elif isinstance(part, FileSpec):
+            segments.append(Placeholder("file", part.label))
+        else:
+            segments.extend(_parse_segments(str(part)))
+    return tuple(segments)
+
+
+class CommandTemplate:
+    """A command compiled into literal segments and placeholders, so it can be rendered
+    for many elements without re-parsing.
+
+    Within the command string (and string arguments), placeholders are written as
+    `<<executable:label>>`, `<<parameter:type>>` or `<<file:label>>`. Parameter and
+    file parts of a `CommandArgument` become placeholders too.
+
+    Parameters
+    ----------
+    line_segments
+        Segments of the command as a single shell line.
+    command_string
+        The command string, which is split into an argument vector only when the
+        command is rendered as one (see `argv_segments`).
+    argument_segments
+        Segments of each of the command's arguments.
+
+    """
+
+    def __init__(self, line_segments, command_string, argument_segments):
+        self.line_segments = line_segments
+        self.command_string = command_string
+        self.argument_segments = argument_segments
+        self._argv_segments = None
+
+    @classmethod
+    def compile(cls, command: "Command"):
+        arguments = tuple(_get_argument_segments(i) for i in command.arguments or ())
+        line_segments = list(_parse_segments(command.command))
+        for arg in arguments:
+            line_segments.append(" ")
+            line_segments.extend(arg)
+        for symbol, stream in (
+            ("<", command.stdin),
+            (">", command.stdout),
+            ("2>", command.stderr),
+        ):
+            if stream:
+                line_segments.append(f" {symbol} ")
+                line_segments.extend(_parse_segments(stream))
+
+        return cls(tuple(line_segments), command.command, arguments)
+
+    @property
+    def argv_segments(self) -> Tuple[Tuple[Union[str, Placeholder]]]:
+        """Segments of each item of the command's argument vector.
+
+        The command string is split (as by a POSIX shell) on first access, so commands
+        that are only rendered as shell lines need not be splittable.
+
+        Raises
+        ------
+        ValueError
+            If the command string cannot be split, e.g. because of unmatched quotes.
+
+        """
+        if self._argv_segments is None:
+            try:
+                words = shlex.split(self.command_string)
+            except ValueError as err:
+                raise ValueError(
+                    f"Command {self.command_string!r} cannot be split into an "
+                    f"argument vector: {err}."
+                ) from None
+            self._argv_segments = (
+                tuple(_parse_segments(i) for i in words) + self.argument_segments
+            )
+        return self._argv_segments
+
+    @property
+    def executable_labels(self) -> Tuple[str]:
+        """Unique labels of executable placeholders, in order of first appearance."""
+        # the line segments include those of the command string and all arguments:
+        return tuple(
+            {
+                i.name: None
+                for i in self.line_segments
+                if isinstance(i, Placeholder) and i.kind == "executable"
+            }
+        )
+
+    @property
+    def placeholders(self) -> Tuple[Placeholder]:
+        """Unique parameter and file placeholders, in order of first appearance."""
+        return tuple(
+            {
+                i: None
+                for i in self.line_segments
+                if isinstance(i, Placeholder) and i.kind != "executable"
+            }
+        )
+
+    @staticmethod
+    def _render_segments(segments, executables, columns, num_elements, quote):
+        # concatenate runs of constant segments once; only placeholders vary:
+        parts = []
+        for seg in segments:
+            if isinstance(seg, Placeholder):
+                if seg.kind == "executable":
+                    seg = executables[seg.name].command
+                else:
+                    col = columns[seg]
+                    parts.append([quote(str(i)) for i in col])
+                    continue
+            if parts and isinstance(parts[-1], str):
+                parts[-1] += seg
+            else:
+                parts.append(seg)
+
+        if not any(isinstance(i, list) for i in parts):
+            return ["".join(parts)] * num_elements
+        parts = [[i] * num_elements if isinstance(i, str) else i for i in parts]
+        return ["".join(i) for i in zip(*parts)]
+
+    def render(
+        self, executables: Dict, columns: Dict[Placeholder, Sequence], num_elements: int
+    ) -> List[str]:
+        """Render the command as a shell line for each of a number of elements.
+
+        Parameters
+        ----------
+        executables
+            Executable instance for each executable label.
+        columns
+            For each parameter and file placeholder, one value per element. Values are
+            quoted for the shell.
+        num_elements
+            Number of elements to render.
+
+        """
+        return self._render_segments(
+            self.line_segments, executables, columns, num_elements, shlex.quote
+        )
+
+    def render_argv(
+        self, executables: Dict, columns: Dict[Placeholder, Sequence], num_elements: int
+    ) -> List[List[str]]:
+        """Render the command as an argument vector for each of a number of elements."""
+        items = []
+        for segments in self.argv_segments:
+            first = segments[0] if len(segments) == 1 else None
+            if isinstance(first, Placeholder) and first.kind == "executable":
+                # an executable command may itself comprise multiple arguments:
+                exe_argv = shlex.split(executables[first.name].command)
+                items.extend([i] * num_elements for i in exe_argv)
+            else:
+                items.append(
+                    self._render_segments(
+                        segments, executables, columns, num_elements, str
+                    )
+                )
+        return [list(i) for i in zip(*items)] if items else [[]] * num_elements
+
+    def render_shell(self, executables: Dict, variables: Dict[Placeholder, str]) -> str:
+        """Render the command as a single shell line in which each parameter and file
+        placeholder is replaced by a reference to the given shell variable."""
+        columns = {k: [f'"${{{v}}}"'] for k, v in variables.items()}
+        return self._render_segments(
+            self.line_segments, executables, columns, 1, lambda x: x
+        )[0]
 
 
 @dataclass
@@ -11,10 +225,27 @@ class Command:
     stderr: str = None
     stdin: str = None
 
+    def __post_init__(self):
+        self._template = None
+
     @classmethod
     def from_spec(cls, spec):
         return cls(**spec)
 
+    @property
+    def template(self) -> CommandTemplate:
+        """The compiled command, which is compiled on first access."""
+        if self._template is None:
+            self._template = CommandTemplate.compile(self)
+        return self._template
+
+    @property
+    def executable_labels(self):
+        """Get the labels of executables referenced via the syntax
+        `<<executable:label>>`, in the command string, its arguments or its redirected
+        streams."""
+        return self.template.executable_labels
+
 
 @dataclass
 class CommandArgument:
@@ -0,0 +1,182 @@
+"""Module containing a vectorised evaluator of action conditions, which decides which
+elements of a task run which actions."""
+
+from functools import reduce
+from numbers import Number
+from typing import List, Tuple
+
+import numpy as np
+from valida.conditions import (
+    ConditionAnd,
+    ConditionBinaryOp,
+    ConditionLike,
+    ConditionOr,
+    ConditionXor,
+    NullCondition,
+    ValueLike,
+)
+
+# valida callables (by name) that have an equivalent numpy operation on a numeric
+# column:
+VECTORISED_CALLABLES = {
+    "equal_to": lambda x, value: x == value,
+    "not_equal_to": lambda x, value: x != value,
+    "less_than": lambda x, value: x < value,
+    "greater_than": lambda x, value: x > value,
+    "less_than_or_equal_to": lambda x, value: x <= value,
+    "greater_than_or_equal_to": lambda x, value: x >= value,
+    "in_": lambda x, value: np.isin(x, list(value)),
+    "not_in": lambda x, value: ~np.isin(x, list(value)),
+    "in_range": lambda x, lower, upper: (x >= lower) & (x < upper) & (x == np.floor(x)),
+    "equal_to_approx": lambda x, value, tolerance: np.abs(x - value) < tolerance,
+    "truthy": lambda x: x != 0,
+    "falsy": lambda x: x == 0,
+    "null": lambda x: np.ones(x.shape, dtype=bool),
+}
+
+_BINARY_OPS = {
+    ConditionAnd: np.logical_and,
+    ConditionOr: np.logical_or,
+    ConditionXor: np.logical_xor,
+}
+
+
+def _is_numeric_arg(arg):
+    if isinstance(arg, (list, tuple, set)):
+        return all(_is_numeric_arg(i) for i in arg)
+    return isinstance(arg, Number)
+
+
+def _get_numeric_column(values: List):
+    """Get the values as a one-dimensional numeric array, or `None` if they are not all
+    numbers."""
+    if not all(isinstance(i, Number) for i in values):
+        return None
+    column = np.asarray(values)
+    if column.ndim != 1 or column.dtype.kind not in "biuf":
+        return None
+    return column
+
+
+def _test_each(condition: ConditionLike, values: List) -> np.ndarray:
+    # conditions are often evaluated against few distinct values (e.g. a sequence of
+    # one parameter combined with another), so test each distinct value only once:
+    results = {}
+    out = np.empty(len(values), dtype=bool)
+    for idx, val in enumerate(values):
+        try:
+            out[idx] = results[val]
+        except KeyError:
+            out[idx] = results[val] = condition.test(val)
+        except TypeError:  # unhashable
+            out[idx] = condition.test(val)
+    return out
+
+
+def evaluate_condition(condition: ConditionLike, values: List) -> np.ndarray:
+    """Evaluate a valida condition against each value of a parameter column.
+
+    Value conditions whose callable has a numpy equivalent are evaluated in a single
+    vectorised operation if the column is numeric; all other conditions are tested
+    value-by-value.
+
+    Parameters
+    ----------
+    condition
+        The condition to evaluate.
+    values
+        The parameter value of each element.
+
+    Returns
+    -------
+    result
+        Boolean array with one item per value.
+
+    """
+    if condition is None or isinstance(condition, NullCondition):
+        return np.ones(len(values), dtype=bool)
+
+    if isinstance(condition, ConditionBinaryOp):
+        return reduce(
+            _BINARY_OPS[type(condition)],
+            (evaluate_condition(i, values) for i in condition.children),
+        )
+
+    func = condition.callable
+    vec_func = VECTORISED_CALLABLES.get(func.name)
+    if (
+        vec_func
+        and isinstance(condition, ValueLike)
+        and condition.PRE_PROCESSOR is None
+        and all(_is_numeric_arg(i) for i in (*func.args, *func.kwargs.values()))
+    ):
+        column = _get_numeric_column(values)
+        if column is not None:
+            return np.asarray(vec_func(column, *func.args, **func.kwargs), dtype=bool)
+
+    return _test_each(condition, values)
+
+
+def evaluate_action_conditions(
+    workflow_template, task_index: int, element_indices=None
+) -> np.ndarray:
+    """Evaluate the conditions of all actions of a task against all of its elements, or
+    against the given elements.
+
+    Parameters
+    ----------
+    workflow_template
+        The workflow template containing the task.
+    task_index
+        Index of the task within the workflow template.
+    element_indices
+        Task-local indices of the elements to evaluate. By default, all elements.
+
+    Returns
+    -------
+    inclusion
+        Boolean array of shape (number of elements, number of actions), where actions
+        are those of each task schema in turn. An item is True if all conditions of that
+        action hold for that element.
+
+    """
+    task = workflow_template.tasks[task_index]
+    actions = [act for schema in task.template.schemas for act in schema.actions]
+    num_elems = task.num_elements if element_indices is None else len(element_indices)
+    inclusion = np.ones((num_elems, len(actions)), dtype=bool)
+
+    columns = {}  # parameter columns are gathered once per path
+    for act_idx, action in enumerate(actions):
+        for act_cond in action.conditions:
+            path = tuple(act_cond.path)
+            if path not in columns:
+                columns[path] = workflow_template.get_input_values(
+                    task_index, path, element_indices
+                )
+            inclusion[:, act_idx] &= evaluate_condition(
+                act_cond.condition, columns[path]
+            )
+
+    return inclusion
+
+
+def split_condition_signatures(task_template, inclusion_row) -> Tuple[Tuple[bool]]:
+    """Split a row of an action inclusion array into one condition signature per task
+    schema."""
+    out = []
+    start = 0
+    for schema in task_template.schemas:
+        stop = start + len(schema.actions)
+        out.append(tuple(bool(i) for i in inclusion_row[start:stop]))
+        start = stop
+    return tuple(out)
+
+
+def get_element_resolved_actions(task_template, condition_signatures) -> Tuple:
+    """Get the resolved actions of all schemas of a task, given the condition signature
+    of each schema for a particular element."""
+    return tuple(
+        res_act
+        for schema, sig in zip(task_template.schemas, condition_signatures)
+        for res_act in schema.resolve_actions(sig)
+    )
@@ -1,17 +1,10 @@
-import datetime
-import enum
-
 import zarr
 
-from hpcflow.utils import make_workflow_id, get_time_stamp
+from hpcflow.history import WorkflowHistory, WorkflowInteraction
+from hpcflow.utils import make_workflow_id
 from hpcflow.config import Config
 
 
-class WorkflowInteraction(enum.Enum):
-
-    CREATE = 0
-
-
 class Workflow:
     def __init__(self, tasks):
         self.tasks = tasks
@@ -46,10 +39,5 @@ def make_workflow():
     store = zarr.DirectoryStore(f"workflow_{id_}.zarr")
     root = zarr.group(store=store, overwrite=True)
     parameter_group = root.create_group("parameters")
-    history_group = root.create_group("history")
-
-    ts_str = get_time_stamp()
-
-    make_history = history_group.create_group(ts_str)
-    make_history.attrs["timestamp"] = ts_str
-    make_history.attrs["interaction"] = WorkflowInteraction.CREATE.name
+    history = WorkflowHistory.create(root.create_group("history"))
+    history.append(WorkflowInteraction.CREATE)
@@ -0,0 +1,387 @@
+"""Module containing the dependency graphs of workflow tasks and elements, stored as
+compressed sparse row (CSR) index arrays."""
+
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+import zarr
+
+from hpcflow.errors import DependencyCycleError
+from hpcflow.storage import ArrayStorage
+
+
+def _gather(indptr: np.ndarray, indices: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+    """Get the concatenated neighbours of the given nodes, without a Python-level loop
+    over the nodes."""
+    starts = indptr[nodes]
+    counts = indptr[nodes + 1] - starts
+    total = counts.sum()
+    if not total:
+        return np.empty(0, dtype=indices.dtype)
+    # offset of each gathered position from the start of its node's slice:
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return indices[np.repeat(starts, counts) + offsets]
+
+
+@dataclass
+class CSRGraph:
+    """A directed graph in compressed sparse row form, in which the successors of node
+    `i` are `indices[indptr[i]:indptr[i + 1]]`.
+
+    Attributes
+    ----------
+    indptr : ndarray of int
+        Edge offsets of each node, of length one more than the number of nodes.
+    indices : ndarray of int
+        Successor of each edge, sorted within each node.
+
+    """
+
+    indptr: np.ndarray
+    indices: np.ndarray
+
+    @classmethod
+    def from_edges(cls, num_nodes: int, sources, targets):
+        """Make a graph from arrays of edge sources and targets. Duplicate edges are
+        removed."""
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if sources.size:
+            keys = np.unique(sources * num_nodes + targets)  # also sorts
+            sources, targets = np.divmod(keys, num_nodes)
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=num_nodes), out=indptr[1:])
+        return cls(indptr, targets)
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices)
+
+    @property
+    def edge_sources(self) -> np.ndarray:
+        """The source node of each edge."""
+        return np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+
+    def successors(self, node: int) -> np.ndarray:
+        return self.indices[self.indptr[node] : self.indptr[node + 1]]
+
+    def get_neighbours(self, nodes) -> np.ndarray:
+        """Get the concatenated successors of the given nodes, in the order of the
+        given nodes."""
+        return _gather(self.indptr, self.indices, np.asarray(nodes, dtype=np.int64))
+
+    def in_degree(self) -> np.ndarray:
+        return np.bincount(self.indices, minlength=self.num_nodes)
+
+    def transpose(self) -> "CSRGraph":
+        """Get the graph with all edges reversed."""
+        return self.from_edges(self.num_nodes, self.indices, self.edge_sources)
+
+    def get_levels(self) -> np.ndarray:
+        """Get the level of each node: zero for nodes without predecessors, and
+        otherwise one more than the maximum level of the node's predecessors.
+
+        Nodes are processed one level at a time, so the cost is proportional to the
+        number of edges plus the number of levels.
+
+        """
+        in_degree = self.in_degree()
+        levels = np.full(self.num_nodes, -1, dtype=np.int64)
+        frontier = np.flatnonzero(in_degree == 0)
+        level = 0
+        while frontier.size:
+            levels[frontier] = level
+            succ = _gather(self.indptr, self.indices, frontier)
+            np.subtract.at(in_degree, succ, 1)
+            succ = np.unique(succ)
+            frontier = succ[in_degree[succ] == 0]
+            level += 1
+        if (levels < 0).any():
+            raise DependencyCycleError(
+                f"Dependency graph contains a cycle involving nodes "
+                f"{np.flatnonzero(levels < 0)[:10].tolist()!r}."
+            )
+        return levels
+
+    def topological_order(self) -> np.ndarray:
+        """Get the nodes ordered so that each node comes after all its predecessors.
+        Nodes of the same level are ordered by node index."""
+        return np.argsort(self.get_levels(), kind="stable")
+
+    def closure(self, nodes) -> np.ndarray:
+        """Get the sorted indices of all nodes that are reachable from the given nodes
+        (excluding the given nodes, unless they are reachable from each other)."""
+        visited = np.zeros(self.num_nodes, dtype=bool)
+        frontier = np.unique(np.asarray(nodes, dtype=np.int64))
+        while frontier.size:
+            succ = np.unique(_gather(self.indptr, self.indices, frontier))
+            frontier = succ[~visited[succ]]
+            visited[frontier] = True
+        return np.flatnonzero(visited)
+
+    def get_ready(self, completed: np.ndarray) -> np.ndarray:
+        """Get the sorted indices of nodes that are not completed, but whose
+        predecessors are all completed.
+
+        Parameters
+        ----------
+        completed
+            Boolean array that is True for each completed node.
+
+        """
+        incomplete_edges = ~completed[self.edge_sources]
+        blocked = np.bincount(
+            self.indices[incomplete_edges], minlength=self.num_nodes
+        ).astype(bool)
+        return np.flatnonzero(~completed & ~blocked)
+
+
+class ReadyCounter:
+    """Track the nodes of a graph that become ready as nodes are completed, by counting
+    the incomplete predecessors of each node.
+
+    Completing nodes visits only their successors, so completing all nodes of a graph
+    costs time proportional to the number of edges, rather than to the number of edges
+    times the number of completion rounds, as repeated calls to `CSRGraph.get_ready`
+    would.
+
+    Parameters
+    ----------
+    graph
+        The graph whose nodes are tracked.
+    completed
+        Boolean array that is True for each node that is already completed.
+
+    """
+
+    def __init__(self, graph: CSRGraph, completed: np.ndarray):
+        self.graph = graph
+        incomplete_edges = ~completed[graph.edge_sources]
+        self.num_incomplete = np.bincount(
+            graph.indices[incomplete_edges], minlength=graph.num_nodes
+        )
+
+    def complete(self, nodes) -> np.ndarray:
+        """Mark nodes as completed, and get the sorted successors of those nodes that
+        no longer have any incomplete predecessors. Each node must be completed at most
+        once."""
+        succ = self.graph.get_neighbours(nodes)
+        np.subtract.at(self.num_incomplete, succ, 1)
+        succ = np.unique(succ)
+        return succ[self.num_incomplete[succ] == 0]
+
+
+@dataclass
+class WorkflowDAG:
+    """The dependency graphs of the tasks and elements of a workflow.
+
+    Element nodes are indexed by their workflow-level element index (i.e. their position
+    in `WorkflowTemplate.elements`). An edge from one element to another means that the
+    second element has an input that is an output of the first.
+
+    Attributes
+    ----------
+    task_graph : CSRGraph
+        Task dependency graph, including dependencies from input sources of upstream
+        task outputs.
+    element_graph : CSRGraph
+        Element dependency graph.
+    task_elements : CSRGraph
+        Bipartite map from each task to its element nodes, in task-local order.
+    element_task : ndarray of int
+        Task index of each element node.
+
+    """
+
+    task_graph: CSRGraph
+    element_graph: CSRGraph
+    task_elements: CSRGraph
+    element_task: np.ndarray
+    _element_graph_T: Optional[CSRGraph] = field(default=None, init=False, repr=False)
+    _element_local_index: Optional[np.ndarray] = field(
+        default=None, init=False, repr=False
+    )
+
+    _ARRAYS = {
+        "task_indptr": ("task_graph", "indptr"),
+        "task_indices": ("task_graph", "indices"),
+        "element_indptr": ("element_graph", "indptr"),
+        "element_indices": ("element_graph", "indices"),
+        "task_elements_indptr": ("task_elements", "indptr"),
+        "task_elements_indices": ("task_elements", "indices"),
+    }
+
+    @property
+    def num_tasks(self) -> int:
+        return self.task_graph.num_nodes
+
+    @property
+    def num_elements(self) -> int:
+        return self.element_graph.num_nodes
+
+    @property
+    def element_graph_T(self) -> CSRGraph:
+        """The element graph with edges reversed (from each element to its upstream
+        elements)."""
+        if self._element_graph_T is None:
+            self._element_graph_T = self.element_graph.transpose()
+        return self._element_graph_T
+
+    def get_element_nodes(self, task_index: int, element_indices=None) -> np.ndarray:
+        """Get the element nodes of (some of the) task-local elements of a task."""
+        nodes = self.task_elements.successors(task_index)
+        if element_indices is not None:
+            nodes = nodes[np.asarray(element_indices, dtype=np.int64)]
+        return nodes
+
+    def get_element_local_indices(self, nodes) -> np.ndarray:
+        """Get the task-local element index of each given element node."""
+        if self._element_local_index is None:
+            local = np.empty(self.num_elements, dtype=np.int64)
+            local[self.task_elements.indices] = np.arange(
+                self.task_elements.num_edges
+            ) - (
+                self.task_elements.indptr[self.element_task[self.task_elements.indices]]
+            )
+            self._element_local_index = local
+        return self._element_local_index[np.asarray(nodes, dtype=np.int64)]
+
+    def get_upstream_elements(self, nodes) -> np.ndarray:
+        """Get all element nodes that the given element nodes depend on, directly or
+        indirectly."""
+        return self.element_graph_T.closure(nodes)
+
+    def get_downstream_elements(self, nodes) -> np.ndarray:
+        """Get all element nodes that depend on the given element nodes, directly or
+        indirectly."""
+        return self.element_graph.closure(nodes)
+
+    def get_task_element_levels(self, task_index: int) -> np.ndarray:
+        """Get the level of each task-local element of a task, considering only the
+        dependencies between elements of that task (e.g. between loop iterations), so
+        that elements of the same level do not depend on each other."""
+        nodes = self.get_element_nodes(task_index)
+        local = np.full(self.num_elements, -1, dtype=np.int64)
+        local[nodes] = np.arange(len(nodes))
+        graph = self.element_graph
+        sources = local[graph.edge_sources]
+        targets = local[graph.indices]
+        keep = (sources >= 0) & (targets >= 0)
+        return CSRGraph.from_edges(
+            len(nodes), sources[keep], targets[keep]
+        ).get_levels()
+
+    def get_group_graph(self, groups) -> CSRGraph:
+        """Get the dependency graph between groups of element nodes (e.g. the elements
+        of job arrays), in which there is an edge from one group to another if any
+        element of the second group depends on an element of the first. Dependencies
+        within a group, and on elements that are in no group, are excluded.
+
+        Parameters
+        ----------
+        groups
+            Element nodes of each group. Each node may be in at most one group.
+
+        """
+        node_group = np.full(self.num_elements, -1, dtype=np.int64)
+        for group_idx, nodes in enumerate(groups):
+            node_group[np.asarray(nodes, dtype=np.int64)] = group_idx
+        graph = self.element_graph
+        sources = node_group[graph.edge_sources]
+        targets = node_group[graph.indices]
+        keep = (sources >= 0) & (targets >= 0) & (sources != targets)
+        return CSRGraph.from_edges(len(groups), sources[keep], targets[keep])
+
+    def get_ready_elements(self, completed: np.ndarray) -> np.ndarray:
+        """Get the element nodes that are not completed, but whose upstream elements are
+        all completed."""
+        return self.element_graph.get_ready(completed)
+
+    def save(self, group: zarr.Group, storage: Optional[ArrayStorage] = None):
+        """Write the graph arrays into a Zarr group, optionally with given chunking and
+        compression."""
+        arrays = {
+            name: getattr(getattr(self, graph), attr)
+            for name, (graph, attr) in self._ARRAYS.items()
+        }
+        arrays["element_task"] = self.element_task
+        for name, arr in arrays.items():
+            kwargs = storage.get_array_kwargs(len(arr), arr.dtype) if storage else {}
+            group.array(name, arr, overwrite=True, **kwargs)
+
+    @classmethod
+    def load(cls, group: zarr.Group):
+        """Read graph arrays written by `save`."""
+        graphs = {}
+        for name, (graph, attr) in cls._ARRAYS.items():
+            graphs.setdefault(graph, {})[attr] = group[name][:]
+        return cls(
+            element_task=group["element_task"][:],
+            **{k: CSRGraph(**v) for k, v in graphs.items()},
+        )
+
+
+def build_workflow_dag(workflow_template) -> WorkflowDAG:
+    """Derive the task and element dependency graphs of a workflow template from the
+    parameter data referenced by element inputs and outputs, and from task input
+    sources."""
+
+    elements = workflow_template.elements
+    mapping = workflow_template.parameter_mapping
+    num_tasks = len(workflow_template.tasks)
+    num_elements = len(elements)
+
+    element_task = np.empty(num_elements, dtype=np.int64)
+    for task_idx, elem_indices in enumerate(workflow_template.element_indices):
+        element_task[elem_indices] = task_idx
+    task_elements = CSRGraph(
+        indptr=np.concatenate(
+            [[0], np.cumsum([len(i) for i in workflow_template.element_indices])]
+        ).astype(np.int64),
+        indices=np.array(
+            [j for i in workflow_template.element_indices for j in i], dtype=np.int64
+        ),
+    )
+
+    # the element that produces each output data index:
+    producers = {}
+    for node, elem in enumerate(elements):
+        for output in elem["outputs"]:
+            data_idx = mapping[output["parameter_mapping_index"]][output["data_index"]]
+            producers[data_idx] = node
+
+    sources, targets = [], []
+    for node, elem in enumerate(elements):
+        for input_i in elem["inputs"]:
+            data_idx = mapping[input_i["parameter_mapping_index"]][
+                input_i["data_index"]
+            ]
+            producer = producers.get(data_idx)
+            if producer is not None and producer != node:
+                sources.append(producer)
+                targets.append(node)
+    element_graph = CSRGraph.from_edges(num_elements, sources, targets)
+
+    # task dependencies from element dependencies and from input sources:
+    task_sources = element_task[element_graph.edge_sources].tolist()
+    task_targets = element_task[element_graph.indices].tolist()
+    for task in workflow_template.tasks:
+        for input_sources in task.template.input_sources.values():
+            for source in input_sources or ():
+                if (
+                    source.source_type == "tasks"
+                    and source.task_source_type == "outputs"
+                ):
+                    task_sources.append(workflow_template.get_task_source_index(source))
+                    task_targets.append(task.index)
+    edges = [(i, j) for i, j in zip(task_sources, task_targets) if i != j]
+    task_graph = CSRGraph.from_edges(
+        num_tasks, [i[0] for i in edges], [i[1] for i in edges]
+    )
+
+    return WorkflowDAG(task_graph, element_graph, task_elements, element_task)
@@ -0,0 +1,139 @@
+"""Module containing functions to capture the environment variables that are set by the
+setup lines of an environment, so that the setup lines (e.g. module loads and conda
+activation) need only be run once, and the resulting variables replayed for later
+commands."""
+
+from dataclasses import dataclass, field
+import hashlib
+import os
+from pathlib import Path
+import subprocess
+from typing import Dict, List, Optional, Sequence
+
+from hpcflow.errors import EnvironmentSetupError
+
+# variables that bash sets itself, and which therefore differ regardless of the setup
+# lines:
+_IGNORED_VARS = {"_", "SHLVL", "PWD", "OLDPWD"}
+
+
+def get_setup_hash(setup: Sequence[str]) -> str:
+    """Get a hash that identifies a sequence of environment setup lines."""
+    return hashlib.sha256("\n".join(setup).encode()).hexdigest()
+
+
+@dataclass
+class EnvironmentSnapshot:
+    """The changes to environment variables made by some environment setup lines.
+
+    Attributes
+    ----------
+    setup_hash : str
+        Hash of the setup lines, as returned by `get_setup_hash`.
+    set_vars : dict of (str, str)
+        Variables that the setup lines added or modified.
+    unset_vars : list of str
+        Variables that the setup lines removed.
+
+    """
+
+    setup_hash: str
+    set_vars: Dict[str, str] = field(default_factory=lambda: {})
+    unset_vars: List[str] = field(default_factory=lambda: [])
+
+    def apply(self, env: Dict[str, str]) -> Dict[str, str]:
+        """Get a copy of an environment with the snapshot's changes applied."""
+        out = {k: v for k, v in env.items() if k not in self.unset_vars}
+        out.update(self.set_vars)
+        return out
+
+
+def capture_environment_snapshot(
+    setup: Sequence[str],
+    cwd: Optional[Path] = None,
+    base_env: Optional[Dict[str, str]] = None,
+) -> EnvironmentSnapshot:
+    """Run environment setup lines in a bash shell, and record how they change the
+    environment variables of `base_env` (by default, those of the current process).
+
+    Shell functions and aliases that the setup lines define are not captured.
+
+    """
+    if base_env is None:
+        base_env = dict(os.environ)
+    proc = subprocess.run(
+        ["bash", "-c", "\n".join(["{", *setup, "} >&2", "env -0"])],
+        cwd=cwd,
+        env=base_env,
+        capture_output=True,
+    )
+    if proc.returncode != 0:
+        raise EnvironmentSetupError(
+            f"Environment setup lines failed with exit code {proc.returncode}: "
+            f"{proc.stderr.decode(errors='replace').strip()}"
+        )
+    after = {}
+    for record in proc.stdout.split(b"\0"):
+        name, sep, value = record.decode(errors="surrogateescape").partition("=")
+        if sep:
+            after[name] = value
+
+    return EnvironmentSnapshot(
+        setup_hash=get_setup_hash(setup),
+        set_vars={
+            k: v
+            for k, v in after.items()
+            if k not in _IGNORED_VARS and base_env.get(k) != v
+        },
+        unset_vars=sorted(set(base_env) - set(after) - _IGNORED_VARS),
+    )
+
+
+class EnvironmentSnapshotCache:
+    """An in-memory cache of environment snapshots, keyed by the hash of their setup
+    lines, so the setup lines of each environment are run at most once."""
+
+    def __init__(self):
+        self._snapshots = {}
+
+    def __len__(self):
+        return len(self._snapshots)
+
+    def get(self, setup: Sequence[str], cwd: Optional[Path] = None):
+        """Get the snapshot of some setup lines, capturing it if it is not cached."""
+        setup_hash = get_setup_hash(setup)
+        try:
+            return self._snapshots[setup_hash]
+        except KeyError:
+            snapshot = capture_environment_snapshot(setup, cwd=cwd)
+            self._snapshots[setup_hash] = snapshot
+            return snapshot
+
+
+def get_snapshot_shell_lines(setup: Sequence[str], snapshot_dir: Path) -> List[str]:
+    """Get bash lines that source the environment snapshot of some setup lines if it
+    exists on the current host, and otherwise run the setup lines and save their
+    changes to exported variables as a snapshot for later jobs on the same host.
+
+    The snapshot file is written atomically, so jobs that run concurrently on the same
+    host may safely both capture it.
+
+    """
+    path = f"{snapshot_dir}/{get_setup_hash(setup)}_$(hostname).sh"
+    return [
+        f'HPCFLOW_ENV_SNAPSHOT="{path}"',
+        'if [ -f "${HPCFLOW_ENV_SNAPSHOT}" ]; then',
+        '    source "${HPCFLOW_ENV_SNAPSHOT}"',
+        "else",
+        "    declare -A HPCFLOW_ENV_BEFORE",
+        '    for v in $(compgen -e); do HPCFLOW_ENV_BEFORE["${v}"]="${!v}"; done',
+        *setup,
+        f'    mkdir -p "{snapshot_dir}"',
+        "    for v in $(compgen -e); do",
+        '        if [[ ! -v HPCFLOW_ENV_BEFORE["${v}"] || '
+        '"${HPCFLOW_ENV_BEFORE["${v}"]}" != "${!v}" ]]; then declare -p "${v}"; fi',
+        '    done > "${HPCFLOW_ENV_SNAPSHOT}.$$"',
+        '    mv "${HPCFLOW_ENV_SNAPSHOT}.$$" "${HPCFLOW_ENV_SNAPSHOT}"',
+        "    unset HPCFLOW_ENV_BEFORE",
+        "fi",
+    ]
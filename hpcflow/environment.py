@@ -20,10 +20,7 @@ class NumCores:
             self.step = 1
 
     def __contains__(self, x):
-        if x in range(self.start, self.stop + 1, self.step):
-            return True
-        else:
-            return False
+        return self.start <= x <= self.stop and (x - self.start) % self.step == 0
 
     def __eq__(self, other):
         if (
@@ -72,6 +69,12 @@ class Executable:
     def __post_init__(self):
         self.label = check_valid_py_identifier(self.label)
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name == "instances":
+            # invalidate the instance lookup index:
+            super().__setattr__("_index", None)
+
     def __eq__(self, other):
         if (
             type(self) == type(other)
@@ -82,13 +85,37 @@ class Executable:
             return True
         return False
 
+    def add_instance(self, instance: ExecutableInstance):
+        """Add an instance of this executable. `instances` should be modified only via
+        this method or by reassignment, so that the instance lookup index is rebuilt."""
+        self.instances.append(instance)
+        self._index = None
+
+    def _get_index(self):
+        """Get the instance lookup index, building it if `instances` has been modified
+        since it was last built."""
+        if self._index is None:
+            by_mode = {}
+            for i in self.instances:
+                by_mode.setdefault(i.parallel_mode, []).append(i)
+            self._index = {"all": list(self.instances), "by_mode": by_mode, "memo": {}}
+        return self._index
+
     def filter_instances(self, parallel_mode=None, num_cores=None):
-        out = []
-        for i in self.instances:
-            if parallel_mode is None or i.parallel_mode == parallel_mode:
-                if num_cores is None or num_cores in i.num_cores:
-                    out.append(i)
-        return out
+        index = self._get_index()
+        memo_key = (parallel_mode, num_cores)
+        try:
+            out = index["memo"][memo_key]
+        except KeyError:
+            if parallel_mode is None:
+                candidates = index["all"]
+            else:
+                candidates = index["by_mode"].get(parallel_mode, [])
+            out = [
+                i for i in candidates if num_cores is None or num_cores in i.num_cores
+            ]
+            index["memo"][memo_key] = out
+        return list(out)
 
     @classmethod
     def from_spec(cls, spec):
@@ -100,9 +127,27 @@ class Executable:
 
 @dataclass
 class Environment:
+    """A software environment in which commands are run.
+
+    Parameters
+    ----------
+    setup
+        Shell lines (e.g. module loads) that prepare the environment.
+    executables
+        Executables that are available within the environment.
+    snapshot_setup
+        If True, the environment variables set by the setup lines are captured the first
+        time the lines are run within a job (or by a local executor), and are then
+        replayed for later elements instead of running the setup lines again. This
+        should only be enabled if the setup lines have no effects other than setting
+        environment variables.
+
+    """
+
     name: str
     setup: Optional[Sequence] = None
     executables: Optional[List[Executable]] = field(default_factory=lambda: [])
+    snapshot_setup: bool = False
 
     def __post_init__(self):
         for i in self.executables:
@@ -117,6 +162,7 @@ class Environment:
                 self.setup = tuple(self.setup)
 
         self.executables = ExecutablesList(*self.executables)
+        self._executables_by_label = {}
 
         self._validate()
 
@@ -137,6 +183,18 @@ class Environment:
                 f"found label(s) multiple times: {dup_labels!r}"
             )
 
+    def get_executable_instance(self, label, parallel_mode=None, num_cores=None):
+        """Get the first instance of an executable that is compatible with the given
+        parallel mode and number of cores, or `None` if there is no such instance."""
+        if len(self._executables_by_label) != len(self.executables):
+            self._executables_by_label = {i.label: i for i in self.executables}
+        try:
+            exe = self._executables_by_label[label]
+        except KeyError:
+            exe = getattr(self.executables, label)  # raises a helpful AttributeError
+        instances = exe.filter_instances(parallel_mode, num_cores)
+        return instances[0] if instances else None
+
     @classmethod
     def from_spec(cls, spec):
         spec["executables"] = [
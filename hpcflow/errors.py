@@ -59,3 +59,27 @@ class MissingCompatibleActionEnvironment(Exception):
 
 class MissingActionEnvironment(Exception):
     pass
+
+
+class MissingCompatibleExecutableInstance(Exception):
+    pass
+
+
+class SubmissionFailure(Exception):
+    pass
+
+
+class InsufficientCoresError(Exception):
+    pass
+
+
+class EnvironmentSetupError(Exception):
+    pass
+
+
+class DependencyCycleError(Exception):
+    pass
+
+
+class JobArrayOrderError(Exception):
+    pass
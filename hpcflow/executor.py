@@ -0,0 +1,727 @@
+"""Module containing a local executor that runs the resolved actions of elements in a
+process pool."""
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+import heapq
+import os
+from pathlib import Path
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from hpcflow.actions import (
+    CommandsAction,
+    InputFileGeneratorAction,
+    OutputFileParserAction,
+)
+from hpcflow.blobs import BlobStore
+from hpcflow.conditions import (
+    evaluate_action_conditions,
+    get_element_resolved_actions,
+    split_condition_signatures,
+)
+from hpcflow.dag import ReadyCounter
+from hpcflow.env_snapshot import EnvironmentSnapshot, EnvironmentSnapshotCache
+from hpcflow.errors import InsufficientCoresError
+from hpcflow.metrics import RunMetrics
+from hpcflow.result_cache import (
+    ResultCache,
+    get_element_fingerprint,
+    get_element_output_files,
+)
+from hpcflow.scheduling import RuntimeHistory, get_schema_key
+from hpcflow.submission import (
+    get_element_main_resources,
+    get_placeholder_columns,
+    render_commands_action,
+    resolve_element_executables,
+)
+from hpcflow.utils import get_num_available_cores
+
+# `ru_maxrss` is reported in kibibytes, except on macOS, where it is in bytes:
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+# Names of the functions that input file generator and output file parser sources must
+# define:
+INPUT_FILE_GENERATOR_FUNC = "generate_input_file"  # (path, inputs) -> None
+OUTPUT_FILE_PARSER_FUNC = "parse_output"  # (files, options) -> output value
+
+
+@dataclass
+class ElementRun:
+    """The actions of a single element, reduced to plain data so they can be sent to a
+    worker process.
+
+    Attributes
+    ----------
+    steps : list of dict
+        Each step has a "type" key of "shell", "generate" or "parse". Shell steps whose
+        environment has `snapshot_setup` enabled have a "setup" key with the
+        environment setup lines, which are not included in the step's "lines"; the
+        executor replaces it with an "env_snapshot" key before the step is run.
+
+    """
+
+    task_index: int
+    element_index: int
+    working_dir: Path
+    steps: List[Dict]
+    num_cores: int = 1
+    parallel_mode: Optional[str] = None
+    priority: float = 0.0
+
+
+@dataclass
+class ElementRunResult:
+    task_index: int
+    element_index: int
+    exit_code: int
+    outputs: Dict[str, Any] = field(default_factory=lambda: {})
+    error: Optional[str] = None
+    from_cache: bool = False
+    metrics: Optional[RunMetrics] = None
+
+    @property
+    def success(self):
+        return self.exit_code == 0
+
+    @property
+    def wall_time(self) -> Optional[float]:
+        return self.metrics.wall_time if self.metrics else None
+
+
+def _get_step_env(run: ElementRun, env_snapshot: Optional[EnvironmentSnapshot] = None):
+    env = dict(os.environ)
+    if env_snapshot is not None:
+        env = env_snapshot.apply(env)
+    env["HPCFLOW_NUM_CORES"] = str(run.num_cores)
+    if run.parallel_mode == "openmp":
+        env["OMP_NUM_THREADS"] = str(run.num_cores)
+    return env
+
+
+def load_source_function(source: str, func_name: str):
+    namespace = {}
+    exec(compile(source, f"<{func_name}>", "exec"), namespace)
+    return namespace[func_name]
+
+
+def _run_shell(lines: List[str], cwd: Path, env: Dict):
+    """Run shell lines in bash, and return the exit code, the standard error, and the
+    resource usage of the shell (including the processes that it waited for), or `None`
+    if the resource usage of a single child process cannot be retrieved on this
+    platform."""
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(
+            ["bash", "-c", "\n".join(lines)],
+            cwd=cwd,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr,
+        )
+        if hasattr(os, "wait4"):
+            _, status, rusage = os.wait4(proc.pid, 0)
+            # as `Popen.returncode`: negative for termination by a signal
+            if os.WIFSIGNALED(status):
+                proc.returncode = -os.WTERMSIG(status)
+            else:
+                proc.returncode = os.WEXITSTATUS(status)
+        else:
+            proc.wait()
+            rusage = None
+        stderr.seek(0)
+        return proc.returncode, stderr.read().decode(errors="replace"), rusage
+
+
+def run_element(run: ElementRun) -> ElementRunResult:
+    """Execute the steps of an element in sequence, stopping at the first failure, and
+    record the run metrics."""
+    start_time = time.time()
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    child_usage = []
+    result = _run_steps(run, child_usage)
+    result.metrics = RunMetrics(
+        start_time=start_time,
+        end_time=time.time(),
+        wall_time=time.perf_counter() - start,
+        cpu_time=time.process_time()
+        - cpu_start
+        + sum(i.ru_utime + i.ru_stime for i in child_usage),
+        peak_rss=max((i.ru_maxrss * _MAXRSS_UNIT for i in child_usage), default=-1),
+        hostname=socket.gethostname(),
+    )
+    return result
+
+
+def _run_steps(run: ElementRun, child_usage: List) -> ElementRunResult:
+    run.working_dir.mkdir(parents=True, exist_ok=True)
+    outputs = {}
+    for step in run.steps:
+        try:
+            if step["type"] == "shell":
+                exit_code, stderr, rusage = _run_shell(
+                    step["lines"],
+                    cwd=run.working_dir,
+                    env=_get_step_env(run, step.get("env_snapshot")),
+                )
+                if rusage is not None:
+                    child_usage.append(rusage)
+                if exit_code != 0:
+                    return ElementRunResult(
+                        run.task_index,
+                        run.element_index,
+                        exit_code=exit_code,
+                        outputs=outputs,
+                        error=stderr.strip(),
+                    )
+            elif step["type"] == "generate":
+                func = load_source_function(step["source"], INPUT_FILE_GENERATOR_FUNC)
+                path = run.working_dir.joinpath(step["file_name"])
+                try:
+                    path.unlink()  # may be a read-only link from a prior run
+                except FileNotFoundError:
+                    pass
+                func(path, step["inputs"])
+                if step.get("blob_dir"):
+                    BlobStore(step["blob_dir"]).ingest(path)
+            elif step["type"] == "parse":
+                func = load_source_function(step["source"], OUTPUT_FILE_PARSER_FUNC)
+                files = {
+                    k: run.working_dir.joinpath(v.value(run.working_dir))
+                    for k, v in step["files"].items()
+                }
+                outputs[step["output"]] = func(files, step["options"])
+        except Exception as err:
+            return ElementRunResult(
+                run.task_index,
+                run.element_index,
+                exit_code=1,
+                outputs=outputs,
+                error=f"{err.__class__.__name__}: {err}",
+            )
+    return ElementRunResult(run.task_index, run.element_index, 0, outputs)
+
+
+def _get_source_contents(sources, attribute, obj):
+    for i in sources:
+        if getattr(i, attribute) == obj:
+            return i.contents
+    return None
+
+
+def build_element_runs(
+    workflow, task_index: int, element_indices: List[int], inclusion=None
+):
+    """Reduce the resolved actions of each given element of a task to an
+    `ElementRun`.
+
+    Elements that share included actions and resources are grouped, so that the
+    commands of each group are rendered for all of its elements at once.
+
+    Parameters
+    ----------
+    inclusion
+        Action inclusion array of the task, as returned by
+        `evaluate_action_conditions`, in which at least the rows of the given elements
+        have been evaluated. If not specified, it is evaluated.
+
+    """
+
+    task = workflow.tasks[task_index]
+    template = workflow.template
+    if inclusion is None:
+        inclusion = evaluate_action_conditions(template, task_index)
+
+    # (resources, signatures, resolved actions, executables, element positions):
+    groups = []
+    elem_info = []  # (group index, position within group, resources)
+    for elem_idx in element_indices:
+        resources = template.get_input_value(task_index, elem_idx, ("resources",))
+        signatures = split_condition_signatures(task.template, inclusion[elem_idx])
+        for group_idx, group in enumerate(groups):
+            if group[1] == signatures and group[0] == resources:
+                break
+        else:
+            resolved_actions = get_element_resolved_actions(task.template, signatures)
+            executables = resolve_element_executables(task, resources, resolved_actions)
+            groups.append((resources, signatures, resolved_actions, executables, []))
+            group_idx = len(groups) - 1
+        elem_info.append((group_idx, len(groups[group_idx][4]), resources))
+        groups[group_idx][4].append(elem_idx)
+
+    # render shell lines of each commands action, for all elements of each group:
+    shell_lines = []
+    for _, _, resolved_actions, executables, group_elems in groups:
+        columns = get_placeholder_columns(
+            workflow, task_index, group_elems, resolved_actions
+        )
+        shell_lines.append(
+            {
+                act_idx: render_commands_action(
+                    act,
+                    executables,
+                    columns,
+                    len(group_elems),
+                    include_setup=not act.environment.snapshot_setup,
+                )
+                for act_idx, act in enumerate(resolved_actions)
+                if isinstance(act, CommandsAction)
+            }
+        )
+
+    runs = []
+    for elem_idx, (group_idx, group_pos, resources) in zip(element_indices, elem_info):
+        resolved_actions = groups[group_idx][2]
+        main_res = get_element_main_resources(resources)
+        elem_dir = workflow.get_element_dir(task_index, elem_idx)
+
+        steps = []
+        for act_idx, act in enumerate(resolved_actions):
+            if isinstance(act, CommandsAction):
+                step = {
+                    "type": "shell",
+                    "lines": shell_lines[group_idx][act_idx][group_pos],
+                }
+                if act.environment.snapshot_setup and act.environment.setup:
+                    step["setup"] = act.environment.setup
+                steps.append(step)
+
+            elif isinstance(act, InputFileGeneratorAction):
+                gen = act.input_file_generator
+                source = _get_source_contents(
+                    task.template.input_file_generator_sources, "generator", gen
+                )
+                if source is None:
+                    continue  # assume the input file is provided
+                steps.append(
+                    {
+                        "type": "generate",
+                        "source": source,
+                        "file_name": gen.input_file.value(elem_dir),
+                        "blob_dir": workflow.blob_store.root,
+                        "inputs": {
+                            i.typ: template.get_input_value(
+                                task_index, elem_idx, ("inputs", i.typ)
+                            )
+                            for i in gen.inputs
+                        },
+                    }
+                )
+
+            elif isinstance(act, OutputFileParserAction):
+                parser = act.output_file_parser
+                source = _get_source_contents(
+                    task.template.output_file_parser_sources, "parser", parser
+                )
+                if source is None:
+                    continue
+                steps.append(
+                    {
+                        "type": "parse",
+                        "source": source,
+                        "output": parser.output.typ,
+                        "files": {i.label: i for i in parser.output_files},
+                        "options": parser.options or {},
+                    }
+                )
+
+        runs.append(
+            ElementRun(
+                task_index=task_index,
+                element_index=elem_idx,
+                working_dir=elem_dir,
+                steps=steps,
+                num_cores=main_res.get("num_cores", 1),
+                parallel_mode=main_res.get("parallel_mode"),
+            )
+        )
+    return runs
+
+
+class LocalExecutor:
+    """Run element action chains concurrently in a local process pool.
+
+    Each element occupies as many core "slots" as its resolved `num_cores`, so the
+    total number of cores in use never exceeds `max_cores`. Completed element outputs
+    are written to the workflow's parameter data in batches.
+
+    Parameters
+    ----------
+    max_cores
+        Number of core slots available. By default, the number of available cores.
+    batch_size
+        Number of completed elements to accumulate before writing their outputs.
+    result_cache
+        If specified, elements whose fingerprint is found in this cache are not run;
+        their cached outputs and output files are used instead. The results of elements
+        that are run are added to the cache. Tasks whose template has `memoise` set to
+        False do not use the cache.
+    env_snapshots
+        Cache of the environment variables set by the setup lines of environments that
+        have `snapshot_setup` enabled. By default, a new cache is used, so the setup
+        lines of each such environment are run once per executor.
+    runtime_history
+        If specified, the wall times of successful elements are recorded here.
+    policy
+        If specified, a scheduling policy (e.g. `CriticalPathPolicy`) whose
+        `get_priorities(workflow, dag)` method gives the priority of each element node
+        of a workflow. Among the elements that are ready to run, those with the highest
+        priority are started first.
+
+    """
+
+    def __init__(
+        self,
+        max_cores: Optional[int] = None,
+        batch_size: int = 100,
+        result_cache: Optional[ResultCache] = None,
+        env_snapshots: Optional[EnvironmentSnapshotCache] = None,
+        runtime_history: Optional[RuntimeHistory] = None,
+        policy=None,
+    ):
+        self.max_cores = max_cores or get_num_available_cores()
+        self.batch_size = batch_size
+        self.result_cache = result_cache
+        self.env_snapshots = env_snapshots or EnvironmentSnapshotCache()
+        self.runtime_history = runtime_history
+        self.policy = policy
+
+    def _check_cores(self, runs: List[ElementRun]):
+        for i in runs:
+            if i.num_cores > self.max_cores:
+                raise InsufficientCoresError(
+                    f"Element {i.element_index} of task {i.task_index} requires "
+                    f"{i.num_cores} cores, but only {self.max_cores} are available."
+                )
+
+    def run(
+        self, runs: List[ElementRun], on_batch=None, on_done=None
+    ) -> List[ElementRunResult]:
+        """Run elements, passing each batch of results to `on_batch` as they complete.
+
+        Elements are started in order of decreasing priority, and otherwise in the
+        given order, where possible, but a smaller element may be started ahead of a
+        larger one if only enough slots for the smaller one are free.
+
+        Parameters
+        ----------
+        runs
+            Elements to run.
+        on_batch
+            Called with each batch of (at least `batch_size`) results.
+        on_done
+            Called with the results that complete together, as soon as they complete.
+            It may return further elements to run.
+
+        """
+        self._check_cores(runs)
+
+        # queue pending elements by core count, so finding the next element that fits
+        # the free slots does not require a scan over all pending elements:
+        queues = {}
+        order = 0
+
+        def enqueue(new_runs):
+            nonlocal order
+            for run in new_runs:
+                queue = queues.setdefault(run.num_cores, [])
+                heapq.heappush(queue, (-run.priority, order, run))
+                order += 1
+
+        enqueue(runs)
+
+        results = []
+        batch = []
+        free = self.max_cores
+        running = {}
+        max_workers = self.max_cores if on_done else min(self.max_cores, len(runs) or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            while queues or running:
+                while True:
+                    heads = [(q[0][:2], n) for n, q in queues.items() if n <= free]
+                    if not heads:
+                        break
+                    num_cores = min(heads)[1]
+                    run = heapq.heappop(queues[num_cores])[2]
+                    if not queues[num_cores]:
+                        del queues[num_cores]
+                    free -= num_cores
+                    running[pool.submit(run_element, run)] = run
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                done_results = []
+                for fut in done:
+                    free += running.pop(fut).num_cores
+                    done_results.append(fut.result())
+                results.extend(done_results)
+                batch.extend(done_results)
+
+                if on_done is not None:
+                    new_runs = on_done(done_results)
+                    self._check_cores(new_runs)
+                    enqueue(new_runs)
+
+                if len(batch) >= self.batch_size or (not queues and not running):
+                    if on_batch and batch:
+                        on_batch(batch)
+                    batch = []
+
+        return results
+
+    def _get_task_context(self, workflow, task_index: int) -> Dict:
+        """Get the state that is shared by the preparation and storage of all elements
+        of a task: the result cache to use, if any, the task's action inclusion array,
+        the element fingerprints, and the task's input files and their content hashes.
+
+        Rows of the inclusion array are evaluated by `_prepare`, when elements are
+        prepared, so that the conditions of elements whose inputs are upstream outputs
+        are evaluated after those outputs are set.
+
+        """
+        task = workflow.tasks[task_index]
+        cache = self.result_cache if task.template.memoise else None
+        num_actions = sum(len(i.actions) for i in task.template.schemas)
+        return {
+            "cache": cache,
+            "inclusion": np.ones((task.num_elements, num_actions), dtype=bool),
+            "fingerprints": {},
+            "input_file_hashes": workflow.add_input_files_to_blob_store(task_index),
+        }
+
+    def _prepare(
+        self,
+        workflow,
+        task_index: int,
+        element_indices: List[int],
+        context: Dict,
+        priorities=None,
+        dag=None,
+    ):
+        """Write the input files of elements of a task, get the results of any elements
+        that are found in the result cache, and build runs for the remaining elements.
+
+        Parameters
+        ----------
+        context
+            State of the task, as returned by `_get_task_context`, which is updated
+            with the action inclusion and fingerprints of the elements.
+        priorities
+            Priority of each element node of the workflow's DAG `dag`, which must be
+            given with the priorities.
+
+        Returns
+        -------
+        cached : list of ElementRunResult
+            Results of elements found in the result cache, whose outputs have been
+            written to the workflow's parameter data.
+        runs : list of ElementRun
+
+        """
+        workflow.write_element_input_files(
+            task_index, element_indices, context["input_file_hashes"]
+        )
+        inclusion = context["inclusion"]
+        if element_indices:
+            inclusion[element_indices] = evaluate_action_conditions(
+                workflow.template, task_index, element_indices
+            )
+
+        cache = context["cache"]
+        cached = []
+        if cache is not None:
+            fingerprints = context["fingerprints"]
+            remaining = []
+            for elem_idx in element_indices:
+                fingerprints[elem_idx] = get_element_fingerprint(
+                    workflow, task_index, elem_idx, inclusion
+                )
+                elem_dir = workflow.get_element_dir(task_index, elem_idx)
+                outputs = cache.get(fingerprints[elem_idx], elem_dir)
+                if outputs is None:
+                    remaining.append(elem_idx)
+                else:
+                    cached.append(
+                        ElementRunResult(
+                            task_index, elem_idx, 0, outputs, from_cache=True
+                        )
+                    )
+            if cached:
+                workflow.set_element_outputs(
+                    task_index, {i.element_index: i.outputs for i in cached}
+                )
+            element_indices = remaining
+
+        runs = build_element_runs(workflow, task_index, element_indices, inclusion)
+        for run in runs:
+            for step in run.steps:
+                if "setup" in step:
+                    setup = step.pop("setup")
+                    step["env_snapshot"] = self.env_snapshots.get(setup, workflow.path)
+        if priorities is not None and runs:
+            nodes = dag.get_element_nodes(task_index, [i.element_index for i in runs])
+            for run, priority in zip(runs, priorities[nodes].tolist()):
+                run.priority = priority
+
+        return cached, runs
+
+    def _store_results(
+        self, workflow, task_index: int, results, context, store_outputs=True
+    ):
+        """Write the outputs of successful results of a task to the workflow's parameter
+        data (unless `store_outputs` is False, if they have already been written), add
+        them to the result cache, and record their wall times. The run metrics of all
+        results are appended to the workflow's metrics store."""
+        successful = [i for i in results if i.success]
+        if store_outputs:
+            workflow.set_element_outputs(
+                task_index, {i.element_index: i.outputs for i in successful}
+            )
+        workflow.metrics.append(task_index, results)
+        if self.runtime_history is not None:
+            wall_times = [i.wall_time for i in successful if i.wall_time is not None]
+            if wall_times:
+                self.runtime_history.record(
+                    get_schema_key(workflow.tasks[task_index].template), wall_times
+                )
+        cache = context["cache"]
+        if cache is not None:
+            for i in successful:
+                cache.put(
+                    context["fingerprints"][i.element_index],
+                    i.outputs,
+                    workflow.get_element_dir(task_index, i.element_index),
+                    get_element_output_files(
+                        workflow, task_index, i.element_index, context["inclusion"]
+                    ),
+                )
+
+    def execute(self, workflow, task_index: int, element_indices=None):
+        """Execute elements of a workflow task and write their outputs to the
+        workflow's parameter data."""
+        if element_indices is None:
+            element_indices = range(workflow.tasks[task_index].num_elements)
+        dag = priorities = None
+        if self.policy:
+            dag = workflow.dag
+            priorities = self.policy.get_priorities(workflow, dag)
+        context = self._get_task_context(workflow, task_index)
+        cached, runs = self._prepare(
+            workflow, task_index, list(element_indices), context, priorities, dag
+        )
+
+        def on_batch(batch):
+            self._store_results(workflow, task_index, batch, context)
+
+        return cached + self.run(runs, on_batch=on_batch)
+
+    def execute_workflow(self, workflow, filter=None):
+        """Execute elements of multiple tasks of a workflow, starting each element as
+        soon as the upstream elements that it depends on have succeeded, rather than
+        waiting for whole upstream tasks to complete.
+
+        Elements are dispatched as they become ready, which is tracked by counting the
+        incomplete upstream elements of each element of the workflow's element
+        dependency graph. Elements that are not selected are assumed to be complete.
+        Elements downstream of a failed element are not run, and have no result.
+
+        The outputs of completed elements are written to the workflow's parameter data
+        as soon as any downstream elements become ready (and otherwise with each batch
+        of results), while run metrics are stored in batches of `batch_size`.
+
+        Parameters
+        ----------
+        filter
+            Map of task index to the element indices to execute for that task (or
+            `None` for all elements). If not specified, all elements of all tasks are
+            executed.
+
+        """
+        if filter is None:
+            filter = {i: None for i in range(len(workflow.tasks))}
+        dag = workflow.dag
+        selected = np.zeros(dag.num_elements, dtype=bool)
+        for task_idx, elem_indices in filter.items():
+            selected[dag.get_element_nodes(task_idx, elem_indices)] = True
+        counter = ReadyCounter(dag.element_graph, completed=~selected)
+        priorities = self.policy.get_priorities(workflow, dag) if self.policy else None
+        contexts = {}
+        cached_results = []
+        unwritten = {}  # task index -> successful results whose outputs are not written
+
+        def write_outputs():
+            for task_idx, task_results in unwritten.items():
+                workflow.set_element_outputs(
+                    task_idx, {i.element_index: i.outputs for i in task_results}
+                )
+            unwritten.clear()
+
+        def get_runs(ready):
+            runs = []
+            while ready.size:
+                ready = ready[selected[ready]]
+                ready_tasks = dag.element_task[ready]
+                newly_ready = []
+                for task_idx in np.unique(ready_tasks).tolist():
+                    if task_idx not in contexts:
+                        contexts[task_idx] = self._get_task_context(workflow, task_idx)
+                    elem_indices = dag.get_element_local_indices(
+                        ready[ready_tasks == task_idx]
+                    )
+                    cached, task_runs = self._prepare(
+                        workflow,
+                        task_idx,
+                        elem_indices.tolist(),
+                        contexts[task_idx],
+                        priorities,
+                        dag,
+                    )
+                    cached_results.extend(cached)
+                    runs.extend(task_runs)
+                    # cached elements are complete, which may make others ready:
+                    cached_indices = [i.element_index for i in cached]
+                    newly_ready.append(
+                        counter.complete(
+                            dag.get_element_nodes(task_idx, cached_indices)
+                        )
+                    )
+                ready = np.concatenate([np.empty(0, dtype=np.int64), *newly_ready])
+            return runs
+
+        def on_done(results):
+            newly_ready = []
+            for i in results:
+                if i.success:
+                    unwritten.setdefault(i.task_index, []).append(i)
+                    node = dag.get_element_nodes(i.task_index, [i.element_index])
+                    newly_ready.append(counter.complete(node))
+            ready = np.concatenate([np.empty(0, dtype=np.int64), *newly_ready])
+            if not ready.size:
+                return []
+            # downstream elements read the outputs of the completed elements:
+            write_outputs()
+            return get_runs(ready)
+
+        def on_batch(batch):
+            write_outputs()
+            by_task = {}
+            for i in batch:
+                by_task.setdefault(i.task_index, []).append(i)
+            for task_idx, task_results in by_task.items():
+                self._store_results(
+                    workflow,
+                    task_idx,
+                    task_results,
+                    contexts[task_idx],
+                    store_outputs=False,
+                )
+
+        initial = np.flatnonzero(selected & (counter.num_incomplete == 0))
+        results = self.run(get_runs(initial), on_batch=on_batch, on_done=on_done)
+        return cached_results + results
@@ -0,0 +1,287 @@
+"""Module containing bulk export of the parameter values and run metrics of the elements
+of a task as a columnar table, as Arrow record batches, a Parquet file or HDF5 datasets.
+
+Nested (dict) parameter values are flattened into one column per sub-parameter path,
+e.g. "inputs.material.elastic.C11". Columns are read in batches of elements, and numeric
+columns are Numpy arrays that are passed to Arrow without copying their data.
+
+Arrow and Parquet export requires the optional `pyarrow` package, and HDF5 export
+requires the optional `h5py` package.
+
+"""
+
+import importlib
+import json
+from numbers import Number
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+from hpcflow.metrics import RUN_METRICS_DTYPE
+from hpcflow.shredding import ShreddedParameterStore
+
+DEFAULT_BATCH_SIZE = 65536
+
+# flattened paths of nested values are joined with this separator to form column names:
+PATH_SEP = "."
+
+
+def _import_optional(name: str):
+    try:
+        return importlib.import_module(name)
+    except ImportError as err:
+        raise ImportError(
+            f"The optional dependency {name.split('.')[0]!r} is required for this "
+            f"export format."
+        ) from err
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, Number) and not isinstance(value, bool)
+
+
+def make_column(
+    values: List, present: Optional[np.ndarray] = None
+) -> np.ma.MaskedArray:
+    """Make a typed column from a list of values, masking the values that are not
+    present.
+
+    Columns of numbers are int64 (if all integers) or float64, columns of bools are bool,
+    and columns of strings are of object dtype. Other values are JSON-encoded strings.
+
+    """
+    if present is None:
+        present = np.ones(len(values), dtype=bool)
+    present_values = [i for i, j in zip(values, present) if j]
+    if all(isinstance(i, bool) for i in present_values):
+        dtype, fill = bool, False
+    elif all(isinstance(i, (int, np.integer)) for i in present_values):
+        dtype, fill = np.int64, 0
+    elif all(_is_number(i) for i in present_values):
+        dtype, fill = float, np.nan
+    else:
+        dtype, fill = object, None
+        if not all(isinstance(i, str) for i in present_values):
+            values = [json.dumps(i, default=repr) for i in values]
+    data = np.array([i if j else fill for i, j in zip(values, present)], dtype=dtype)
+    return np.ma.masked_array(data, mask=~present)
+
+
+def _encode_json_column(column: np.ma.MaskedArray, kind: str) -> np.ma.MaskedArray:
+    """JSON-encode the values of a shredded column of a kind that has no native dtype,
+    so that all batches of the column have the same (object) dtype."""
+    present = ~np.ma.getmaskarray(column)
+    data = np.empty(len(column), dtype=object)
+    for pos, value in enumerate(np.ma.getdata(column)):
+        if present[pos]:
+            value = value.tolist() if kind == "list" else value
+            data[pos] = json.dumps(value, default=repr)
+    return np.ma.masked_array(data, mask=~present)
+
+
+def _get_parameter_readers(workflow, task_index: int) -> Dict[str, Callable]:
+    """Get a function per column of the flattened input and output parameter values of
+    a task, keyed by path (e.g. "inputs.p1" or "outputs.p2.sub"), that reads the
+    column's values of an array of element indices."""
+    task = workflow.tasks[task_index]
+    store = ShreddedParameterStore(workflow)
+    parameter_paths = [("inputs", i) for i in task.template.all_schema_input_types]
+    parameter_paths += [("outputs", i) for i in task.template.all_schema_output_types]
+    readers = {}
+    for parameter_path in parameter_paths:
+        parameter = store.get_parameter(task_index, parameter_path)
+        if not parameter.paths:
+            readers[PATH_SEP.join(parameter_path)] = lambda elements: np.ma.masked_all(
+                len(elements), dtype=bool
+            )
+        for col_idx, (path, kind) in enumerate(zip(parameter.paths, parameter.kinds)):
+
+            def read(elements, parameter=parameter, col_idx=col_idx, kind=kind):
+                column = parameter.read_column(col_idx, elements)
+                if kind in ("list", "json", "object"):
+                    column = _encode_json_column(column, kind)
+                return column
+
+            readers[PATH_SEP.join(str(i) for i in (*parameter_path, *path))] = read
+    return readers
+
+
+def _get_metrics_readers(workflow, task_index: int) -> Dict[str, Callable]:
+    """Get a function per run metric, keyed by "metrics.<name>", that reads the metric
+    of the most recent run of each of an array of element indices."""
+    records = workflow.metrics.read(task_index)
+    # the last record of each element, in order of element index:
+    _, first = np.unique(records["element_index"][::-1], return_index=True)
+    records = records[::-1][first]
+    record_elems = records["element_index"]
+
+    def locate(elements):
+        pos = np.minimum(np.searchsorted(record_elems, elements), len(records) - 1)
+        present = np.zeros(len(elements), dtype=bool)
+        if len(records):
+            present = record_elems[pos] == elements
+        return pos[present], present
+
+    def make_reader(name):
+        def read(elements):
+            pos, present = locate(elements)
+            if name == "hostname":
+                data = np.full(len(elements), None, dtype=object)
+                data[present] = [i.decode() for i in records[name][pos]]
+            else:
+                data = np.zeros(len(elements), dtype=RUN_METRICS_DTYPE[name])
+                data[present] = records[name][pos]
+            return np.ma.masked_array(data, mask=~present)
+
+        return read
+
+    return {
+        f"metrics{PATH_SEP}{name}": make_reader(name)
+        for name in RUN_METRICS_DTYPE.names
+        if name != "element_index"
+    }
+
+
+def _get_column_readers(workflow, task_index: int, include: Sequence[str]):
+    readers = {"element_index": np.ma.masked_array}
+    if "parameters" in include:
+        readers.update(_get_parameter_readers(workflow, task_index))
+    if "metrics" in include:
+        readers.update(_get_metrics_readers(workflow, task_index))
+    return readers
+
+
+def iter_column_batches(
+    workflow,
+    task_index: int,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    include: Sequence[str] = ("parameters", "metrics"),
+) -> Iterator[Dict[str, np.ma.MaskedArray]]:
+    """Generate the columns of a task's export table (see `get_task_columns`) for each
+    batch of at most `batch_size` elements, reading only the values of the elements of
+    each batch. All batches have the same columns, with the same dtypes."""
+    readers = _get_column_readers(workflow, task_index, include)
+    num_elems = workflow.tasks[task_index].num_elements
+    for start in range(0, num_elems, batch_size):
+        elements = np.arange(start, min(start + batch_size, num_elems))
+        yield {name: read(elements) for name, read in readers.items()}
+
+
+def get_task_columns(
+    workflow, task_index: int, include: Sequence[str] = ("parameters", "metrics")
+) -> Dict[str, np.ma.MaskedArray]:
+    """Get the columns of a task's export table: the element index, followed by the
+    flattened input and output parameter values (e.g. "inputs.p1" or "outputs.p2.sub")
+    and/or the run metrics of the most recent run (e.g. "metrics.wall_time") of each
+    element. Sub-values that an element does not have, outputs that are not set, and
+    metrics of elements that have not run are masked.
+
+    Int, float and bool parameter columns are read from the shredded parameter store
+    with their own dtypes. Lists and other values are JSON-encoded strings.
+
+    """
+    elements = np.arange(workflow.tasks[task_index].num_elements)
+    readers = _get_column_readers(workflow, task_index, include)
+    return {name: read(elements) for name, read in readers.items()}
+
+
+def _to_arrow_array(pa, column: np.ma.MaskedArray):
+    mask = np.ma.getmaskarray(column)
+    data = np.ma.getdata(column)
+    if data.dtype == object:
+        return pa.array(data.tolist(), mask=mask if mask.any() else None)
+    # numeric data buffers are not copied; only a validity bitmap is added:
+    return pa.array(data, mask=mask if mask.any() else None)
+
+
+def iter_record_batches(
+    workflow,
+    task_index: int,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    include: Sequence[str] = ("parameters", "metrics"),
+) -> Iterator:
+    """Generate Arrow record batches of a task's export table, each of at most
+    `batch_size` elements. Requires `pyarrow`."""
+    pa = _import_optional("pyarrow")
+    for columns in iter_column_batches(workflow, task_index, batch_size, include):
+        yield pa.RecordBatch.from_arrays(
+            [_to_arrow_array(pa, i) for i in columns.values()], names=list(columns)
+        )
+
+
+def to_arrow_table(
+    workflow, task_index: int, include: Sequence[str] = ("parameters", "metrics")
+):
+    """Get a task's export table as an Arrow table. Requires `pyarrow`."""
+    pa = _import_optional("pyarrow")
+    columns = get_task_columns(workflow, task_index, include)
+    return pa.table(
+        [_to_arrow_array(pa, i) for i in columns.values()], names=list(columns)
+    )
+
+
+def export_parquet(
+    workflow,
+    task_index: int,
+    path: Union[Path, str],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    include: Sequence[str] = ("parameters", "metrics"),
+):
+    """Write a task's export table to a Parquet file, one row group per batch of
+    elements. Requires `pyarrow`."""
+    pq = _import_optional("pyarrow.parquet")
+    writer = None
+    try:
+        for batch in iter_record_batches(workflow, task_index, batch_size, include):
+            if writer is None:
+                writer = pq.ParquetWriter(str(path), batch.schema)
+            writer.write_batch(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def export_hdf5(
+    workflow,
+    task_index: int,
+    path: Union[Path, str],
+    group_name: Optional[str] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    include: Sequence[str] = ("parameters", "metrics"),
+):
+    """Write a task's export table to an HDF5 file, as one dataset per column in a
+    group (by default named by the task's unique name), written in batches of elements.
+
+    Numeric and bool columns are written with their own dtypes, and other columns as
+    variable-length UTF-8 strings. Columns with missing values are accompanied by a
+    boolean dataset of the same name in the "present" sub-group. Requires `h5py`.
+
+    """
+    h5py = _import_optional("h5py")
+    num_elems = workflow.tasks[task_index].num_elements
+    if group_name is None:
+        group_name = workflow.tasks[task_index].unique_name
+    str_dtype = h5py.string_dtype("utf-8")
+    with h5py.File(path, "a") as fh:
+        group = fh.require_group(group_name)
+        start = 0
+        for columns in iter_column_batches(workflow, task_index, batch_size, include):
+            stop = start + len(columns["element_index"])
+            for name, column in columns.items():
+                data = np.ma.getdata(column)
+                mask = np.ma.getmaskarray(column)
+                if name not in group:
+                    dtype = str_dtype if data.dtype == object else data.dtype
+                    group.create_dataset(name, shape=(num_elems,), dtype=dtype)
+                if data.dtype == object:
+                    data = ["" if i is None else i for i in data]
+                group[name][start:stop] = data
+                if mask.any():
+                    present = group.require_group("present")
+                    if name not in present:
+                        present.create_dataset(
+                            name, shape=(num_elems,), dtype=bool, fillvalue=True
+                        )
+                    present[name][start:stop] = ~mask
+            start = stop
@@ -0,0 +1,151 @@
+"""Module containing an append-only log of workflow interactions, stored as fixed-width
+records within a Zarr group."""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+import enum
+from typing import Iterator, Optional
+
+import numpy as np
+import zarr
+
+
+class WorkflowInteraction(enum.Enum):
+
+    CREATE = 0
+    SUBMIT = 1
+    STATUS_CHANGE = 2
+    EDIT = 3
+
+
+HISTORY_RECORD_DTYPE = np.dtype(
+    [
+        ("timestamp", "<i8"),  # microseconds since the Unix epoch (UTC)
+        ("utc_offset", "<i4"),  # local UTC offset in seconds
+        ("interaction", "<i2"),
+        ("ref", "<i8"),  # e.g. submission or task index; -1 if not applicable
+    ]
+)
+
+
+@dataclass
+class HistoryRecord:
+    timestamp: datetime
+    interaction: WorkflowInteraction
+    ref: int = -1
+
+    @classmethod
+    def from_array_record(cls, record):
+        tz = timezone(timedelta(seconds=int(record["utc_offset"])))
+        epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+        timestamp = epoch + timedelta(microseconds=int(record["timestamp"]))
+        return cls(
+            timestamp=timestamp.astimezone(tz),
+            interaction=WorkflowInteraction(int(record["interaction"])),
+            ref=int(record["ref"]),
+        )
+
+    def to_array_record(self):
+        ts_utc = self.timestamp.astimezone(timezone.utc)
+        epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+        micro = (ts_utc - epoch) // timedelta(microseconds=1)
+        offset = self.timestamp.utcoffset() or timedelta(0)
+        return (micro, int(offset.total_seconds()), self.interaction.value, self.ref)
+
+
+class WorkflowHistory:
+    """Append-only log of workflow interactions.
+
+    Records are appended to a small-chunked, uncompressed "tail" array, which is cheap
+    to append to. On compaction, tail records are moved into the large-chunked "log"
+    array, so a long history occupies a handful of chunk files rather than one
+    directory per interaction.
+
+    Parameters
+    ----------
+    group : zarr.Group
+        The history group of a workflow store.
+    compact_every : int, optional
+        If specified, compact automatically once the tail holds this many records.
+
+    """
+
+    _LOG_NAME = "log"
+    _TAIL_NAME = "tail"
+
+    def __init__(self, group: zarr.Group, compact_every: Optional[int] = None):
+        self.group = group
+        self.compact_every = compact_every
+
+    @classmethod
+    def create(
+        cls,
+        group: zarr.Group,
+        chunk_size: int = 4096,
+        tail_chunk_size: int = 64,
+        compact_every: Optional[int] = None,
+    ):
+        """Initialise empty history arrays within a Zarr group."""
+        group.zeros(
+            cls._LOG_NAME,
+            shape=(0,),
+            chunks=(chunk_size,),
+            dtype=HISTORY_RECORD_DTYPE,
+        )
+        group.zeros(
+            cls._TAIL_NAME,
+            shape=(0,),
+            chunks=(tail_chunk_size,),
+            dtype=HISTORY_RECORD_DTYPE,
+            compressor=None,
+        )
+        return cls(group, compact_every=compact_every)
+
+    @property
+    def log(self):
+        return self.group[self._LOG_NAME]
+
+    @property
+    def tail(self):
+        return self.group[self._TAIL_NAME]
+
+    def __len__(self):
+        return self.log.shape[0] + self.tail.shape[0]
+
+    def append(
+        self,
+        interaction: WorkflowInteraction,
+        ref: int = -1,
+        timestamp: Optional[datetime] = None,
+    ):
+        """Append a single interaction record."""
+        timestamp = timestamp or datetime.now(timezone.utc).astimezone()
+        self.extend([HistoryRecord(timestamp, interaction, ref)])
+
+    def extend(self, records):
+        """Append multiple `HistoryRecord`s with a single array write."""
+        new = np.array(
+            [i.to_array_record() for i in records], dtype=HISTORY_RECORD_DTYPE
+        )
+        if not new.size:
+            return
+        tail = self.tail
+        tail.append(new)
+        if self.compact_every and tail.shape[0] >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """Move all tail records into the compressed log array."""
+        tail = self.tail
+        if tail.shape[0]:
+            self.log.append(tail[:])
+            tail.resize(0)
+
+    def read(self) -> np.ndarray:
+        """Get all records (in order of appending) as a structured Numpy array."""
+        return np.concatenate([self.log[:], self.tail[:]])
+
+    def replay(self) -> Iterator[HistoryRecord]:
+        """Iterate over all records, in order of appending."""
+        for i in self.read():
+            yield HistoryRecord.from_array_record(i)
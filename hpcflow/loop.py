@@ -1,8 +1,12 @@
 from dataclasses import dataclass
-from hpcflow.parameters import Parameter
+from typing import List, Optional, Union
 
+import numpy as np
 from valida.conditions import ConditionLike
 
+from hpcflow.conditions import evaluate_condition
+from hpcflow.parameters import Parameter
+
 
 @dataclass
 class StoppingCriterion:
@@ -12,6 +16,130 @@ class StoppingCriterion:
 
 @dataclass
 class Loop:
+    """Repeated execution of a task, where an output parameter of each iteration is the
+    input parameter of the next.
+
+    Parameters
+    ----------
+    parameter
+        The parameter passed from each iteration to the next. It must be both an input
+        and an output of the looped task.
+    stopping_criteria
+        An element stops iterating once any of these criteria hold for its outputs.
+    maximum_iterations
+        Maximum number of times each element is executed.
+    task_index
+        Index of the looped task. By default, the first task that has `parameter` as
+        both an input and an output.
+
+    """
+
     parameter: Parameter
-    stopping_criteria: StoppingCriterion  # TODO: should be a logical combination of these (maybe provide a superclass in valida to re-use some logic there?)
+    stopping_criteria: Union[StoppingCriterion, List[StoppingCriterion]]
     maximum_iterations: int
+    task_index: Optional[int] = None
+
+    def __post_init__(self):
+        if isinstance(self.stopping_criteria, StoppingCriterion):
+            self.stopping_criteria = [self.stopping_criteria]
+
+    def get_task_index(self, workflow_template) -> int:
+        if self.task_index is not None:
+            return self.task_index
+        typ = self.parameter.typ
+        for task in workflow_template.tasks:
+            if (
+                typ in task.template.all_schema_input_types
+                and typ in task.template.all_schema_output_types
+            ):
+                return task.index
+        raise ValueError(f"No task has parameter {typ!r} as both an input and output.")
+
+    def evaluate_stopping_criteria(
+        self, workflow_template, task_index, element_indices
+    ):
+        """Evaluate the stopping criteria for the outputs of all given elements at once,
+        and return a boolean array that is True where any criterion holds."""
+        stop = np.zeros(len(element_indices), dtype=bool)
+        for criterion in self.stopping_criteria:
+            values = workflow_template.get_output_values(
+                task_index, element_indices, criterion.parameter.typ
+            )
+            stop |= evaluate_condition(criterion.condition, values)
+        return stop
+
+
+@dataclass
+class LoopResult:
+    """The outcome of running a loop.
+
+    Attributes
+    ----------
+    element_indices : ndarray of int
+        For each initial element, the task-local index of its final iteration.
+    num_iterations : ndarray of int
+        For each initial element, the number of iterations that were executed.
+    converged : ndarray of bool
+        For each initial element, whether a stopping criterion was met.
+    failed : ndarray of bool
+        For each initial element, whether its final iteration failed.
+
+    """
+
+    task_index: int
+    element_indices: np.ndarray
+    num_iterations: np.ndarray
+    converged: np.ndarray
+    failed: np.ndarray
+
+
+def run_loop(workflow, loop: Loop, executor, element_indices=None) -> LoopResult:
+    """Run a loop, executing only those elements that have not yet converged in each
+    iteration.
+
+    Parameters
+    ----------
+    workflow
+        The workflow containing the looped task.
+    loop
+        The loop to run.
+    executor
+        Object whose `execute(workflow, task_index, element_indices)` method executes
+        elements and writes their outputs, returning results that have `element_index`
+        and `success` attributes (e.g. a `LocalExecutor`).
+    element_indices
+        Task-local indices of the elements that form the first iteration. By default,
+        all current elements of the task.
+
+    """
+    template = workflow.template
+    task_index = loop.get_task_index(template)
+    if element_indices is None:
+        element_indices = range(workflow.tasks[task_index].num_elements)
+
+    current = np.array(element_indices, dtype=int)
+    num_iterations = np.zeros(len(current), dtype=int)
+    converged = np.zeros(len(current), dtype=bool)
+    failed = np.zeros(len(current), dtype=bool)
+    active = np.arange(len(current))  # positions (in `current`) of active elements
+
+    for iteration in range(loop.maximum_iterations):
+        if iteration > 0:
+            current[active] = workflow.add_loop_iteration(
+                task_index, current[active].tolist(), loop.parameter.typ
+            )
+
+        results = executor.execute(workflow, task_index, current[active].tolist())
+        num_iterations[active] += 1
+
+        failed_elems = {i.element_index for i in results if not i.success}
+        failed[active] = np.isin(current[active], list(failed_elems))
+        ok = active[~failed[active]]
+        converged[ok] = loop.evaluate_stopping_criteria(
+            template, task_index, current[ok].tolist()
+        )
+        active = ok[~converged[ok]]
+        if not active.size:
+            break
+
+    return LoopResult(task_index, current, num_iterations, converged, failed)
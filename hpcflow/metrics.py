@@ -0,0 +1,185 @@
+"""Module containing the run metrics of executed elements (e.g. wall time, CPU time and
+peak memory use), stored as fixed-width records within a Zarr group."""
+
+from dataclasses import dataclass
+from pathlib import Path
+import re
+from typing import Iterable, List, Optional
+
+import numpy as np
+import zarr
+
+from hpcflow.storage import ArrayStorage
+
+HOSTNAME_LENGTH = 64
+
+RUN_METRICS_DTYPE = np.dtype(
+    [
+        ("element_index", "<i8"),  # task-local element index
+        ("exit_code", "<i4"),
+        ("start_time", "<i8"),  # microseconds since the Unix epoch (UTC)
+        ("end_time", "<i8"),
+        ("wall_time", "<f8"),  # seconds
+        ("cpu_time", "<f8"),  # seconds, including child processes
+        ("peak_rss", "<i8"),  # bytes; -1 if not known
+        ("hostname", f"S{HOSTNAME_LENGTH}"),
+    ]
+)
+
+
+@dataclass
+class RunMetrics:
+    """Resource usage of a single element run.
+
+    Attributes
+    ----------
+    start_time, end_time : float
+        Seconds since the Unix epoch.
+    wall_time : float
+        Seconds.
+    cpu_time : float
+        User and system CPU seconds of the executing process and its child processes.
+    peak_rss : int
+        Peak resident set size, in bytes, of the largest child process, or -1 if not
+        known.
+
+    """
+
+    start_time: float
+    end_time: float
+    wall_time: float
+    cpu_time: float
+    peak_rss: int
+    hostname: str
+
+    def to_array_record(self, element_index: int, exit_code: int):
+        return (
+            element_index,
+            exit_code,
+            round(self.start_time * 1e6),
+            round(self.end_time * 1e6),
+            self.wall_time,
+            self.cpu_time,
+            self.peak_rss,
+            self.hostname.encode()[:HOSTNAME_LENGTH],
+        )
+
+
+@dataclass
+class RecordedRun:
+    """The exit code and run metrics of an element that was executed by a jobscript."""
+
+    element_index: int
+    exit_code: int
+    metrics: RunMetrics
+
+
+def get_metrics_shell_lines(lines: List[str], metrics_path: str) -> List[str]:
+    """Wrap the shell lines of an element so that they run in a subshell, after which
+    the exit code, start and end times, and hostname of the element, and the CPU times
+    of the subshell, are written to a metrics file (see `read_metrics_file`), and the
+    exit code of the subshell is returned.
+
+    Peak memory use is not known to the shell, so it is not recorded.
+
+    """
+    return [
+        "HPCFLOW_START=$(date +%s.%N)",
+        "(",
+        *(lines or [":"]),
+        ")",
+        "HPCFLOW_EXIT=$?",
+        "HPCFLOW_END=$(date +%s.%N)",
+        # `times` gives the CPU times of the shell, then of its (waited-for) children:
+        f'{{ echo "${{HPCFLOW_EXIT}} ${{HPCFLOW_START}} ${{HPCFLOW_END}} ${{HOSTNAME}}"; '
+        f'times; }} > "{metrics_path}"',
+        'exit "${HPCFLOW_EXIT}"',
+    ]
+
+
+def _parse_times(line: str) -> float:
+    # e.g. "0m1.250s 0m0.020s" (user and system times):
+    return sum(
+        int(minutes) * 60 + float(seconds)
+        for minutes, seconds in re.findall(r"(\d+)m([\d.]+)s", line)
+    )
+
+
+def read_metrics_file(path: Path, element_index: int) -> RecordedRun:
+    """Read a metrics file written by the shell lines of `get_metrics_shell_lines`."""
+    summary, _, child_times = Path(path).read_text().splitlines()[:3]
+    exit_code, start_time, end_time, *hostname = summary.split(" ", 3)
+    start_time, end_time = float(start_time), float(end_time)
+    return RecordedRun(
+        element_index=element_index,
+        exit_code=int(exit_code),
+        metrics=RunMetrics(
+            start_time=start_time,
+            end_time=end_time,
+            wall_time=end_time - start_time,
+            cpu_time=_parse_times(child_times),
+            peak_rss=-1,
+            hostname="".join(hostname),
+        ),
+    )
+
+
+class RunMetricsStore:
+    """Run metrics of the elements of each task of a workflow, with one array of
+    records per task, so the metrics of a task can be read without reading those of
+    other tasks.
+
+    Parameters
+    ----------
+    group : zarr.Group
+        The metrics group of a workflow store.
+    storage
+        Chunking and compression of new task arrays. By default, 4096 records per chunk
+        and the default compressor.
+
+    """
+
+    def __init__(self, group: zarr.Group, storage: Optional[ArrayStorage] = None):
+        self.group = group
+        self.storage = storage or ArrayStorage(chunk_size=4096)
+
+    def _get_array(self, task_index: int, create: bool = False) -> Optional[zarr.Array]:
+        name = str(task_index)
+        if name in self.group:
+            return self.group[name]
+        if create:
+            return self.group.zeros(
+                name,
+                shape=(0,),
+                dtype=RUN_METRICS_DTYPE,
+                **self.storage.get_array_kwargs(None, RUN_METRICS_DTYPE),
+            )
+        return None
+
+    def append(self, task_index: int, results: Iterable):
+        """Append the metrics of element run results (e.g. `ElementRunResult`s that
+        have `element_index`, `exit_code` and `metrics` attributes) of a task with a
+        single array write. Results without metrics are skipped."""
+        new = np.array(
+            [
+                i.metrics.to_array_record(i.element_index, i.exit_code)
+                for i in results
+                if i.metrics is not None
+            ],
+            dtype=RUN_METRICS_DTYPE,
+        )
+        if new.size:
+            self._get_array(task_index, create=True).append(new)
+
+    def read(self, task_index: int, element_indices=None) -> np.ndarray:
+        """Get the metrics records of a task (in order of appending) as a structured
+        Numpy array, optionally only those of the given elements."""
+        arr = self._get_array(task_index)
+        records = arr[:] if arr is not None else np.zeros(0, dtype=RUN_METRICS_DTYPE)
+        if element_indices is not None:
+            records = records[np.isin(records["element_index"], element_indices)]
+        return records
+
+    def get_column(self, task_index: int, name: str) -> np.ndarray:
+        """Get a single metric of all records of a task."""
+        return self.read(task_index)[name]
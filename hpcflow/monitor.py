@@ -0,0 +1,153 @@
+"""Module containing an asynchronous monitor of the scheduler status of submitted
+elements."""
+
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from hpcflow.history import WorkflowInteraction
+from hpcflow.schedulers import JobStatus
+
+ElementID = Tuple[int, int]  # (task index, element index)
+
+logger = logging.getLogger(__name__)
+
+
+class StatusMonitor:
+    """Poll schedulers for the status of all active job arrays of a workflow.
+
+    Each polling cycle makes one status query per scheduler, covering all active job
+    arrays submitted to that scheduler, so the load on the scheduler does not grow with
+    the number of elements. Only elements whose status has changed since the previous
+    cycle are reported. If a status query fails, the statuses of that scheduler's job
+    arrays are left unchanged until a later cycle. Once a job array has finished, the
+    run metrics recorded by its jobscript are added to the workflow's metrics store.
+
+    Parameters
+    ----------
+    workflow
+        The workflow whose submissions should be monitored.
+    min_interval
+        Polling interval (seconds) used after a cycle in which any status changed.
+    max_interval
+        Upper bound on the polling interval.
+    backoff
+        Factor by which the interval is increased after a cycle with no changes.
+    on_change
+        Callable that is passed a dict of changed element statuses after each cycle in
+        which any status changed.
+
+    """
+
+    def __init__(
+        self,
+        workflow,
+        min_interval: float = 5.0,
+        max_interval: float = 120.0,
+        backoff: float = 1.5,
+        on_change: Optional[Callable[[Dict[ElementID, JobStatus]], None]] = None,
+    ):
+        self.workflow = workflow
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.on_change = on_change
+
+        self.interval = min_interval
+        self.element_status = {}
+        self._done_job_arrays = set()  # (submission index, job ID) pairs
+
+    def get_active_job_arrays(self) -> List:
+        return [
+            (sub, js)
+            for sub in self.workflow.submissions
+            for js in sub.job_arrays
+            if js.job_ID is not None
+            and (sub.index, js.job_ID) not in self._done_job_arrays
+        ]
+
+    @staticmethod
+    async def _run_status_command(scheduler, cmd: List[str]) -> Optional[str]:
+        """Run a status command and return its standard output, or `None` if the
+        command failed."""
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            stdout, stderr = await proc.communicate()
+        except OSError as err:
+            logger.warning("Scheduler status command %r failed: %s", cmd, err)
+            return None
+        stderr = stderr.decode().strip()
+        if scheduler.is_status_query_failure(proc.returncode, stderr):
+            logger.warning(
+                "Scheduler status command %r failed with exit code %s: %s",
+                cmd,
+                proc.returncode,
+                stderr,
+            )
+            return None
+        return stdout.decode()
+
+    async def poll_once(self) -> Dict[ElementID, JobStatus]:
+        """Query each scheduler once and return the element statuses that changed."""
+
+        # group active job arrays by scheduler, so each is queried only once:
+        by_scheduler = {}
+        for sub, js in self.get_active_job_arrays():
+            key = (type(sub.scheduler), sub.scheduler.status_cmd)
+            by_scheduler.setdefault(key, (sub.scheduler, []))[1].append((sub, js))
+
+        queries = []
+        for scheduler, job_arrays in by_scheduler.values():
+            cmd = scheduler.get_status_command(
+                sorted({js.job_ID for _, js in job_arrays})
+            )
+            queries.append(
+                self._run_status_command(scheduler, cmd)
+                if cmd
+                else asyncio.sleep(0, "")
+            )
+        outputs = await asyncio.gather(*queries)
+
+        changes = {}
+        for (scheduler, job_arrays), stdout in zip(by_scheduler.values(), outputs):
+            if stdout is None:
+                continue  # keep the previous statuses until the query succeeds
+            statuses = scheduler.parse_status_output(stdout)
+            for sub, js in job_arrays:
+                job_status = statuses.get(js.job_ID, {})
+                for arr_idx, elem_idx in enumerate(js.element_indices):
+                    elem_ID = (js.task_index, elem_idx)
+                    new = job_status.get(arr_idx, JobStatus.FINISHED)
+                    if self.element_status.get(elem_ID) != new:
+                        changes[elem_ID] = new
+                        self.element_status[elem_ID] = new
+                if not job_status:
+                    self._done_job_arrays.add((sub.index, js.job_ID))
+                    sub.ingest_metrics(self.workflow, js)
+
+        self.interval = (
+            self.min_interval
+            if changes
+            else min(self.interval * self.backoff, self.max_interval)
+        )
+        if changes:
+            self.workflow.history.append(WorkflowInteraction.STATUS_CHANGE)
+            if self.on_change:
+                self.on_change(changes)
+
+        return changes
+
+    async def run(self):
+        """Poll until no job arrays remain active."""
+        while True:
+            await self.poll_once()
+            if not self.get_active_job_arrays():
+                break
+            await asyncio.sleep(self.interval)
+
+    def watch(self):
+        asyncio.run(self.run())
@@ -0,0 +1,241 @@
+"""Module containing a pipeline that parses the output files of completed elements in a
+worker pool, and writes the parsed outputs to the parameter store in bulk."""
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import zarr
+
+from hpcflow.actions import OutputFileParserAction
+from hpcflow.conditions import (
+    evaluate_action_conditions,
+    get_element_resolved_actions,
+    split_condition_signatures,
+)
+from hpcflow.executor import OUTPUT_FILE_PARSER_FUNC, load_source_function
+from hpcflow.utils import get_num_available_cores
+
+
+@dataclass
+class ParseJob:
+    """A single output file parser invocation for one element, reduced to plain data so
+    it can be sent to a worker process.
+
+    Attributes
+    ----------
+    data_index : int
+        Index of the output within the workflow's parameter data.
+    store_path : Path, optional
+        Path to the workflow's Zarr store, into which large array outputs are written
+        directly by the worker.
+
+    """
+
+    task_index: int
+    element_index: int
+    working_dir: Path
+    output: str
+    data_index: int
+    source: str
+    files: Dict
+    options: Dict
+    store_path: Optional[Path] = None
+
+
+@dataclass
+class ParsedOutput:
+    """The result of a `ParseJob`. If the parsed output was a large array, it is not
+    returned in `value`, but is stored at `array_path` within the workflow's Zarr
+    store."""
+
+    task_index: int
+    element_index: int
+    output: str
+    data_index: int
+    value: Any = None
+    array_path: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def success(self):
+        return self.error is None
+
+
+def get_array_path(data_index: int) -> str:
+    """Get the path within the workflow's Zarr store of a stored array output."""
+    return f"parameters/{data_index}"
+
+
+def parse_outputs(job: ParseJob, array_threshold: int) -> ParsedOutput:
+    """Run the output file parser of a parse job.
+
+    Parameters
+    ----------
+    job
+        The parse job to run.
+    array_threshold
+        Array outputs of at least this many bytes are written directly into the
+        workflow's Zarr store, rather than being returned to the calling process.
+
+    """
+    out = ParsedOutput(job.task_index, job.element_index, job.output, job.data_index)
+    try:
+        func = load_source_function(job.source, OUTPUT_FILE_PARSER_FUNC)
+        files = {
+            k: job.working_dir.joinpath(v.value(job.working_dir))
+            for k, v in job.files.items()
+        }
+        value = func(files, job.options)
+        if (
+            job.store_path is not None
+            and isinstance(value, np.ndarray)
+            and value.nbytes >= array_threshold
+        ):
+            out.array_path = get_array_path(job.data_index)
+            arr = zarr.open_array(
+                store=zarr.DirectoryStore(job.store_path),
+                path=out.array_path,
+                mode="w",
+                shape=value.shape,
+                dtype=value.dtype,
+            )
+            arr[...] = value
+        else:
+            out.value = value
+    except Exception as err:
+        out.error = f"{err.__class__.__name__}: {err}"
+    return out
+
+
+def build_parse_jobs(workflow, task_index: int, element_indices: List[int]):
+    """Get a `ParseJob` for each included output file parser action (that has a parser
+    source) of each given element of a task."""
+
+    task = workflow.tasks[task_index]
+    template = workflow.template
+    store_path = workflow.path.joinpath(workflow._STORE_NAME)
+    inclusion = evaluate_action_conditions(template, task_index)
+    jobs = []
+    for elem_idx in element_indices:
+        resolved_actions = get_element_resolved_actions(
+            task.template,
+            split_condition_signatures(task.template, inclusion[elem_idx]),
+        )
+        data_indices = None  # only retrieved if the element has parsers
+        for act in resolved_actions:
+            if not isinstance(act, OutputFileParserAction):
+                continue
+            parser = act.output_file_parser
+            for src in task.template.output_file_parser_sources:
+                if src.parser == parser:
+                    break
+            else:
+                continue
+            if data_indices is None:
+                data_indices = template.get_element_output_data_indices(
+                    task_index, elem_idx
+                )
+            jobs.append(
+                ParseJob(
+                    task_index=task_index,
+                    element_index=elem_idx,
+                    working_dir=workflow.get_element_dir(task_index, elem_idx),
+                    output=parser.output.typ,
+                    data_index=data_indices[parser.output.typ],
+                    source=src.contents,
+                    files={i.label: i for i in parser.output_files},
+                    options=parser.options or {},
+                    store_path=store_path,
+                )
+            )
+    return jobs
+
+
+class OutputParsingPipeline:
+    """Parse element output files concurrently in a process pool.
+
+    Parsed outputs are yielded as they complete, and, when parsing the outputs of a
+    workflow task, are written to the workflow's parameter data in batches.
+
+    Parameters
+    ----------
+    max_workers
+        Number of worker processes. By default, the number of available cores.
+    batch_size
+        Number of parsed outputs to accumulate before writing them.
+    array_threshold
+        Array outputs of at least this many bytes are written directly into the
+        workflow's Zarr store by the worker, avoiding copying them between processes.
+        The parameter data then references the stored array.
+
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        batch_size: int = 1000,
+        array_threshold: int = 2**20,
+    ):
+        self.max_workers = max_workers or get_num_available_cores()
+        self.batch_size = batch_size
+        self.array_threshold = array_threshold
+
+    def stream(self, jobs: Iterable[ParseJob]) -> Iterator[ParsedOutput]:
+        """Run parse jobs, yielding each result as it completes.
+
+        At most a few jobs per worker are in flight at once, so `jobs` may be a lazily
+        generated iterable.
+
+        """
+        jobs = iter(jobs)
+        max_pending = 4 * self.max_workers
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = set()
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < max_pending:
+                    try:
+                        job = next(jobs)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending.add(pool.submit(parse_outputs, job, self.array_threshold))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield fut.result()
+
+    def parse(self, workflow, task_index: int, element_indices=None):
+        """Parse the output files of elements of a workflow task and write the parsed
+        outputs to the workflow's parameter data."""
+
+        if element_indices is None:
+            element_indices = range(workflow.tasks[task_index].num_elements)
+        jobs = build_parse_jobs(workflow, task_index, list(element_indices))
+        store = zarr.DirectoryStore(workflow.path.joinpath(workflow._STORE_NAME))
+
+        results = []
+        batch = {}
+        batch_count = 0
+        for result in self.stream(jobs):
+            results.append(result)
+            if result.success:
+                value = result.value
+                if result.array_path is not None:
+                    value = zarr.open_array(
+                        store=store, path=result.array_path, mode="r"
+                    )
+                batch.setdefault(result.element_index, {})[result.output] = value
+                batch_count += 1
+            if batch_count >= self.batch_size:
+                workflow.set_element_outputs(task_index, batch)
+                batch = {}
+                batch_count = 0
+        if batch:
+            workflow.set_element_outputs(task_index, batch)
+
+        return results
@@ -0,0 +1,392 @@
+"""Module containing indexed queries of the parameter values of workflow elements.
+
+The values of each queried parameter path of a task are persisted as a column in the
+"parameters" group of the workflow store. Numeric columns are indexed by a sorted
+(argsort) index, and other columns are dictionary-encoded and indexed by a hash index
+from each distinct value to its elements, so that equality and range lookups do not scan
+the parameter data of every element. Columns and their indexes are built lazily, on
+first query, and are rebuilt if the workflow template's parameter data has since been
+modified.
+
+"""
+
+from dataclasses import dataclass
+from functools import reduce
+import json
+from numbers import Number
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from valida.conditions import (
+    ConditionAnd,
+    ConditionBinaryOp,
+    ConditionLike,
+    ConditionOr,
+    ConditionXor,
+    NullCondition,
+    ValueLike,
+)
+import zarr
+
+from hpcflow.conditions import evaluate_condition
+from hpcflow.shredding import ShreddedParameterStore, is_large_int
+from hpcflow.storage import ArrayStorage
+
+_SET_OPS = {
+    ConditionAnd: np.intersect1d,
+    ConditionOr: np.union1d,
+    ConditionXor: np.setxor1d,
+}
+
+# valida order callables (by name) that can be answered by a sorted index, and the
+# `searchsorted` sides of their lower and upper bounds:
+_RANGE_SIDES = {
+    "less_than": (None, "left"),
+    "less_than_or_equal_to": (None, "right"),
+    "greater_than": ("right", None),
+    "greater_than_or_equal_to": ("left", None),
+}
+
+
+def parse_query_path(workflow_template, path: str) -> Tuple[int, Tuple]:
+    """Split a query path of the form "tasks.<task name>.inputs.<parameter>[...]" (or
+    "...outputs.<parameter>[...]") into a task index and a parameter path. Integer path
+    components are interpreted as sequence indices."""
+    parts = path.split(".")
+    if len(parts) < 4 or parts[0] != "tasks" or parts[2] not in ("inputs", "outputs"):
+        raise ValueError(
+            f"Query path {path!r} must be of the form "
+            f'"tasks.<task name>.(inputs|outputs).<parameter>".'
+        )
+    for task in workflow_template.tasks:
+        if task.unique_name == parts[1]:
+            return task.index, tuple(int(i) if i.isdigit() else i for i in parts[2:])
+    raise ValueError(f"No task named {parts[1]!r} in the workflow.")
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, Number) and not isinstance(value, bool)
+
+
+def _get_condition_args(condition) -> Tuple:
+    func = condition.callable
+    return (*func.args, *func.kwargs.values())
+
+
+class ParameterColumn:
+    """The values of a parameter path for all elements of a task, persisted in a Zarr
+    group, with an index that is built on first use.
+
+    A column is of one of three kinds:
+
+    - "numeric": values are all numbers (or `None`, stored as NaN), and are indexed by
+      the argsort of the values and the sorted values.
+    - "categorical": values are all JSON-serialisable (including numbers, if any are
+      integers outside the int64 range), and are stored as integer codes into a list of
+      distinct values. Codes are indexed by a compressed sparse row map from each code
+      to its elements, and distinct values are looked up by their JSON encoding.
+    - "object": other values, which are not persisted or indexed.
+
+    """
+
+    def __init__(
+        self,
+        group: Optional[zarr.Group],
+        values: Optional[List] = None,
+        storage: Optional[ArrayStorage] = None,
+    ):
+        self.group = group
+        self._values = values
+        self.storage = storage
+        self._categories = None
+        self._category_codes = None
+
+    @property
+    def kind(self) -> str:
+        return "object" if self.group is None else self.group.attrs["kind"]
+
+    @property
+    def num_elements(self) -> int:
+        if self.group is None:
+            return len(self._values)
+        return self.group.attrs["num_elements"]
+
+    def _write_array(self, name: str, arr: np.ndarray):
+        kwargs = {}
+        if self.storage is not None:
+            kwargs = self.storage.get_array_kwargs(len(arr), arr.dtype)
+        self.group.array(name, arr, overwrite=True, **kwargs)
+
+    @classmethod
+    def create(
+        cls,
+        group: zarr.Group,
+        values: List,
+        version: int,
+        storage: Optional[ArrayStorage] = None,
+    ):
+        """Persist a column of values, replacing any existing column in the group."""
+        out = cls(group, storage=storage)
+        attrs = {"version": version, "num_elements": len(values)}
+        if all(_is_number(i) or i is None for i in values) and not any(
+            is_large_int(i) for i in values
+        ):
+            if all(isinstance(i, (int, np.integer)) for i in values):
+                column = np.array(values, dtype=np.int64)
+            else:
+                column = np.array(
+                    [np.nan if i is None else i for i in values], dtype=float
+                )
+            out._write_array("values", column)
+            group.attrs.put({**attrs, "kind": "numeric"})
+            return out
+        try:
+            keys = [json.dumps(i, sort_keys=True) for i in values]
+        except (TypeError, ValueError):
+            group.attrs.put({**attrs, "kind": "object"})
+            return cls(None, values, storage)
+        categories, codes = np.unique(keys, return_inverse=True)
+        out._write_array("codes", codes.astype(np.int64))
+        group.attrs.put(
+            {**attrs, "kind": "categorical", "categories": categories.tolist()}
+        )
+        return out
+
+    def _get_categories(self) -> List:
+        if self._categories is None:
+            self._categories = [json.loads(i) for i in self.group.attrs["categories"]]
+            self._category_codes = {
+                k: idx for idx, k in enumerate(self.group.attrs["categories"])
+            }
+        return self._categories
+
+    def get_values(self, element_indices=None) -> Union[np.ndarray, List]:
+        """Get the values of all elements, or of the given elements. Numeric values are
+        returned as an array; others as a list."""
+        if self.kind == "object":
+            if element_indices is None:
+                return list(self._values)
+            return [self._values[i] for i in element_indices]
+        arr_name = "values" if self.kind == "numeric" else "codes"
+        if element_indices is None:
+            out = self.group[arr_name][:]
+        else:
+            element_indices = np.asarray(element_indices, dtype=np.int64)
+            if not element_indices.size:
+                out = np.zeros(0, dtype=self.group[arr_name].dtype)
+            else:
+                out = self.group[arr_name].get_coordinate_selection(element_indices)
+        if self.kind == "categorical":
+            categories = self._get_categories()
+            return [categories[i] for i in out.tolist()]
+        return out
+
+    def _require_index(self) -> Dict[str, np.ndarray]:
+        """Get the index arrays of the column, building them if they do not exist."""
+        if self.kind == "numeric":
+            if "sorted_order" not in self.group:
+                values = self.group["values"][:]
+                order = np.argsort(values, kind="stable")  # NaNs are sorted last
+                self._write_array("sorted_order", order)
+                self._write_array("sorted_values", values[order])
+            names = ("sorted_order", "sorted_values")
+        else:
+            if "index_indptr" not in self.group:
+                codes = self.group["codes"][:]
+                counts = np.bincount(
+                    codes, minlength=len(self.group.attrs["categories"])
+                )
+                indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+                self._write_array("index_indptr", indptr)
+                self._write_array("index_indices", np.argsort(codes, kind="stable"))
+            names = ("index_indptr", "index_indices")
+        return {i: self.group[i][:] for i in names}
+
+    def _lookup_equal(self, index, value) -> np.ndarray:
+        if self.kind == "numeric":
+            if not _is_number(value):
+                return np.zeros(0, dtype=np.int64)
+            sorted_values = index["sorted_values"]
+            start = np.searchsorted(sorted_values, value, side="left")
+            stop = np.searchsorted(sorted_values, value, side="right")
+            return index["sorted_order"][start:stop]
+        self._get_categories()
+        try:
+            code = self._category_codes.get(json.dumps(value, sort_keys=True))
+        except (TypeError, ValueError):
+            code = None
+        if code is None:
+            return np.zeros(0, dtype=np.int64)
+        indptr = index["index_indptr"]
+        return index["index_indices"][indptr[code] : indptr[code + 1]]
+
+    def _lookup(self, condition) -> Optional[np.ndarray]:
+        """Get the unsorted indices of elements that satisfy a value condition using the
+        column index, or `None` if the condition cannot be answered by the index."""
+        if (
+            self.kind == "object"
+            or not isinstance(condition, ValueLike)
+            or condition.PRE_PROCESSOR is not None
+        ):
+            return None
+        name = condition.callable.name
+        args = _get_condition_args(condition)
+        if len(args) != 1:
+            return None
+        value = args[0]
+
+        if name in ("equal_to", "not_equal_to", "in_", "not_in"):
+            index = self._require_index()
+            values = value if name in ("in_", "not_in") else [value]
+            matched = [self._lookup_equal(index, i) for i in values]
+            out = np.concatenate(matched) if matched else np.zeros(0, dtype=np.int64)
+            if name.startswith("not"):
+                out = np.setdiff1d(np.arange(self.num_elements), out)
+            return out
+
+        if name in _RANGE_SIDES and self.kind == "numeric" and _is_number(value):
+            index = self._require_index()
+            sorted_values = index["sorted_values"]
+            lower, upper = _RANGE_SIDES[name]
+            # NaNs (missing values) are sorted last, and never satisfy a comparison:
+            start = np.searchsorted(sorted_values, value, lower) if lower else 0
+            stop = (
+                np.searchsorted(sorted_values, value, upper)
+                if upper
+                else np.searchsorted(sorted_values, np.nan, "left")
+            )
+            return index["sorted_order"][start:stop]
+
+        return None
+
+    def select(self, condition: Optional[ConditionLike]) -> np.ndarray:
+        """Get the sorted indices of the elements whose values satisfy a condition.
+
+        Value conditions that test equality, membership or order are answered using the
+        column index. Other conditions are evaluated against all values of the column.
+        Conditions that are combined with `&`, `|` or `^` are answered separately, and
+        their results combined.
+
+        """
+        if condition is None or isinstance(condition, NullCondition):
+            return np.arange(self.num_elements)
+        if isinstance(condition, ConditionBinaryOp):
+            return reduce(
+                _SET_OPS[type(condition)], (self.select(i) for i in condition.children)
+            )
+        out = self._lookup(condition)
+        if out is None:
+            values = self.get_values()
+            if isinstance(values, np.ndarray):
+                values = values.tolist()
+            return np.flatnonzero(evaluate_condition(condition, values))
+        return np.sort(out)
+
+
+@dataclass
+class QueryResult:
+    """The elements of a task that satisfy a query, and their values of the queried
+    parameter path.
+
+    Attributes
+    ----------
+    element_indices : ndarray of int
+        Sorted task-local element indices.
+    values : ndarray or list
+        The value of each element; an array if the parameter path is numeric.
+
+    """
+
+    task_index: int
+    parameter_path: Tuple
+    element_indices: np.ndarray
+    values: Union[np.ndarray, List]
+
+
+class ParameterQuery:
+    """Indexed queries of the parameter values of a workflow's elements.
+
+    Parameters
+    ----------
+    workflow
+        The workflow to query.
+
+    """
+
+    def __init__(self, workflow):
+        self.workflow = workflow
+        self.storage = workflow.storage.get("parameters")
+        self._group = None
+
+    @property
+    def group(self) -> zarr.Group:
+        if self._group is None:
+            self._group = self.workflow.root.require_group("parameters")
+        return self._group
+
+    def get_column(self, task_index: int, parameter_path) -> ParameterColumn:
+        """Get the persisted column of a parameter path of a task, (re-)building it if
+        it does not exist or the parameter has been modified since it was built."""
+        template = self.workflow.template
+        name = ".".join(str(i) for i in parameter_path)
+        group = self.group.require_group(f"columns/{task_index}/{name}")
+        num_elems = template.tasks[task_index].num_elements
+        version = template.get_parameter_version(task_index, parameter_path)
+        if (
+            group.attrs.get("version") == version
+            and group.attrs.get("num_elements") == num_elems
+            and group.attrs.get("kind") != "object"
+        ):
+            return ParameterColumn(group, storage=self.storage)
+        for key in list(group.array_keys()):
+            del group[key]
+        # only the shredded columns at or below the parameter path are read:
+        values = ShreddedParameterStore(self.workflow).get_values(
+            task_index, parameter_path
+        )
+        return ParameterColumn.create(group, values, version, self.storage)
+
+    def query(
+        self,
+        path: str,
+        where: Optional[Union[ConditionLike, Dict[str, ConditionLike]]] = None,
+    ) -> QueryResult:
+        """Find the elements of a task whose parameter values satisfy some conditions.
+
+        Parameters
+        ----------
+        path
+            The parameter path whose values are returned, e.g.
+            "tasks.simulate.inputs.load_case".
+        where
+            A valida condition on the values of `path`, or a dict that maps parameter
+            paths of the same task, relative to the task (e.g. "inputs.size"), to
+            conditions on their values. All conditions must hold.
+
+        """
+        template = self.workflow.template
+        task_index, parameter_path = parse_query_path(template, path)
+        if where is None or not isinstance(where, dict):
+            where = {path: where}
+
+        element_indices = None
+        for cond_path, condition in where.items():
+            if not cond_path.startswith("tasks."):
+                cond_path = (
+                    f"tasks.{template.tasks[task_index].unique_name}.{cond_path}"
+                )
+            cond_task_index, cond_param_path = parse_query_path(template, cond_path)
+            if cond_task_index != task_index:
+                raise ValueError(
+                    f"Condition path {cond_path!r} is not a parameter of the queried "
+                    f"task."
+                )
+            matched = self.get_column(task_index, cond_param_path).select(condition)
+            element_indices = (
+                matched
+                if element_indices is None
+                else np.intersect1d(element_indices, matched)
+            )
+
+        values = self.get_column(task_index, parameter_path).get_values(element_indices)
+        return QueryResult(task_index, parameter_path, element_indices, values)
@@ -0,0 +1,371 @@
+"""Module containing a resource advisor that proposes the wall time and memory
+resources of elements from the recorded run metrics of previous elements of the same
+task schemas."""
+
+from dataclasses import dataclass
+import math
+from numbers import Real
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from hpcflow.scheduling import get_schema_key
+from hpcflow.submission import get_element_main_resources
+
+
+@dataclass
+class ResourceFit:
+    """A linear model of a resource (e.g. wall time) in terms of numeric input
+    parameters, with a margin that bounds the model's residuals.
+
+    Attributes
+    ----------
+    parameters : list of str
+        Input parameter types of the model's regressors.
+    coefficients : ndarray of float
+        Intercept, followed by the coefficient of each parameter.
+    margin : float
+        Amount added to each prediction, so that (a given quantile of) the samples of
+        the fit lie below the model.
+    num_samples : int
+        Number of samples the model was fitted to.
+    maximum : float
+        Largest sample.
+    sample_X : ndarray of float
+        Parameter values of each sample, with one column per parameter.
+    sample_y : ndarray of float
+        Each sample.
+
+    """
+
+    parameters: List[str]
+    coefficients: np.ndarray
+    margin: float
+    num_samples: int
+    maximum: float
+    sample_X: np.ndarray
+    sample_y: np.ndarray
+
+    # number of rows of `X` whose distances to all samples are computed at once:
+    _FLOOR_CHUNK_SIZE = 1024
+
+    def predict(self, X) -> np.ndarray:
+        """Predict the resource for each row of a 2D array of parameter values `X`."""
+        X = np.asarray(X, dtype=float)
+        return self.coefficients[0] + X @ self.coefficients[1:] + self.margin
+
+    def get_floor(self, X) -> np.ndarray:
+        """Get, for each row of a 2D array of parameter values `X`, the largest sample
+        among those whose parameter values are nearest to the row's, and at least the
+        smallest sample.
+
+        Distances are measured with each parameter scaled by the range of its sample
+        values. A linear model may extrapolate below all samples, so predictions
+        should be no smaller than this floor.
+
+        """
+        X = np.asarray(X, dtype=float)
+        floor = np.full(len(X), self.sample_y.min())
+        if not self.sample_X.shape[1]:
+            return np.maximum(floor, self.maximum)
+        scale = np.ptp(self.sample_X, axis=0)
+        scale[scale == 0] = 1.0
+        samples = self.sample_X / scale
+        for start in range(0, len(X), self._FLOOR_CHUNK_SIZE):
+            rows = X[start : start + self._FLOOR_CHUNK_SIZE] / scale
+            dist = ((rows[:, None, :] - samples[None, :, :]) ** 2).sum(axis=2)
+            nearest = np.isclose(dist, dist.min(axis=1, keepdims=True))
+            chunk_floor = np.where(nearest, self.sample_y, -np.inf).max(axis=1)
+            floor[start : start + len(rows)] = np.maximum(
+                floor[start : start + len(rows)], chunk_floor
+            )
+        return floor
+
+
+def fit_resource(X, y, parameters: List[str], quantile: float = 0.95) -> ResourceFit:
+    """Fit a linear model, by least squares, to samples of a resource.
+
+    If there are too few samples to fit all coefficients with at least one degree of
+    freedom, the model is instead the maximum of the samples.
+
+    Parameters
+    ----------
+    X
+        Parameter values of each sample, with one column per parameter.
+    y
+        Resource usage of each sample.
+    quantile
+        Quantile of the residuals that is used as the model's margin.
+
+    """
+    X = np.asarray(X, dtype=float).reshape(len(y), len(parameters))
+    y = np.asarray(y, dtype=float)
+    maximum = float(y.max())
+    if len(y) < len(parameters) + 2:
+        return ResourceFit(
+            [], np.array([maximum]), 0.0, len(y), maximum, np.zeros((len(y), 0)), y
+        )
+    A = np.column_stack([np.ones(len(y)), X])
+    coefficients = np.linalg.lstsq(A, y, rcond=None)[0]
+    residuals = y - A @ coefficients
+    margin = max(float(np.quantile(residuals, quantile)), 0.0)
+    return ResourceFit(list(parameters), coefficients, margin, len(y), maximum, X, y)
+
+
+@dataclass
+class ResourceAdvice:
+    """Proposed resources of elements of a task.
+
+    Attributes
+    ----------
+    walltime : ndarray of int
+        Proposed wall time, in seconds, of each element, or -1 if there are no recorded
+        run metrics from which to propose it.
+    memory : ndarray of int
+        Proposed (resident) memory, in mebibytes, of each element, or -1 if there are no
+        recorded run metrics from which to propose it.
+
+    """
+
+    task_index: int
+    element_indices: List[int]
+    walltime: np.ndarray
+    memory: np.ndarray
+
+    def get_element_resources(self, position: int) -> Dict:
+        """Get the proposed main resources of the element at a given position of
+        `element_indices`."""
+        out = {}
+        if self.walltime[position] >= 0:
+            out["walltime"] = int(self.walltime[position])
+        if self.memory[position] >= 0:
+            out["memory"] = int(self.memory[position])
+        return out
+
+    @property
+    def resources(self) -> Dict:
+        """Main resources that suffice for all of the elements."""
+        out = {}
+        if self.walltime.size and self.walltime.min() >= 0:
+            out["walltime"] = int(self.walltime.max())
+        if self.memory.size and self.memory.min() >= 0:
+            out["memory"] = int(self.memory.max())
+        return out
+
+
+def _round_up(values: np.ndarray, step: int) -> np.ndarray:
+    # values within rounding error of a multiple of `step` are not rounded up further:
+    return (np.ceil(np.round(values / step, 9)) * step).astype(int)
+
+
+class ResourceAdvisor:
+    """Propose wall time and memory resources for the elements of a task, by fitting
+    the run metrics recorded for elements of previous tasks with the same task schemas
+    (see `get_schema_key`) against the elements' numeric input parameters.
+
+    Parameters
+    ----------
+    workflows
+        Workflows whose recorded run metrics are used.
+    parameters
+        Input parameter types that the resources are fitted against. By default, all
+        inputs that have a numeric value for all recorded elements.
+    quantile
+        Quantile of the fit residuals that is added to each prediction.
+    headroom
+        Factor by which predictions are multiplied.
+    walltime_step
+        Proposed wall times are rounded up to a multiple of this number of seconds.
+    memory_step
+        Proposed memory is rounded up to a multiple of this number of mebibytes.
+
+    Notes
+    -----
+    Only successful runs are used. Proposals are no smaller than the largest sample
+    among those with the most similar input values (see `ResourceFit.get_floor`).
+    Proposed memory is fitted to the recorded peak resident set size of the largest
+    process of each element (see `RunMetrics`), so it is the resident memory of
+    elements that run one (possibly multi-threaded) process at a time; it is not
+    virtual memory, and so is not used as SGE's `h_vmem` limit (see the "vmem"
+    resource). Rounding proposals up to coarse steps means that elements with similar
+    proposals share resources, and so may be submitted in the same job array.
+
+    """
+
+    def __init__(
+        self,
+        workflows: Sequence,
+        parameters: Optional[List[str]] = None,
+        quantile: float = 0.95,
+        headroom: float = 1.2,
+        walltime_step: int = 60,
+        memory_step: int = 64,
+    ):
+        self.workflows = list(workflows)
+        self.parameters = parameters
+        self.quantile = quantile
+        self.headroom = headroom
+        self.walltime_step = walltime_step
+        self.memory_step = memory_step
+
+    def get_samples(self, schema_key: str) -> Dict:
+        """Get the recorded wall times and peak memory of successful runs of elements
+        of tasks with a given schema key, and the elements' input values.
+
+        Returns
+        -------
+        samples : dict
+            With keys "inputs" (list of dict of input values, one per run), "wall_time"
+            (seconds) and "peak_rss" (bytes, or -1 if not known).
+
+        """
+        inputs, wall_time, peak_rss = [], [], []
+        for workflow in self.workflows:
+            template = workflow.template
+            metrics = workflow.metrics
+            for task in workflow.tasks:
+                if get_schema_key(task.template) != schema_key:
+                    continue
+                records = metrics.read(task.index)
+                records = records[records["exit_code"] == 0]
+                if not records.size:
+                    continue
+                input_types = task.template.all_schema_input_types
+                elem_inputs = {}
+                for elem_idx in np.unique(records["element_index"]).tolist():
+                    elem_inputs[elem_idx] = {
+                        typ: template.get_input_value(
+                            task.index, elem_idx, ("inputs", typ)
+                        )
+                        for typ in input_types
+                    }
+                inputs.extend(elem_inputs[i] for i in records["element_index"].tolist())
+                wall_time.append(records["wall_time"])
+                peak_rss.append(records["peak_rss"])
+        return {
+            "inputs": inputs,
+            "wall_time": np.concatenate(wall_time) if wall_time else np.zeros(0),
+            "peak_rss": (
+                np.concatenate(peak_rss) if peak_rss else np.zeros(0, dtype=np.int64)
+            ),
+        }
+
+    def _get_parameters(self, inputs: List[Dict]) -> List[str]:
+        if self.parameters is not None:
+            return list(self.parameters)
+        if not inputs:
+            return []
+        return sorted(
+            typ for typ in inputs[0] if all(_is_number(i.get(typ)) for i in inputs)
+        )
+
+    def fit(self, schema_key: str) -> Dict[str, Optional[ResourceFit]]:
+        """Fit the wall time (seconds) and memory (mebibytes) of a task schema's
+        elements. A fit is `None` if there are no samples for it."""
+        samples = self.get_samples(schema_key)
+        parameters = self._get_parameters(samples["inputs"])
+        X = np.array(
+            [[_to_float(i.get(typ)) for typ in parameters] for i in samples["inputs"]],
+            dtype=float,
+        ).reshape(len(samples["inputs"]), len(parameters))
+        valid = ~np.isnan(X).any(axis=1)
+        has_rss = valid & (samples["peak_rss"] >= 0)
+        out = {"walltime": None, "memory": None}
+        if valid.any():
+            out["walltime"] = fit_resource(
+                X[valid], samples["wall_time"][valid], parameters, self.quantile
+            )
+        if has_rss.any():
+            out["memory"] = fit_resource(
+                X[has_rss],
+                samples["peak_rss"][has_rss] / 2**20,
+                parameters,
+                self.quantile,
+            )
+        return out
+
+    def advise(self, workflow, task_index: int, element_indices=None) -> ResourceAdvice:
+        """Propose the wall time and memory of (some of the) elements of a task."""
+        task = workflow.tasks[task_index]
+        if element_indices is None:
+            element_indices = range(task.num_elements)
+        element_indices = list(element_indices)
+        fits = self.fit(get_schema_key(task.template))
+        proposals = {}
+        for name, step in (
+            ("walltime", self.walltime_step),
+            ("memory", self.memory_step),
+        ):
+            fit = fits[name]
+            if fit is None:
+                proposals[name] = np.full(len(element_indices), -1, dtype=int)
+                continue
+            X = np.array(
+                [
+                    [
+                        _to_float(
+                            workflow.template.get_input_value(
+                                task_index, elem_idx, ("inputs", typ)
+                            )
+                        )
+                        for typ in fit.parameters
+                    ]
+                    for elem_idx in element_indices
+                ],
+                dtype=float,
+            ).reshape(len(element_indices), len(fit.parameters))
+            # predictions are no smaller than the samples of the most similar inputs,
+            # since a linear fit may extrapolate below all samples:
+            predicted = np.maximum(
+                fit.predict(np.nan_to_num(X)), fit.get_floor(np.nan_to_num(X))
+            )
+            # elements without numeric values of the fitted parameters cannot be
+            # predicted, so the largest sample is used instead:
+            predicted[np.isnan(X).any(axis=1)] = fit.maximum
+            proposals[name] = np.maximum(
+                _round_up(predicted * self.headroom, step), step
+            )
+        return ResourceAdvice(
+            task_index, element_indices, proposals["walltime"], proposals["memory"]
+        )
+
+    def apply(
+        self,
+        workflow,
+        task_index: int,
+        element_indices=None,
+        per_element: bool = False,
+    ) -> ResourceAdvice:
+        """Propose the wall time and memory of (some of the) elements of a task, and
+        set them as the elements' main resources.
+
+        Parameters
+        ----------
+        per_element
+            If True, each element is given its own proposed resources. Otherwise, all
+            elements are given resources that suffice for the most demanding element,
+            so the elements can be submitted as a single job array.
+
+        """
+        advice = self.advise(workflow, task_index, element_indices)
+        template = workflow.template
+        shared = advice.resources
+        new_resources = {}
+        for pos, elem_idx in enumerate(advice.element_indices):
+            resources = template.get_input_value(task_index, elem_idx, ("resources",))
+            resources = dict(resources or {})
+            resources["main"] = {
+                **get_element_main_resources(resources),
+                **(advice.get_element_resources(pos) if per_element else shared),
+            }
+            new_resources[elem_idx] = resources
+        template.set_element_resources(task_index, new_resources)
+        return advice
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, Real) and not isinstance(value, bool)
+
+
+def _to_float(value) -> float:
+    return float(value) if _is_number(value) else math.nan
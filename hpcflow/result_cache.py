@@ -0,0 +1,273 @@
+"""Module containing a content-keyed cache of element results that may be shared between
+workflows."""
+
+from contextlib import contextmanager
+import hashlib
+import json
+import pickle
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+from hpcflow.actions import OutputFileParserAction
+from hpcflow.command_files import InputFile
+from hpcflow.conditions import (
+    evaluate_action_conditions,
+    get_element_resolved_actions,
+    split_condition_signatures,
+)
+from hpcflow.submission import resolve_element_executables
+
+
+def _json_default(obj):
+    if isinstance(obj, np.ndarray):
+        return {
+            "dtype": str(obj.dtype),
+            "shape": obj.shape,
+            "sha256": hashlib.sha256(np.ascontiguousarray(obj).data).hexdigest(),
+        }
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return repr(obj)
+
+
+def _get_environment_definition(env):
+    return {
+        "name": env.name,
+        "setup": list(env.setup or ()),
+        "executables": {
+            i.label: [repr(j) for j in i.instances] for i in env.executables
+        },
+    }
+
+
+def get_element_fingerprint(
+    workflow, task_index: int, element_index: int, inclusion=None
+) -> str:
+    """Get a hash that identifies the computation performed by an element.
+
+    The fingerprint covers the task schemas (objective, method, implementation and the
+    commands of included actions), the element's resolved input values, the definition
+    of each action environment, the resolved executable instances, and the contents of
+    any input files and input file generator and output file parser sources.
+
+    Parameters
+    ----------
+    inclusion
+        Action inclusion array of the task, as returned by
+        `evaluate_action_conditions`. If not specified, it is evaluated.
+
+    """
+    template = workflow.template
+    task = workflow.tasks[task_index]
+    if inclusion is None:
+        inclusion = evaluate_action_conditions(template, task_index)
+    signatures = split_condition_signatures(task.template, inclusion[element_index])
+    resolved_actions = get_element_resolved_actions(task.template, signatures)
+    resources = template.get_input_value(task_index, element_index, ("resources",))
+
+    data = {
+        "schemas": [
+            {
+                "objective": i.objective.name,
+                "method": i.method,
+                "implementation": i.implementation,
+            }
+            for i in task.template.schemas
+        ],
+        "actions": [
+            {
+                "type": act.__class__.__name__,
+                "commands": [repr(i) for i in getattr(act, "commands", ())],
+                "environment": _get_environment_definition(act.environment),
+            }
+            for act in resolved_actions
+        ],
+        "inputs": {
+            typ: template.get_input_value(task_index, element_index, ("inputs", typ))
+            for typ in sorted(task.template.all_schema_input_types)
+        },
+        "executables": {
+            k: repr(v)
+            for k, v in resolve_element_executables(
+                task, resources, resolved_actions
+            ).items()
+        },
+        "input_files": sorted(
+            i.contents_hash
+            for i in task.template.input_files
+            if isinstance(i, InputFile)
+        ),
+        "sources": sorted(
+            i.contents_hash
+            for i in (
+                *task.template.input_file_generator_sources,
+                *task.template.output_file_parser_sources,
+            )
+        ),
+    }
+    encoded = json.dumps(data, sort_keys=True, default=_json_default).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def get_element_output_files(workflow, task_index: int, element_index: int, inclusion):
+    """Get the paths, relative to the element directory, of the output files of the
+    included output file parsers of an element."""
+    task = workflow.tasks[task_index]
+    elem_dir = workflow.get_element_dir(task_index, element_index)
+    resolved_actions = get_element_resolved_actions(
+        task.template,
+        split_condition_signatures(task.template, inclusion[element_index]),
+    )
+    return sorted(
+        {
+            file_spec.value(elem_dir)
+            for act in resolved_actions
+            if isinstance(act, OutputFileParserAction)
+            for file_spec in act.output_file_parser.output_files
+        }
+    )
+
+
+class ResultCache:
+    """A local cache of element outputs and output files, keyed by element fingerprint.
+
+    Entries are evicted in least-recently-used order once the total size of stored
+    outputs and files exceeds `max_size`. An index of entries is kept in an SQLite
+    database within the cache directory, so a cache may be shared by concurrently
+    running workflows.
+
+    Parameters
+    ----------
+    root
+        Cache directory.
+    max_size
+        Maximum total size of cached entries, in bytes.
+
+    """
+
+    _INDEX_NAME = "index.sqlite"
+    DEFAULT_MAX_SIZE = 10 * 2**30
+
+    def __init__(self, root: Union[Path, str], max_size: int = DEFAULT_MAX_SIZE):
+        self.root = Path(root)
+        self.max_size = max_size
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries "
+                "(fingerprint TEXT PRIMARY KEY, size INTEGER, last_used REAL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.root.joinpath(self._INDEX_NAME), timeout=30)
+        try:
+            with conn:  # commit on success
+                yield conn
+        finally:
+            conn.close()
+
+    def get_entry_dir(self, fingerprint: str) -> Path:
+        return self.root.joinpath(fingerprint[:2], fingerprint[2:])
+
+    @property
+    def size(self) -> int:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()[0]
+
+    def __contains__(self, fingerprint: str):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM entries WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+        return row is not None
+
+    def get(self, fingerprint: str, element_dir: Optional[Path] = None):
+        """Get the cached outputs of an element, or `None` if they are not cached.
+
+        Parameters
+        ----------
+        fingerprint
+            Element fingerprint.
+        element_dir
+            If specified, cached output files are copied into this directory.
+
+        """
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE entries SET last_used = ? WHERE fingerprint = ?",
+                (time.time(), fingerprint),
+            )
+            if not cur.rowcount:
+                return None
+        entry_dir = self.get_entry_dir(fingerprint)
+        try:
+            outputs = pickle.loads(entry_dir.joinpath("outputs.pkl").read_bytes())
+        except FileNotFoundError:
+            return None  # evicted concurrently
+        if element_dir is not None:
+            files_dir = entry_dir.joinpath("files")
+            for path in files_dir.rglob("*"):
+                if path.is_file():
+                    dest = Path(element_dir).joinpath(path.relative_to(files_dir))
+                    dest.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copy2(path, dest)
+        return outputs
+
+    def put(
+        self,
+        fingerprint: str,
+        outputs: Dict,
+        element_dir: Optional[Path] = None,
+        output_files=(),
+    ):
+        """Store the outputs and output files (relative to `element_dir`) of an
+        element, then evict entries if the cache is too large."""
+        entry_dir = self.get_entry_dir(fingerprint)
+        if entry_dir.exists():
+            shutil.rmtree(entry_dir)
+        entry_dir.mkdir(parents=True)
+        outputs_data = pickle.dumps(outputs)
+        entry_dir.joinpath("outputs.pkl").write_bytes(outputs_data)
+        size = len(outputs_data)
+        for rel_path in output_files:
+            src = Path(element_dir).joinpath(rel_path)
+            if src.is_file():
+                dest = entry_dir.joinpath("files", rel_path)
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(src, dest)
+                size += src.stat().st_size
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                (fingerprint, size, time.time()),
+            )
+        self.evict()
+
+    def evict(self):
+        """Remove least-recently-used entries until the cache is within its size
+        limit."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT fingerprint, size FROM entries ORDER BY last_used DESC"
+            ).fetchall()
+            total = 0
+            evicted = []
+            for fingerprint, size in rows:
+                total += size
+                if total > self.max_size:
+                    evicted.append(fingerprint)
+            conn.executemany(
+                "DELETE FROM entries WHERE fingerprint = ?", ((i,) for i in evicted)
+            )
+        for fingerprint in evicted:
+            shutil.rmtree(self.get_entry_dir(fingerprint), ignore_errors=True)
+        return evicted
@@ -0,0 +1,317 @@
+"""Module containing scheduler backends that submit job arrays."""
+
+from dataclasses import dataclass
+import enum
+import os
+from pathlib import Path
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+from hpcflow.errors import SubmissionFailure
+
+
+def format_walltime(seconds: int) -> str:
+    """Format a number of seconds as "HH:MM:SS", where the hours may exceed 24."""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+class JobStatus(enum.Enum):
+
+    PENDING = 0
+    RUNNING = 1
+    FINISHED = 2  # no longer known to the scheduler
+    ERROR = 3
+
+
+@dataclass
+class Scheduler:
+    """Base class for a scheduler that accepts job arrays.
+
+    Parameters
+    ----------
+    submit_cmd : str, optional
+        Executable used to submit a jobscript. If not specified, the scheduler's default
+        is used (e.g. `sbatch` for SLURM).
+    status_cmd : str, optional
+        Executable used to query the status of jobs. If not specified, the scheduler's
+        default is used (e.g. `squeue` for SLURM).
+
+    """
+
+    submit_cmd: Optional[str] = None
+    status_cmd: Optional[str] = None
+
+    DEFAULT_SUBMIT_CMD = None
+    DEFAULT_STATUS_CMD = None
+    DIRECTIVE_PREFIX = None
+
+    # shell expression for the zero-based index of the current array element:
+    ARRAY_INDEX_EXPR = None
+
+    def __post_init__(self):
+        if self.submit_cmd is None:
+            self.submit_cmd = self.DEFAULT_SUBMIT_CMD
+        if self.status_cmd is None:
+            self.status_cmd = self.DEFAULT_STATUS_CMD
+
+    def format_directives(self, num_elements: int, resources: Dict) -> List[str]:
+        return []
+
+    def get_submit_command(
+        self,
+        jobscript: Path,
+        num_elements: int,
+        dependencies: Optional[List[Tuple[str, bool]]] = None,
+    ) -> List[str]:
+        """Get the command that submits a jobscript as a job array.
+
+        Parameters
+        ----------
+        dependencies
+            Job ID of each job array that must finish successfully before the new job
+            array may start, and whether the dependency is element-wise, i.e. whether
+            each new array element need only wait for the element at the same array
+            index of the upstream job array.
+
+        """
+        raise NotImplementedError
+
+    def parse_job_ID(self, stdout: str) -> str:
+        raise NotImplementedError
+
+    def get_status_command(self, job_IDs: List[str]) -> Optional[List[str]]:
+        """Get the command that queries the status of all given jobs at once, or `None`
+        if the scheduler does not need to be queried."""
+        return None
+
+    def parse_status_output(self, stdout: str) -> Dict[str, Dict[int, JobStatus]]:
+        """Parse the output of the status command into a map from job ID to the statuses
+        of the job's (zero-based) array elements. Jobs and array elements that are no
+        longer known to the scheduler are omitted."""
+        return {}
+
+    def is_status_query_failure(self, returncode: int, stderr: str) -> bool:
+        """Whether a run of the status command failed, such that its output does not
+        reflect the status of the queried jobs."""
+        return returncode != 0
+
+    def submit_job_array(
+        self,
+        jobscript: Path,
+        num_elements: int,
+        dependencies: Optional[List[Tuple[str, bool]]] = None,
+    ) -> str:
+        """Submit a jobscript as a job array and return the scheduler job ID."""
+        cmd = self.get_submit_command(jobscript, num_elements, dependencies)
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise SubmissionFailure(
+                f"Job array submission failed with exit code {proc.returncode}; "
+                f"command was: {cmd!r}; stderr: {proc.stderr.strip()!r}."
+            )
+        return self.parse_job_ID(proc.stdout)
+
+
+@dataclass
+class SlurmScheduler(Scheduler):
+
+    DEFAULT_SUBMIT_CMD = "sbatch"
+    DEFAULT_STATUS_CMD = "squeue"
+    DIRECTIVE_PREFIX = "#SBATCH"
+    ARRAY_INDEX_EXPR = "${SLURM_ARRAY_TASK_ID}"
+
+    STATE_CODES = {
+        "PENDING": JobStatus.PENDING,
+        "CONFIGURING": JobStatus.PENDING,
+        "REQUEUED": JobStatus.PENDING,
+        "RUNNING": JobStatus.RUNNING,
+        "COMPLETING": JobStatus.RUNNING,
+        "COMPLETED": JobStatus.FINISHED,
+    }
+
+    def format_directives(self, num_elements, resources):
+        out = [f"{self.DIRECTIVE_PREFIX} --array=0-{num_elements - 1}"]
+        num_cores = resources.get("num_cores", 1)
+        if num_cores > 1:
+            out.append(f"{self.DIRECTIVE_PREFIX} --cpus-per-task={num_cores}")
+        if "walltime" in resources:  # seconds
+            out.append(
+                f"{self.DIRECTIVE_PREFIX} --time={format_walltime(resources['walltime'])}"
+            )
+        if "memory" in resources:  # mebibytes
+            out.append(f"{self.DIRECTIVE_PREFIX} --mem={resources['memory']}M")
+        return out
+
+    def get_submit_command(self, jobscript, num_elements, dependencies=None):
+        cmd = [self.submit_cmd, "--parsable"]
+        if dependencies:
+            # "aftercorr" makes each array element wait for the upstream element with
+            # the same array index; comma-separated conditions must all be satisfied:
+            cmd.append(
+                "--dependency="
+                + ",".join(
+                    f"{'aftercorr' if elementwise else 'afterok'}:{job_ID}"
+                    for job_ID, elementwise in dependencies
+                )
+            )
+        return cmd + [str(jobscript)]
+
+    def parse_job_ID(self, stdout):
+        # `--parsable` output is "<job_ID>[;<cluster_name>]":
+        return stdout.strip().split(";")[0]
+
+    def get_status_command(self, job_IDs):
+        return [
+            self.status_cmd,
+            "--noheader",
+            "--array",  # one line per array element
+            "--format=%i %T",
+            f"--jobs={','.join(job_IDs)}",
+        ]
+
+    def is_status_query_failure(self, returncode, stderr):
+        # `squeue` exits with an error if none of the given jobs are known any more:
+        return returncode != 0 and "Invalid job id specified" not in stderr
+
+    def parse_status_output(self, stdout):
+        out = {}
+        for line in stdout.strip().splitlines():
+            job_arr_ID, state = line.split()
+            job_ID, _, arr_idx = job_arr_ID.partition("_")
+            status = self.STATE_CODES.get(state, JobStatus.ERROR)
+            out.setdefault(job_ID, {})[int(arr_idx or 0)] = status
+        return out
+
+
+@dataclass
+class SGEScheduler(Scheduler):
+    """Scheduler for Sun/Univa/Son of Grid Engine.
+
+    Parameters
+    ----------
+    parallel_environment : str, optional
+        Name of the parallel environment requested for elements that use more than one
+        core. Parallel environments are site-specific; by default, "smp.pe".
+
+    """
+
+    parallel_environment: str = "smp.pe"
+
+    DEFAULT_SUBMIT_CMD = "qsub"
+    DEFAULT_STATUS_CMD = "qstat"
+    DIRECTIVE_PREFIX = "#$"
+    ARRAY_INDEX_EXPR = "$((SGE_TASK_ID - 1))"  # SGE task IDs are one-based
+
+    def format_directives(self, num_elements, resources):
+        out = [
+            f"{self.DIRECTIVE_PREFIX} -t 1-{num_elements}",
+            f"{self.DIRECTIVE_PREFIX} -cwd",
+            # SGE ignores the shebang line (unless the queue uses "unix_behavior"), but
+            # jobscripts require bash:
+            f"{self.DIRECTIVE_PREFIX} -S /bin/bash",
+        ]
+        num_cores = resources.get("num_cores", 1)
+        if num_cores > 1:
+            out.append(
+                f"{self.DIRECTIVE_PREFIX} -pe {self.parallel_environment} {num_cores}"
+            )
+        if "walltime" in resources:  # seconds
+            out.append(
+                f"{self.DIRECTIVE_PREFIX} -l h_rt={format_walltime(resources['walltime'])}"
+            )
+        # `h_vmem` limits virtual memory, which may greatly exceed the resident memory
+        # of the "memory" resource (e.g. as proposed from recorded peak RSS), so only
+        # the separate "vmem" resource is requested:
+        if "vmem" in resources:  # mebibytes, per element
+            # `h_vmem` is per slot (core), so the memory is divided between the slots:
+            per_slot = -(-resources["vmem"] // num_cores)
+            out.append(f"{self.DIRECTIVE_PREFIX} -l h_vmem={per_slot}M")
+        return out
+
+    def get_submit_command(self, jobscript, num_elements, dependencies=None):
+        cmd = [self.submit_cmd, "-terse"]
+        # "-hold_jid_ad" makes each array task wait for the upstream task with the same
+        # task ID:
+        elementwise = [i for i, j in dependencies or () if j]
+        other = [i for i, j in dependencies or () if not j]
+        if elementwise:
+            cmd.extend(["-hold_jid_ad", ",".join(elementwise)])
+        if other:
+            cmd.extend(["-hold_jid", ",".join(other)])
+        return cmd + [str(jobscript)]
+
+    def parse_job_ID(self, stdout):
+        # `-terse` output for array jobs is "<job_ID>.<first>-<last>:<step>":
+        return stdout.strip().split(".")[0]
+
+    def get_status_command(self, job_IDs):
+        # `qstat` cannot filter by job ID, so all of the user's jobs are listed:
+        return [self.status_cmd]
+
+    @staticmethod
+    def _parse_state(state):
+        if "E" in state:
+            return JobStatus.ERROR
+        elif "r" in state or "t" in state:
+            return JobStatus.RUNNING
+        return JobStatus.PENDING
+
+    @staticmethod
+    def _parse_task_IDs(task_IDs):
+        # e.g. "3", "1-4:1" or "1,3,5":
+        out = []
+        for i in task_IDs.split(","):
+            rng, _, step = i.partition(":")
+            first, _, last = rng.partition("-")
+            out.extend(range(int(first), int(last or first) + 1, int(step or 1)))
+        return out
+
+    def parse_status_output(self, stdout):
+        out = {}
+        for line in stdout.strip().splitlines()[2:]:  # skip header and rule lines
+            parts = line.split()
+            if not parts:
+                continue
+            job_ID, state = parts[0], parts[4]
+            # the queue column is empty for pending jobs, and the array task IDs column
+            # is only present for array jobs:
+            slots_idx = 8 if "@" in parts[7] else 7
+            task_IDs = parts[slots_idx + 1] if len(parts) > slots_idx + 1 else "1"
+            status = self._parse_state(state)
+            for task_ID in self._parse_task_IDs(task_IDs):
+                out.setdefault(job_ID, {})[task_ID - 1] = status
+        return out
+
+
+@dataclass
+class DirectScheduler(Scheduler):
+    """Run each array element of a jobscript directly, in sequence, in a local shell."""
+
+    DEFAULT_SUBMIT_CMD = "bash"
+    ARRAY_INDEX_ENV_VAR = "HPCFLOW_ARRAY_INDEX"
+    ARRAY_INDEX_EXPR = f"${{{ARRAY_INDEX_ENV_VAR}}}"
+
+    def __post_init__(self):
+        super().__post_init__()
+        self._num_submitted = 0
+
+    def get_submit_command(self, jobscript, num_elements, dependencies=None):
+        # job arrays run in submission order, so dependencies are always satisfied:
+        return [self.submit_cmd, str(jobscript)]
+
+    def submit_job_array(self, jobscript, num_elements, dependencies=None):
+        cmd = self.get_submit_command(jobscript, num_elements)
+        for arr_idx in range(num_elements):
+            env = {**os.environ, self.ARRAY_INDEX_ENV_VAR: str(arr_idx)}
+            proc = subprocess.run(cmd, capture_output=True, text=True, env=env)
+            if proc.returncode != 0:
+                raise SubmissionFailure(
+                    f"Direct execution of array element {arr_idx} failed with exit code "
+                    f"{proc.returncode}; command was: {cmd!r}; stderr: "
+                    f"{proc.stderr.strip()!r}."
+                )
+        job_ID = str(self._num_submitted)
+        self._num_submitted += 1
+        return job_ID
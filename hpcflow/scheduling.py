@@ -0,0 +1,291 @@
+"""Module containing a critical-path scheduling policy that prioritises elements using
+the recorded runtimes of previous runs of the same task schemas, and an offline
+simulation for comparing the makespans of scheduling policies."""
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+import heapq
+from pathlib import Path
+import sqlite3
+import time
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from hpcflow.dag import CSRGraph, WorkflowDAG
+from hpcflow.errors import DependencyCycleError, InsufficientCoresError
+
+
+def get_schema_key(task_template) -> str:
+    """Get the key under which the runtimes of a task template's elements are recorded,
+    which identifies the objective, method and implementation of its task schemas."""
+    return task_template.name
+
+
+class RuntimeHistory:
+    """A record of the wall times of executed elements, keyed by task schema, which may
+    be shared between workflows.
+
+    Parameters
+    ----------
+    path
+        Path to the SQLite database file.
+    max_records
+        Maximum number of most-recent runtimes that are used per task schema.
+
+    """
+
+    def __init__(self, path: Union[Path, str], max_records: int = 1000):
+        self.path = Path(path)
+        self.max_records = max_records
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS runtimes "
+                "(schema_key TEXT, wall_time REAL, recorded REAL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS runtimes_key ON runtimes (schema_key)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:  # commit on success
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, schema_key: str, wall_times: Sequence[float]):
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO runtimes VALUES (?, ?, ?)",
+                ((schema_key, float(i), now) for i in wall_times),
+            )
+
+    def get_runtimes(self, schema_key: str) -> np.ndarray:
+        """Get the most recent recorded runtimes of a task schema."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT wall_time FROM runtimes WHERE schema_key = ? "
+                "ORDER BY recorded DESC LIMIT ?",
+                (schema_key, self.max_records),
+            ).fetchall()
+        return np.array([i[0] for i in rows], dtype=float)
+
+    def estimate(self, schema_key: str) -> Optional[float]:
+        """Get the median recorded runtime of a task schema, or `None` if no runtimes
+        are recorded."""
+        runtimes = self.get_runtimes(schema_key)
+        return float(np.median(runtimes)) if runtimes.size else None
+
+
+def get_critical_path_priorities(graph: CSRGraph, runtimes) -> np.ndarray:
+    """Get the length of the longest (by runtime) path from each node to any sink node,
+    including the node's own runtime.
+
+    Nodes are processed one level at a time, in reverse topological order, so the cost
+    is proportional to the number of edges plus the number of levels.
+
+    """
+    priorities = np.array(runtimes, dtype=float)
+    if not graph.num_nodes:
+        return priorities
+    levels = graph.get_levels()
+    order = np.argsort(levels, kind="stable")
+    bounds = np.searchsorted(levels[order], np.arange(levels.max() + 2))
+    counts = np.diff(graph.indptr)
+    for level in range(levels.max(), -1, -1):
+        nodes = order[bounds[level] : bounds[level + 1]]
+        nodes = nodes[counts[nodes] > 0]
+        if not nodes.size:
+            continue
+        succ_priorities = priorities[graph.get_neighbours(nodes)]
+        starts = np.cumsum(counts[nodes]) - counts[nodes]
+        priorities[nodes] += np.maximum.reduceat(succ_priorities, starts)
+    return priorities
+
+
+@dataclass
+class CriticalPathPolicy:
+    """A scheduling policy that starts elements on the critical path of the workflow
+    first.
+
+    Each element's runtime is estimated as the median recorded runtime of its task
+    schema, and its priority is the estimated runtime of the longest path from the
+    element through its downstream elements.
+
+    Parameters
+    ----------
+    history
+        Recorded runtimes of previous runs.
+    default_runtime
+        Estimated runtime, in seconds, of elements whose task schema has no recorded
+        runtimes.
+
+    """
+
+    history: RuntimeHistory
+    default_runtime: float = 60.0
+
+    def estimate_runtimes(
+        self, workflow, dag: Optional[WorkflowDAG] = None
+    ) -> np.ndarray:
+        """Get the estimated runtime of each element node of a workflow. The workflow's
+        DAG is loaded if it is not given."""
+        if dag is None:
+            dag = workflow.dag
+        estimates = []
+        for task in workflow.tasks:
+            estimate = self.history.estimate(get_schema_key(task.template))
+            estimates.append(self.default_runtime if estimate is None else estimate)
+        return np.array(estimates, dtype=float)[dag.element_task]
+
+    def get_priorities(self, workflow, dag: Optional[WorkflowDAG] = None) -> np.ndarray:
+        """Get the priority of each element node of a workflow. The workflow's DAG is
+        loaded if it is not given."""
+        if dag is None:
+            dag = workflow.dag
+        return get_critical_path_priorities(
+            dag.element_graph, self.estimate_runtimes(workflow, dag)
+        )
+
+    def order_job_arrays(self, workflow, job_arrays: List) -> List:
+        """Order job arrays so that each comes after the job arrays that it depends on.
+
+        Job arrays are taken in topological order of the dependencies between their
+        elements. Among the job arrays whose dependencies are all ordered, those of
+        tasks at a lower depth of the task graph come first, then those with the
+        longest critical paths.
+
+        """
+        dag = workflow.dag
+        task_levels = dag.task_graph.get_levels()
+        priorities = self.get_priorities(workflow, dag)
+        array_nodes = [
+            dag.get_element_nodes(i.task_index, i.element_indices) for i in job_arrays
+        ]
+        graph = dag.get_group_graph(array_nodes)
+
+        def sort_key(idx):
+            job_array = job_arrays[idx]
+            return (
+                task_levels[job_array.task_index],
+                -priorities[array_nodes[idx]].max(),
+                idx,
+            )
+
+        in_degree = graph.in_degree()
+        ready = [sort_key(i) for i in np.flatnonzero(in_degree == 0).tolist()]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            idx = heapq.heappop(ready)[-1]
+            order.append(idx)
+            for succ in graph.successors(idx).tolist():
+                in_degree[succ] -= 1
+                if not in_degree[succ]:
+                    heapq.heappush(ready, sort_key(succ))
+        if len(order) < len(job_arrays):
+            raise DependencyCycleError(
+                "Job arrays cannot be ordered, because the dependencies between their "
+                "elements form a cycle."
+            )
+        return [job_arrays[i] for i in order]
+
+
+def simulate_makespan(
+    graph: CSRGraph,
+    runtimes,
+    max_cores: int,
+    num_cores=None,
+    priorities=None,
+) -> float:
+    """Simulate running the nodes of a dependency graph with a fixed number of core
+    slots, and return the time at which the last node finishes.
+
+    Whenever slots are free, the ready node with the highest priority that fits in the
+    free slots is started, as by `LocalExecutor`. Without priorities, nodes are
+    started in index order.
+
+    Parameters
+    ----------
+    graph
+        Dependency graph, e.g. `WorkflowDAG.element_graph`.
+    runtimes
+        Runtime of each node, e.g. as recorded in a previous run.
+    max_cores
+        Number of core slots.
+    num_cores
+        Number of core slots occupied by each node. By default, one.
+    priorities
+        Priority of each node, e.g. from `get_critical_path_priorities`.
+
+    """
+    runtimes = np.asarray(runtimes, dtype=float)
+    num_nodes = graph.num_nodes
+    if num_cores is None:
+        num_cores = np.ones(num_nodes, dtype=int)
+    if priorities is None:
+        priorities = np.zeros(num_nodes)
+    if num_nodes and np.max(num_cores) > max_cores:
+        raise InsufficientCoresError(
+            f"A node requires {np.max(num_cores)} cores, but only {max_cores} are "
+            f"available."
+        )
+    in_degree = graph.in_degree()
+
+    ready = [(-priorities[i], i) for i in np.flatnonzero(in_degree == 0).tolist()]
+    heapq.heapify(ready)
+    running = []  # (end time, node)
+    now = 0.0
+    free = max_cores
+    while ready or running:
+        skipped = []
+        while ready:
+            item = heapq.heappop(ready)
+            node = item[1]
+            if num_cores[node] <= free:
+                free -= num_cores[node]
+                heapq.heappush(running, (now + runtimes[node], node))
+            else:
+                skipped.append(item)
+        for item in skipped:
+            heapq.heappush(ready, item)
+
+        now, node = heapq.heappop(running)
+        free += num_cores[node]
+        for succ in graph.successors(node).tolist():
+            in_degree[succ] -= 1
+            if not in_degree[succ]:
+                heapq.heappush(ready, (-priorities[succ], succ))
+    return now
+
+
+def compare_policies(
+    graph: CSRGraph, runtimes, max_cores: int, estimated_runtimes=None, num_cores=None
+) -> Dict[str, float]:
+    """Compare the simulated makespans of first-in-first-out and critical-path
+    scheduling of a dependency graph, replaying recorded runtimes.
+
+    Parameters
+    ----------
+    runtimes
+        Actual runtime of each node.
+    estimated_runtimes
+        Runtime estimates from which critical-path priorities are computed (e.g. the
+        median recorded runtime of each node's task schema). By default, the actual
+        runtimes are used, which gives the best case of the critical-path policy.
+
+    """
+    if estimated_runtimes is None:
+        estimated_runtimes = runtimes
+    priorities = get_critical_path_priorities(graph, estimated_runtimes)
+    return {
+        "fifo": simulate_makespan(graph, runtimes, max_cores, num_cores),
+        "critical_path": simulate_makespan(
+            graph, runtimes, max_cores, num_cores, priorities
+        ),
+    }
@@ -0,0 +1,532 @@
+"""Module containing a columnar encoding of nested parameter values, in which the values
+of a parameter for all elements of a task are shredded into one typed column per
+sub-parameter path, each with a mask of the elements that have a value at that path.
+
+Reading a sub-parameter (e.g. `("inputs", "material", "elastic", "C11")`) then reads
+only the columns at or below that path, and whole values are reassembled only when they
+are requested. Values are shredded when they are written: only the elements whose
+values change are written to the columns.
+
+"""
+
+from collections.abc import Mapping
+import json
+from numbers import Number
+from typing import Dict, List, Optional, Tuple
+
+import numcodecs
+import numpy as np
+import zarr
+
+from hpcflow.storage import ArrayStorage
+from hpcflow.utils import get_in_container
+
+# column kinds, and the fill value of elements that do not have a value:
+COLUMN_KINDS = {
+    "int": 0,
+    "float": np.nan,
+    "bool": False,
+    "str": "",
+    "list": None,  # ragged list of numbers, stored as flat values and offsets
+    "json": "",  # other JSON-serialisable values, stored as JSON
+    "object": None,  # any other value (e.g. an array), stored pickled
+}
+
+_ABSENT = object()  # a sub-value that an element does not have
+
+_INT64 = np.iinfo(np.int64)
+
+
+def flatten_value(value, prefix=()) -> Dict:
+    """Flatten a nested parameter value into a map from the path of each non-dict
+    sub-value (as a tuple) to that sub-value. Lists and empty dicts are leaves."""
+    if isinstance(value, Mapping) and value:
+        out = {}
+        for key, sub_value in value.items():
+            out.update(flatten_value(sub_value, (*prefix, key)))
+        return out
+    return {prefix: value}
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, Number) and not isinstance(value, bool)
+
+
+def is_large_int(value) -> bool:
+    """Check if a value is an integer outside the range of int64, which cannot be
+    stored in a numeric column without overflow or loss of precision."""
+    return (
+        isinstance(value, (int, np.integer))
+        and not isinstance(value, bool)
+        and not _INT64.min <= int(value) <= _INT64.max
+    )
+
+
+def get_column_kind(values: List) -> str:
+    """Get the kind of column that can hold all of the given (present) values."""
+    if all(isinstance(i, bool) for i in values):
+        return "bool"
+    if not any(is_large_int(i) for i in values):
+        if all(
+            isinstance(i, (int, np.integer)) and not isinstance(i, bool) for i in values
+        ):
+            return "int"
+        if all(_is_number(i) for i in values):
+            return "float"
+    if all(isinstance(i, str) for i in values):
+        return "str"
+    if all(
+        isinstance(i, list) and all(_is_number(j) and not is_large_int(j) for j in i)
+        for i in values
+    ):
+        return "list"
+    try:
+        json.dumps(values)
+    except (TypeError, ValueError):
+        return "object"
+    return "json"
+
+
+def shred_values(values: List, present: Optional[np.ndarray] = None) -> Dict:
+    """Shred the parameter values of multiple elements into columns by sub-parameter
+    path.
+
+    Parameters
+    ----------
+    values
+        The parameter value of each element.
+    present
+        Whether each element has a value. By default, all elements have a value.
+
+    Returns
+    -------
+    columns : dict of (tuple, tuple of (list, ndarray of bool))
+        For each path, relative to the parameter, the sub-value of each element (or
+        `None`) and whether each element has a sub-value at that path.
+
+    """
+    num_elems = len(values)
+    if present is None:
+        present = np.ones(num_elems, dtype=bool)
+    columns = {}
+    for elem_idx in np.flatnonzero(present).tolist():
+        for path, sub_value in flatten_value(values[elem_idx]).items():
+            if path not in columns:
+                columns[path] = ([None] * num_elems, np.zeros(num_elems, dtype=bool))
+            columns[path][0][elem_idx] = sub_value
+            columns[path][1][elem_idx] = True
+    return columns
+
+
+def _set_in_nested(value, path: Tuple, sub_value):
+    """Set a sub-value of a nested dict, creating intermediate dicts as needed, and
+    return the (possibly new) outer value."""
+    if not path:
+        return sub_value
+    if not isinstance(value, dict):
+        value = {}
+    current = value
+    for key in path[:-1]:
+        if not isinstance(current.get(key), dict):
+            current[key] = {}
+        current = current[key]
+    current[path[-1]] = sub_value
+    return value
+
+
+class ShreddedParameter:
+    """The shredded values of a parameter for all elements of a task, stored in a Zarr
+    group as one sub-group of arrays per sub-parameter path.
+
+    Each column sub-group has a "present" mask array and, depending on the column kind,
+    either a "values" array of one item per element, or (for ragged lists of numbers) a
+    "values" array of the concatenated list items and an "offsets" array that gives the
+    start of each element's list.
+
+    """
+
+    def __init__(self, group: zarr.Group, storage: Optional[ArrayStorage] = None):
+        self.group = group
+        self.storage = storage
+
+    @property
+    def num_elements(self) -> int:
+        return self.group.attrs["num_elements"]
+
+    @property
+    def paths(self) -> List[Tuple]:
+        """The sub-parameter path of each column."""
+        return [tuple(i) for i in self.group.attrs["paths"]]
+
+    @property
+    def kinds(self) -> List[str]:
+        return self.group.attrs["kinds"]
+
+    def _write_array(self, group: zarr.Group, name: str, arr: np.ndarray, codec=None):
+        kwargs = {}
+        if self.storage is not None:
+            kwargs = self.storage.get_array_kwargs(len(arr), arr.dtype)
+        if arr.dtype == object:
+            kwargs["object_codec"] = codec or numcodecs.VLenUTF8()
+        group.array(name, arr, overwrite=True, **kwargs)
+
+    @classmethod
+    def create(
+        cls,
+        group: zarr.Group,
+        values: List,
+        present: Optional[np.ndarray] = None,
+        version: Optional[int] = None,
+        storage: Optional[ArrayStorage] = None,
+    ):
+        """Shred and write the values of a parameter, replacing any existing columns in
+        the group."""
+        out = cls(group, storage)
+        for key in list(group.group_keys()):
+            del group[key]
+        paths, kinds = [], []
+        for col_idx, (path, (col_values, col_present)) in enumerate(
+            shred_values(values, present).items()
+        ):
+            kind = get_column_kind([i for i, j in zip(col_values, col_present) if j])
+            col_group = group.create_group(str(col_idx))
+            out._write_array(col_group, "present", col_present)
+            out._write_column(col_group, kind, col_values, col_present)
+            paths.append(list(path))
+            kinds.append(kind)
+        group.attrs.put(
+            {
+                "version": version,
+                "num_elements": len(values),
+                "paths": paths,
+                "kinds": kinds,
+            }
+        )
+        return out
+
+    def update(
+        self,
+        element_indices: List[int],
+        values: List,
+        present: Optional[np.ndarray] = None,
+        num_elements: Optional[int] = None,
+        version: Optional[int] = None,
+    ):
+        """Shred and write the values of some elements, leaving the values of other
+        elements unchanged.
+
+        Parameters
+        ----------
+        element_indices
+            Indices of the elements whose values are given, which may include new
+            elements (up to `num_elements`).
+        values
+            The parameter value of each given element.
+        present
+            Whether each given element has a value. By default, all given elements have
+            a value.
+        num_elements
+            The new number of elements, if elements have been added.
+        version
+            The version of the parameter values after the update.
+
+        """
+        element_indices = np.asarray(element_indices, dtype=np.int64)
+        if num_elements is not None and num_elements > self.num_elements:
+            self._resize(num_elements)
+        num_elements = self.num_elements
+        paths, kinds = self.paths, self.kinds
+        new_columns = shred_values(values, present)
+        for col_idx, path in enumerate(paths):
+            col_values, col_present = new_columns.pop(
+                path, ([None] * len(values), np.zeros(len(values), dtype=bool))
+            )
+            kinds[col_idx] = self._update_column(
+                col_idx, kinds[col_idx], element_indices, col_values, col_present
+            )
+        for path, (col_values, col_present) in new_columns.items():
+            # a new column, at whose path the other elements do not have a value:
+            all_values = [None] * num_elements
+            all_present = np.zeros(num_elements, dtype=bool)
+            for pos, elem_idx in enumerate(element_indices.tolist()):
+                all_values[elem_idx] = col_values[pos]
+                all_present[elem_idx] = col_present[pos]
+            kind = get_column_kind([i for i, j in zip(col_values, col_present) if j])
+            col_group = self.group.create_group(str(len(paths)))
+            self._write_array(col_group, "present", all_present)
+            self._write_column(col_group, kind, all_values, all_present)
+            paths.append(path)
+            kinds.append(kind)
+        self.group.attrs.update(
+            {
+                "version": version,
+                "paths": [list(i) for i in paths],
+                "kinds": kinds,
+            }
+        )
+
+    def _resize(self, num_elements: int):
+        """Add elements that do not have a value at any path."""
+        old_num = self.num_elements
+        for col_idx, kind in enumerate(self.kinds):
+            col_group = self.group[str(col_idx)]
+            col_group["present"].resize(num_elements)
+            col_group["present"][old_num:] = False
+            if kind == "list":
+                offsets = col_group["offsets"]
+                end = offsets[old_num]
+                offsets.resize(num_elements + 1)
+                offsets[old_num + 1 :] = end
+            else:
+                fill = np.empty(num_elements - old_num, dtype=col_group["values"].dtype)
+                fill[:] = COLUMN_KINDS[kind]
+                col_group["values"].resize(num_elements)
+                col_group["values"][old_num:] = fill
+        self.group.attrs["num_elements"] = num_elements
+
+    def _update_column(self, col_idx, kind, element_indices, values, present) -> str:
+        """Write the sub-values of some elements to a column, in place if the column's
+        kind can hold them, and otherwise by rewriting the column. Returns the (possibly
+        new) column kind."""
+        col_group = self.group[str(col_idx)]
+        present_values = [i for i, j in zip(values, present) if j]
+        new_kind = get_column_kind(present_values) if present_values else kind
+        if kind != "list" and (
+            new_kind == kind or (kind == "float" and new_kind == "int")
+        ):
+            fill = COLUMN_KINDS[kind]
+            data = np.empty(len(values), dtype=col_group["values"].dtype)
+            for pos, (value, is_present) in enumerate(zip(values, present)):
+                if not is_present:
+                    value = fill
+                elif kind == "json":
+                    value = json.dumps(value)
+                data[pos] = value
+            col_group["present"].set_coordinate_selection(element_indices, present)
+            col_group["values"].set_coordinate_selection(element_indices, data)
+            return kind
+
+        all_values = self._get_column_values(col_idx)
+        for pos, elem_idx in enumerate(element_indices.tolist()):
+            all_values[elem_idx] = values[pos] if present[pos] else _ABSENT
+        all_present = np.array([i is not _ABSENT for i in all_values], dtype=bool)
+        all_values = [None if i is _ABSENT else i for i in all_values]
+        kind = get_column_kind([i for i, j in zip(all_values, all_present) if j])
+        for key in list(col_group.array_keys()):
+            del col_group[key]
+        self._write_array(col_group, "present", all_present)
+        self._write_column(col_group, kind, all_values, all_present)
+        return kind
+
+    def _write_column(self, group, kind, values, present):
+        fill = COLUMN_KINDS[kind]
+        if kind == "list":
+            lengths = [len(i) if j else 0 for i, j in zip(values, present)]
+            flat = [k for i, j in zip(values, present) if j for k in i]
+            dtype = np.int64 if get_column_kind(flat) == "int" else float
+            offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+            self._write_array(group, "values", np.array(flat, dtype=dtype))
+            self._write_array(group, "offsets", offsets)
+            return
+        if kind == "object":
+            # assign items one by one, so that equal-shape arrays are not stacked:
+            data = np.empty(len(values), dtype=object)
+            for idx, (value, is_present) in enumerate(zip(values, present)):
+                data[idx] = value if is_present else fill
+            self._write_array(group, "values", data, codec=numcodecs.Pickle())
+            return
+        if kind == "json":
+            values = [json.dumps(i) if j else fill for i, j in zip(values, present)]
+        dtype = {"int": np.int64, "float": float, "bool": bool}.get(kind, object)
+        data = np.array(
+            [i if j else fill for i, j in zip(values, present)], dtype=dtype
+        )
+        self._write_array(group, "values", data)
+
+    def _read_array(self, arr: zarr.Array, element_indices) -> np.ndarray:
+        if element_indices is None:
+            return arr[:]
+        if not len(element_indices):
+            return np.zeros(0, dtype=arr.dtype)
+        return arr.get_coordinate_selection(element_indices)
+
+    def read_column(self, col_idx: int, element_indices=None) -> np.ma.MaskedArray:
+        """Read a column as a masked array, in which elements that do not have a value
+        at the column's path are masked. Ragged lists are returned as an object array of
+        arrays, and JSON values are decoded."""
+        col_group = self.group[str(col_idx)]
+        kind = self.kinds[col_idx]
+        if element_indices is not None:
+            element_indices = np.asarray(element_indices, dtype=np.int64)
+        present = self._read_array(col_group["present"], element_indices)
+        if kind == "list":
+            offsets = col_group["offsets"][:]
+            if element_indices is None:
+                element_indices = np.arange(self.num_elements)
+            flat = col_group["values"]
+            data = np.empty(len(element_indices), dtype=object)
+            # read the span of list items of the selected elements at once:
+            if len(element_indices):
+                lo = offsets[element_indices].min()
+                hi = offsets[element_indices + 1].max()
+                span = flat[lo:hi]
+                for pos, elem_idx in enumerate(element_indices.tolist()):
+                    data[pos] = span[
+                        offsets[elem_idx] - lo : offsets[elem_idx + 1] - lo
+                    ]
+        else:
+            data = self._read_array(col_group["values"], element_indices)
+            if kind == "json":
+                decoded = np.empty(len(data), dtype=object)
+                for pos, (value, is_present) in enumerate(zip(data, present)):
+                    decoded[pos] = json.loads(value) if is_present else None
+                data = decoded
+        return np.ma.masked_array(data, mask=~present)
+
+    def get_values(self, path: Tuple = (), element_indices=None) -> List:
+        """Get the (sub-)value at a path, relative to the parameter, of all elements or
+        of the given elements, reading only the columns at or below the path. Elements
+        that do not have a value at the path are `None`."""
+        path = tuple(path)
+        paths = self.paths
+        num_out = self.num_elements if element_indices is None else len(element_indices)
+        below = [i for i, p in enumerate(paths) if p[: len(path)] == path]
+        if not below:
+            # the path may be within a column's values (e.g. an item of a list):
+            for col_idx, col_path in enumerate(paths):
+                if path[: len(col_path)] == col_path:
+                    out = []
+                    for value in self._get_column_values(col_idx, element_indices):
+                        try:
+                            out.append(get_in_container(value, path[len(col_path) :]))
+                        except (TypeError, KeyError, IndexError, ValueError):
+                            out.append(None)
+                    return out
+            return [None] * num_out
+
+        out = [None] * num_out
+        for col_idx in below:
+            rel_path = paths[col_idx][len(path) :]
+            column = self._get_column_values(col_idx, element_indices)
+            for pos, sub_value in enumerate(column):
+                if sub_value is not _ABSENT:
+                    out[pos] = _set_in_nested(out[pos], rel_path, sub_value)
+        return out
+
+    def _get_column_values(self, col_idx: int, element_indices=None) -> List:
+        column = self.read_column(col_idx, element_indices)
+        data = np.ma.getdata(column)
+        mask = np.ma.getmaskarray(column)
+        if self.kinds[col_idx] == "list":
+            data = [i.tolist() if i is not None else None for i in data]
+        else:
+            data = data.tolist()
+        return [_ABSENT if j else i for i, j in zip(data, mask)]
+
+
+class ShreddedParameterStore:
+    """Shredded parameter values of the elements of a workflow, stored in the
+    "parameters" group of the workflow store.
+
+    The values of each parameter of a task are versioned by the workflow template (see
+    `WorkflowTemplate.get_parameter_version`). The workflow updates the columns of the
+    modified elements when it writes parameter values (see `update`); if the template
+    is modified otherwise, a parameter's values are re-shredded when they are next read.
+
+    """
+
+    def __init__(self, workflow):
+        self.workflow = workflow
+        self.storage = workflow.storage.get("parameters")
+        self._group = None
+
+    @property
+    def group(self) -> zarr.Group:
+        if self._group is None:
+            self._group = self.workflow.root.require_group("parameters/shredded")
+        return self._group
+
+    def _get_element_values(
+        self, task_index: int, parameter_path: Tuple, element_indices=None
+    ):
+        template = self.workflow.template
+        if element_indices is None:
+            element_indices = range(template.tasks[task_index].num_elements)
+        if parameter_path[0] == "outputs":
+            values, present = [], np.zeros(len(element_indices), dtype=bool)
+            for pos, elem_idx in enumerate(element_indices):
+                data_idx = template.get_element_output_data_indices(
+                    task_index, elem_idx
+                )
+                datum = template.parameter_data[data_idx[parameter_path[1]]]
+                values.append(datum["data"])
+                present[pos] = datum["is_set"]
+            return values, present
+        # inputs sourced from outputs that are not yet set have no value:
+        values = template.get_input_values(task_index, parameter_path, element_indices)
+        return values, np.array([i is not None for i in values], dtype=bool)
+
+    def get_parameter(self, task_index: int, parameter_path) -> ShreddedParameter:
+        """Get the shredded values of an input, output or resources parameter of a task,
+        e.g. `("inputs", "material")`, shredding all of its values if the parameter has
+        been modified since it was shredded."""
+        template = self.workflow.template
+        parameter_path = template.get_parameter_root(parameter_path)
+        group = self.group.require_group(f"{task_index}/{'.'.join(parameter_path)}")
+        version = template.get_parameter_version(task_index, parameter_path)
+        num_elems = template.tasks[task_index].num_elements
+        if (
+            group.attrs.get("version") == version
+            and group.attrs.get("num_elements") == num_elems
+        ):
+            return ShreddedParameter(group, self.storage)
+        values, present = self._get_element_values(task_index, parameter_path)
+        return ShreddedParameter.create(group, values, present, version, self.storage)
+
+    def create(self, task_index: int):
+        """Shred the input and output values of all elements of a task."""
+        for parameter_path in self.workflow.template.get_parameter_roots(task_index):
+            if parameter_path[0] != "resources":
+                self.get_parameter(task_index, parameter_path)
+
+    def update(self, modified: Dict[Tuple, List[int]], versions: Dict[Tuple, int]):
+        """Shred the values of modified (or new) elements after the workflow template
+        has been modified.
+
+        Parameters
+        ----------
+        modified
+            Task-local indices of the modified elements, keyed by task index and
+            parameter root path.
+        versions
+            The version of each modified parameter (with the same keys as `modified`)
+            before the modification. Parameters that were not shredded at that version
+            are re-shredded in full when they are next read.
+
+        """
+        template = self.workflow.template
+        for (task_index, parameter_path), element_indices in modified.items():
+            name = f"{task_index}/{'.'.join(parameter_path)}"
+            if name not in self.group:
+                continue
+            group = self.group[name]
+            if group.attrs.get("version") != versions[(task_index, parameter_path)]:
+                continue
+            values, present = self._get_element_values(
+                task_index, parameter_path, element_indices
+            )
+            ShreddedParameter(group, self.storage).update(
+                element_indices,
+                values,
+                present,
+                num_elements=template.tasks[task_index].num_elements,
+                version=template.get_parameter_version(task_index, parameter_path),
+            )
+
+    def get_values(self, task_index: int, path, element_indices=None) -> List:
+        """Get the values of a parameter path (e.g. `("inputs", "material", "elastic",
+        "C11")`) of all elements of a task, or of the given elements."""
+        path = tuple(path)
+        parameter = self.get_parameter(task_index, path)
+        root = self.workflow.template.get_parameter_root(path)
+        return parameter.get_values(path[len(root) :], element_indices)
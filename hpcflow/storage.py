@@ -0,0 +1,155 @@
+"""Module containing the chunking and compression settings of the arrays of a workflow
+store, and an auto-tuner that picks chunk sizes from the number of elements and the
+value dtype of an array."""
+
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Optional
+
+import numcodecs
+import numpy as np
+
+# compressor names and the codecs they denote; Blosc compressors split each chunk into
+# blocks that are (optionally) byte-shuffled and compressed with multiple threads:
+COMPRESSORS = {
+    "blosc-lz4": lambda clevel, shuffle: numcodecs.Blosc("lz4", clevel, shuffle),
+    "blosc-zstd": lambda clevel, shuffle: numcodecs.Blosc("zstd", clevel, shuffle),
+    "lz4": lambda clevel, shuffle: numcodecs.LZ4(acceleration=1),
+    "zstd": lambda clevel, shuffle: numcodecs.Zstd(level=clevel),
+    "zlib": lambda clevel, shuffle: numcodecs.Zlib(level=clevel),
+    "none": lambda clevel, shuffle: None,
+}
+
+# kinds of store array that may be configured separately:
+ARRAY_KINDS = ("metrics", "dag", "parameters")
+
+DEFAULT_TARGET_CHUNK_BYTES = 2**20
+MIN_CHUNK_SIZE = 64
+
+
+def _next_power_of_two(num: int) -> int:
+    return 1 << max(int(num) - 1, 0).bit_length()
+
+
+def get_auto_chunk_size(
+    num_elements: Optional[int],
+    dtype,
+    target_chunk_bytes: int = DEFAULT_TARGET_CHUNK_BYTES,
+) -> int:
+    """Get a chunk size (number of items along the first axis) of about
+    `target_chunk_bytes` for items of a given dtype, rounded down to a power of two.
+
+    Chunks are no larger than needed to hold `num_elements` items (rounded up to a power
+    of two), so that small arrays occupy a single small chunk, and no smaller than
+    `MIN_CHUNK_SIZE` items, so that large arrays of large items are not split into very
+    many chunk files.
+
+    Parameters
+    ----------
+    num_elements
+        Expected number of items, or `None` if not known (e.g. for arrays that are
+        appended to).
+    dtype
+        Dtype of the array items; object items are assumed to be pointer-sized.
+
+    """
+    itemsize = max(np.dtype(dtype).itemsize, 1)
+    size = 1 << (max(int(target_chunk_bytes // itemsize), 1).bit_length() - 1)
+    if num_elements is not None:
+        size = min(size, _next_power_of_two(max(num_elements, 1)))
+    return max(size, MIN_CHUNK_SIZE)
+
+
+@dataclass
+class ArrayStorage:
+    """Chunking and compression of a kind of store array.
+
+    Parameters
+    ----------
+    chunk_size
+        Number of items per chunk along the first axis. By default, the chunk size is
+        chosen by `get_auto_chunk_size`.
+    compressor
+        One of the names in `COMPRESSORS`.
+    clevel
+        Compression level, where the compressor supports one.
+    shuffle
+        Whether Blosc compressors byte-shuffle items before compression, which typically
+        improves the compression of numeric arrays.
+    target_chunk_bytes
+        Chunk size, in bytes, aimed for by the chunk size auto-tuner. Smaller chunks
+        make scattered writes of single elements cheaper, and larger chunks make reads
+        of whole columns cheaper.
+
+    """
+
+    chunk_size: Optional[int] = None
+    compressor: str = "blosc-lz4"
+    clevel: int = 5
+    shuffle: bool = True
+    target_chunk_bytes: int = DEFAULT_TARGET_CHUNK_BYTES
+
+    def __post_init__(self):
+        if self.compressor not in COMPRESSORS:
+            raise ValueError(
+                f"Unknown compressor {self.compressor!r}; available compressors are: "
+                f"{', '.join(repr(i) for i in COMPRESSORS)}."
+            )
+
+    def get_compressor(self):
+        """Get the numcodecs codec of the compressor, or `None` if no compression."""
+        shuffle = numcodecs.Blosc.SHUFFLE if self.shuffle else numcodecs.Blosc.NOSHUFFLE
+        return COMPRESSORS[self.compressor](self.clevel, shuffle)
+
+    def get_chunk_size(self, num_elements: Optional[int], dtype) -> int:
+        if self.chunk_size is not None:
+            return self.chunk_size
+        return get_auto_chunk_size(num_elements, dtype, self.target_chunk_bytes)
+
+    def get_array_kwargs(self, num_elements: Optional[int], dtype) -> Dict:
+        """Get the `chunks` and `compressor` arguments with which to create a
+        one-dimensional (or record) Zarr array."""
+        return {
+            "chunks": (self.get_chunk_size(num_elements, dtype),),
+            "compressor": self.get_compressor(),
+        }
+
+
+@dataclass
+class StoreConfig:
+    """Chunking and compression settings of the arrays of a workflow store.
+
+    Parameters
+    ----------
+    arrays
+        Settings of particular kinds of array (see `ARRAY_KINDS`).
+    default
+        Settings of arrays whose kind is not in `arrays`.
+
+    """
+
+    arrays: Dict[str, ArrayStorage] = field(default_factory=lambda: {})
+    default: ArrayStorage = field(default_factory=ArrayStorage)
+
+    def __post_init__(self):
+        for kind in self.arrays:
+            if kind not in ARRAY_KINDS:
+                raise ValueError(
+                    f"Unknown store array kind {kind!r}; array kinds are: "
+                    f"{', '.join(repr(i) for i in ARRAY_KINDS)}."
+                )
+
+    def get(self, kind: str) -> ArrayStorage:
+        return self.arrays.get(kind, self.default)
+
+    def to_dict(self) -> Dict:
+        return {
+            "arrays": {k: asdict(v) for k, v in self.arrays.items()},
+            "default": asdict(self.default),
+        }
+
+    @classmethod
+    def from_dict(cls, dct: Dict):
+        return cls(
+            arrays={k: ArrayStorage(**v) for k, v in dct.get("arrays", {}).items()},
+            default=ArrayStorage(**dct.get("default", {})),
+        )
@@ -0,0 +1,198 @@
+"""Module containing a benchmark of the chunking and compression settings of workflow
+store arrays, which measures write throughput, read latency and on-disk size for a
+realistic mix of parameter arrays on a given file system."""
+
+from dataclasses import dataclass
+from pathlib import Path
+import shutil
+import time
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import zarr
+
+from hpcflow.metrics import RUN_METRICS_DTYPE
+from hpcflow.storage import ArrayStorage
+
+DEFAULT_BENCHMARK_STORAGES = {
+    "blosc-lz4": ArrayStorage(compressor="blosc-lz4"),
+    "blosc-lz4-64KiB": ArrayStorage(compressor="blosc-lz4", target_chunk_bytes=2**16),
+    "blosc-zstd": ArrayStorage(compressor="blosc-zstd", clevel=3),
+    "lz4": ArrayStorage(compressor="lz4"),
+    "zstd": ArrayStorage(compressor="zstd", clevel=3),
+    "none": ArrayStorage(compressor="none"),
+}
+
+
+def make_parameter_mix(num_elements: int, seed: int = 0) -> Dict[str, np.ndarray]:
+    """Make a mix of parameter arrays like those of a parameter sweep.
+
+    The mix comprises a swept float input (smooth, so compressible), a float output with
+    measurement noise (poorly compressible), a small integer input, dictionary codes of
+    a categorical input, and run metrics records.
+
+    """
+    rng = np.random.default_rng(seed)
+    sweep = np.repeat(np.linspace(0.0, 1.0, 100), -(-num_elements // 100))
+    metrics = np.zeros(num_elements, dtype=RUN_METRICS_DTYPE)
+    metrics["element_index"] = np.arange(num_elements)
+    metrics["start_time"] = 1.7e15 + np.sort(rng.integers(0, 10**9, num_elements))
+    metrics["wall_time"] = rng.gamma(2.0, 30.0, num_elements)
+    metrics["end_time"] = metrics["start_time"] + np.round(metrics["wall_time"] * 1e6)
+    metrics["cpu_time"] = metrics["wall_time"] * 0.95
+    metrics["peak_rss"] = rng.integers(2**26, 2**30, num_elements)
+    metrics["hostname"] = rng.choice([b"node001", b"node002", b"node003"], num_elements)
+    return {
+        "sweep": sweep[:num_elements],
+        "measurement": rng.normal(100.0, 5.0, num_elements),
+        "count": rng.integers(1, 16, num_elements),
+        "load_case": rng.integers(0, 4, num_elements),
+        "metrics": metrics,
+    }
+
+
+def get_directory_size(path: Union[Path, str]) -> int:
+    """Get the total size, in bytes, of the files within a directory."""
+    return sum(i.stat().st_size for i in Path(path).rglob("*") if i.is_file())
+
+
+@dataclass
+class BenchmarkResult:
+    """Measurements of a storage setting.
+
+    Attributes
+    ----------
+    write_throughput : float
+        Bytes per second of uncompressed data when writing whole arrays.
+    element_write_time : float
+        Mean seconds to write the value of a single (randomly chosen) element.
+    column_read_time : float
+        Mean seconds to read a whole array.
+    element_read_time : float
+        Mean seconds to read the value of a single (randomly chosen) element.
+    stored_bytes : int
+        Size of the arrays on disk.
+    raw_bytes : int
+        Size of the uncompressed arrays.
+
+    """
+
+    label: str
+    write_throughput: float
+    element_write_time: float
+    column_read_time: float
+    element_read_time: float
+    stored_bytes: int
+    raw_bytes: int
+
+    @property
+    def compression_ratio(self) -> float:
+        return self.raw_bytes / self.stored_bytes if self.stored_bytes else 0.0
+
+
+def benchmark_storage(
+    path: Union[Path, str],
+    storage: ArrayStorage,
+    mix: Dict[str, np.ndarray],
+    label: str = "",
+    num_element_ops: int = 100,
+    seed: int = 0,
+) -> BenchmarkResult:
+    """Measure a storage setting by writing and reading a mix of arrays in a new Zarr
+    store at `path`, which is removed afterwards."""
+    path = Path(path)
+    rng = np.random.default_rng(seed)
+    root = zarr.group(store=zarr.DirectoryStore(path), overwrite=True)
+    try:
+        raw_bytes = sum(i.nbytes for i in mix.values())
+        start = time.perf_counter()
+        for name, arr in mix.items():
+            root.array(
+                name,
+                arr,
+                **storage.get_array_kwargs(len(arr), arr.dtype),
+                overwrite=True,
+            )
+        write_time = time.perf_counter() - start
+        stored_bytes = get_directory_size(path)
+
+        start = time.perf_counter()
+        for name, arr in mix.items():
+            root[name][:]
+        column_read_time = (time.perf_counter() - start) / len(mix)
+
+        # single-element operations cycle through the arrays, at random elements:
+        names = [list(mix)[i % len(mix)] for i in range(num_element_ops)]
+        ops = [(i, int(rng.integers(len(mix[i])))) for i in names]
+        start = time.perf_counter()
+        for name, idx in ops:
+            root[name][idx]
+        element_read_time = (time.perf_counter() - start) / num_element_ops
+
+        start = time.perf_counter()
+        for name, idx in ops:
+            root[name][idx] = mix[name][idx]
+        element_write_time = (time.perf_counter() - start) / num_element_ops
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+    return BenchmarkResult(
+        label=label,
+        write_throughput=raw_bytes / write_time if write_time else float("inf"),
+        element_write_time=element_write_time,
+        column_read_time=column_read_time,
+        element_read_time=element_read_time,
+        stored_bytes=stored_bytes,
+        raw_bytes=raw_bytes,
+    )
+
+
+def run_store_benchmark(
+    path: Union[Path, str],
+    storages: Optional[Dict[str, ArrayStorage]] = None,
+    num_elements: int = 100_000,
+    num_element_ops: int = 100,
+    seed: int = 0,
+) -> List[BenchmarkResult]:
+    """Benchmark storage settings (by default, `DEFAULT_BENCHMARK_STORAGES`) within a
+    directory, which should be on the file system on which workflows will be stored.
+
+    Parameters
+    ----------
+    num_elements
+        Number of elements of each parameter array.
+    num_element_ops
+        Number of single-element reads and writes whose times are averaged.
+
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    mix = make_parameter_mix(num_elements, seed)
+    return [
+        benchmark_storage(
+            path.joinpath(f"benchmark_{label}.zarr"),
+            storage,
+            mix,
+            label,
+            num_element_ops,
+            seed,
+        )
+        for label, storage in (storages or DEFAULT_BENCHMARK_STORAGES).items()
+    ]
+
+
+def format_benchmark_results(results: List[BenchmarkResult]) -> str:
+    """Format benchmark results as a plain-text table."""
+    header = (
+        f"{'storage':<18}{'write MB/s':>12}{'elem write ms':>15}{'col read ms':>13}"
+        f"{'elem read ms':>14}{'size MB':>10}{'ratio':>8}"
+    )
+    lines = [header, "-" * len(header)]
+    for i in results:
+        lines.append(
+            f"{i.label:<18}{i.write_throughput / 1e6:>12.1f}"
+            f"{i.element_write_time * 1e3:>15.3f}{i.column_read_time * 1e3:>13.3f}"
+            f"{i.element_read_time * 1e3:>14.3f}{i.stored_bytes / 1e6:>10.2f}"
+            f"{i.compression_ratio:>8.2f}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,455 @@
+"""Module containing the submission engine, which groups task elements into scheduler
+job arrays."""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from hpcflow.actions import (
+    CommandsAction,
+    InputFileGeneratorAction,
+    OutputFileParserAction,
+)
+from hpcflow.commands import Placeholder
+from hpcflow.conditions import (
+    evaluate_action_conditions,
+    get_element_resolved_actions,
+    split_condition_signatures,
+)
+from hpcflow.env_snapshot import get_snapshot_shell_lines
+from hpcflow.environment import ExecutableInstance
+from hpcflow.errors import JobArrayOrderError, MissingCompatibleExecutableInstance
+from hpcflow.metrics import get_metrics_shell_lines, read_metrics_file
+from hpcflow.schedulers import Scheduler
+from hpcflow.utils import group_by_dict_key_values
+
+# separates the fields of each line of a jobscript index file (ASCII unit separator;
+# unlike a tab, consecutive separators are not merged by `read`, so empty values are
+# preserved):
+INDEX_FILE_SEP = "\x1f"
+
+
+def get_element_main_resources(resources: Dict) -> Dict:
+    """Get the resources that apply to the main (commands) scope of an element."""
+    return (resources or {}).get("main") or {}
+
+
+def resolve_element_executables(
+    task, resources: Dict, resolved_actions: Optional[Tuple] = None
+) -> Dict[str, ExecutableInstance]:
+    """Resolve the executable instance of each executable referenced in the commands of
+    a task's actions, given the (resolved) resources of an element.
+
+    Parameters
+    ----------
+    task
+        The task whose actions' commands are to be considered.
+    resources
+        The resolved resources of the element.
+    resolved_actions
+        If specified, only the commands of these resolved actions (i.e. those included
+        for the element) are considered. Otherwise, the commands of all task actions are
+        considered.
+
+    """
+
+    main_res = get_element_main_resources(resources)
+    num_cores = main_res.get("num_cores", 1)
+    parallel_mode = main_res.get("parallel_mode")
+
+    if resolved_actions is None:
+        resolved_actions = get_element_resolved_actions(
+            task.template, [None] * len(task.template.schemas)
+        )
+
+    out = {}
+    for act in resolved_actions:
+        if not isinstance(act, CommandsAction):
+            continue
+        env = act.environment
+        for command in act.commands:
+            for label in command.executable_labels:
+                if label in out:
+                    continue
+                instance = env.get_executable_instance(
+                    label, parallel_mode=parallel_mode, num_cores=num_cores
+                )
+                if instance is None:
+                    raise MissingCompatibleExecutableInstance(
+                        f"No instance of executable {label!r} in environment "
+                        f"{env.name!r} is compatible with parallel mode "
+                        f"{parallel_mode!r} and {num_cores!r} core(s)."
+                    )
+                out[label] = instance
+    return out
+
+
+def get_action_file_specs(resolved_actions) -> Dict:
+    """Get the file specifications of the input file generators and output file parsers
+    of some resolved actions, keyed by file label."""
+    out = {}
+    for act in resolved_actions:
+        if isinstance(act, InputFileGeneratorAction):
+            out[act.input_file_generator.input_file.label] = (
+                act.input_file_generator.input_file
+            )
+        elif isinstance(act, OutputFileParserAction):
+            out.update({i.label: i for i in act.output_file_parser.output_files})
+    return out
+
+
+def get_placeholder_columns(
+    workflow, task_index: int, element_indices: List[int], resolved_actions
+) -> Dict[Placeholder, List]:
+    """Get the values of all parameter and file placeholders in the commands of some
+    resolved actions, as one column of values (one per element) per placeholder."""
+
+    placeholders = {
+        ph: None
+        for act in resolved_actions
+        if isinstance(act, CommandsAction)
+        for cmd in act.commands
+        for ph in cmd.template.placeholders
+    }
+    file_specs = None
+    columns = {}
+    for ph in placeholders:
+        if ph.kind == "parameter":
+            path = ("inputs", ph.name)
+            columns[ph] = [
+                workflow.template.get_input_value(task_index, i, path)
+                for i in element_indices
+            ]
+        elif ph.kind == "file":
+            if file_specs is None:
+                file_specs = get_action_file_specs(resolved_actions)
+            spec = file_specs[ph.name]
+            columns[ph] = [
+                spec.value(workflow.get_element_dir(task_index, i))
+                for i in element_indices
+            ]
+    return columns
+
+
+def render_commands_action(
+    action: CommandsAction,
+    executables: Dict,
+    columns: Dict,
+    num_elements: int,
+    include_setup: bool = True,
+) -> List[List[str]]:
+    """Get, for each of a number of elements, the shell lines of a commands action: the
+    environment setup lines (if `include_setup` is True) followed by the rendered
+    commands."""
+    setup = list(action.environment.setup or ()) if include_setup else []
+    rendered = [
+        cmd.template.render(executables, columns, num_elements)
+        for cmd in action.commands
+    ]
+    return [setup + [i[elem] for i in rendered] for elem in range(num_elements)]
+
+
+@dataclass
+class JobArray:
+    """A set of elements of a single task that share resources, executable instances and
+    included actions, and so may be submitted together as one scheduler job array.
+
+    Attributes
+    ----------
+    condition_signatures : tuple of tuple of bool, optional
+        For each task schema, whether each schema action is included for the elements of
+        this job array. By default, all actions are included.
+    dependencies : list of tuple of (int, bool)
+        Index (within the submission) of each job array that this job array depends on,
+        and whether the dependency is element-wise, i.e. whether each element depends
+        only on the element at the same array index of the upstream job array.
+
+    """
+
+    task_index: int
+    element_indices: List[int]
+    resources: Dict
+    executable_instances: Dict[str, ExecutableInstance]
+    condition_signatures: Optional[Tuple[Tuple[bool]]] = None
+    jobscript_path: Optional[Path] = None
+    job_ID: Optional[str] = None
+    dependencies: List[Tuple[int, bool]] = field(default_factory=lambda: [])
+
+    @property
+    def num_elements(self):
+        return len(self.element_indices)
+
+
+def make_job_arrays(workflow, task_index: int, element_indices: List[int]):
+    """Group elements of a task by identical resources, executable instances and
+    included actions, and by their level among the elements of the task.
+
+    Elements that depend on other elements of the same task (e.g. later loop iterations)
+    are in a separate job array from those elements, and job arrays are ordered by
+    level, so that each job array depends only on earlier job arrays.
+
+    """
+
+    task = workflow.tasks[task_index]
+    inclusion = evaluate_action_conditions(workflow.template, task_index)
+    levels = workflow.dag.get_task_element_levels(task_index)
+    resolved = []
+    known = []  # (resources, signatures, executables); resources dicts are unhashable
+    for elem_idx in element_indices:
+        resources = workflow.template.get_input_value(
+            task_index=task_index,
+            element_index=elem_idx,
+            parameter_path=("resources",),
+        )
+        signatures = split_condition_signatures(task.template, inclusion[elem_idx])
+        for known_res, known_sigs, known_exes in known:
+            if known_sigs == signatures and known_res == resources:
+                executables = known_exes
+                break
+        else:
+            executables = resolve_element_executables(
+                task,
+                resources,
+                get_element_resolved_actions(task.template, signatures),
+            )
+            known.append((resources, signatures, executables))
+
+        resolved.append(
+            {
+                "element_index": elem_idx,
+                "resources": resources,
+                "signatures": signatures,
+                "executables": executables,
+                "level": int(levels[elem_idx]),
+            }
+        )
+
+    if not resolved:
+        return []
+
+    groups = group_by_dict_key_values(
+        resolved, "level", "resources", "signatures", "executables"
+    )
+    return [
+        JobArray(
+            task_index=task_index,
+            element_indices=[i["element_index"] for i in group],
+            resources=group[0]["resources"],
+            executable_instances=group[0]["executables"],
+            condition_signatures=group[0]["signatures"],
+        )
+        for group in sorted(groups, key=lambda group: group[0]["level"])
+    ]
+
+
+@dataclass
+class Submission:
+
+    index: int
+    scheduler: Scheduler
+    job_arrays: List[JobArray] = field(default_factory=lambda: [])
+
+    def get_jobscript_dir(self, workflow) -> Path:
+        return workflow.path.joinpath("submissions", str(self.index))
+
+    def get_job_array_commands(self, workflow, job_array: JobArray):
+        """Get the shell lines that execute any element of a job array, in which
+        parameter and file values are referenced as shell variables, together with the
+        values of those variables for each element.
+
+        The setup lines of environments that have `snapshot_setup` enabled are run by
+        only the first element of the submission on each host; later elements replay
+        the resulting environment variables.
+
+        Returns
+        -------
+        lines : list of str
+        variables : dict of (Placeholder, str)
+            Shell variable name of each placeholder.
+        columns : dict of (Placeholder, list)
+            Value of each placeholder for each element.
+
+        """
+        task = workflow.tasks[job_array.task_index]
+        signatures = job_array.condition_signatures or [None] * len(
+            task.template.schemas
+        )
+        resolved_actions = get_element_resolved_actions(task.template, signatures)
+        columns = get_placeholder_columns(
+            workflow, job_array.task_index, job_array.element_indices, resolved_actions
+        )
+        variables = {ph: f"HPCFLOW_ARG_{idx}" for idx, ph in enumerate(columns)}
+        snapshot_dir = self.get_jobscript_dir(workflow).joinpath("env_snapshots")
+        lines = []
+        for act in resolved_actions:
+            if not isinstance(act, CommandsAction):
+                continue
+            env = act.environment
+            if env.setup and env.snapshot_setup:
+                lines.extend(get_snapshot_shell_lines(env.setup, snapshot_dir))
+            else:
+                lines.extend(env.setup or ())
+            lines.extend(
+                i.template.render_shell(job_array.executable_instances, variables)
+                for i in act.commands
+            )
+        return lines, variables, columns
+
+    def make_index_file(self, workflow, job_array: JobArray, columns: Dict) -> str:
+        """Generate the contents of the index file of a job array, which has one line
+        per array element: the element's working directory followed by its placeholder
+        values, separated by `INDEX_FILE_SEP`."""
+        elem_dirs = [
+            str(workflow.get_element_dir(job_array.task_index, i))
+            for i in job_array.element_indices
+        ]
+        rows = zip(elem_dirs, *([str(j) for j in i] for i in columns.values()))
+        lines = []
+        for row in rows:
+            line = INDEX_FILE_SEP.join(row)
+            if "\n" in line or line.count(INDEX_FILE_SEP) != len(columns):
+                raise ValueError(
+                    f"Jobscript index file values may not contain newlines or the "
+                    f"separator {INDEX_FILE_SEP!r}: {row!r}."
+                )
+            lines.append(line)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def get_metrics_dir(job_array: JobArray) -> Path:
+        """Get the directory in which the jobscript of a job array writes the run
+        metrics file of each array element."""
+        return job_array.jobscript_path.with_suffix(".metrics")
+
+    def make_jobscript(
+        self, workflow, job_array: JobArray, index_path: Path, lines, variables
+    ) -> str:
+        """Generate jobscript contents that look up the working directory and argument
+        values of the element identified by the scheduler array index in the index
+        file, and then execute the element's commands, recording their run metrics in
+        the job array's metrics directory."""
+        main_res = get_element_main_resources(job_array.resources)
+        out = ["#!/bin/bash"]
+        out.extend(self.scheduler.format_directives(job_array.num_elements, main_res))
+        out.append(f"ARRAY_IDX={self.scheduler.ARRAY_INDEX_EXPR}")
+        read_vars = " ".join(["ELEMENT_DIR", *variables.values()])
+        out.append(
+            f"IFS=$'\\x{ord(INDEX_FILE_SEP):02x}' read -r {read_vars} "
+            f'< <(sed -n "$((ARRAY_IDX + 1)){{p;q}}" "{index_path}")'
+        )
+        out.append('cd "${ELEMENT_DIR}"')
+        metrics_path = f"{self.get_metrics_dir(job_array)}/${{ARRAY_IDX}}"
+        out.extend(get_metrics_shell_lines(lines, metrics_path))
+        return "\n".join(out) + "\n"
+
+    def write_jobscripts(self, workflow):
+        """Write one jobscript and one index file per job array."""
+        js_dir = self.get_jobscript_dir(workflow)
+        js_dir.mkdir(parents=True, exist_ok=True)
+        for js_idx, job_array in enumerate(self.job_arrays):
+            for elem_idx in job_array.element_indices:
+                workflow.get_element_dir(job_array.task_index, elem_idx).mkdir(
+                    parents=True, exist_ok=True
+                )
+            workflow.write_element_input_files(
+                job_array.task_index, job_array.element_indices
+            )
+            lines, variables, columns = self.get_job_array_commands(workflow, job_array)
+            index_path = js_dir.joinpath(f"js_{js_idx}.idx")
+            index_path.write_text(self.make_index_file(workflow, job_array, columns))
+            job_array.jobscript_path = js_dir.joinpath(f"js_{js_idx}.sh")
+            self.get_metrics_dir(job_array).mkdir(exist_ok=True)
+            job_array.jobscript_path.write_text(
+                self.make_jobscript(workflow, job_array, index_path, lines, variables)
+            )
+
+    def ingest_metrics(self, workflow, job_array: JobArray):
+        """Append the run metrics recorded by the jobscript of a finished job array to
+        the workflow's metrics store, and remove the ingested metrics files. Elements
+        that did not run (e.g. that were cancelled) have no metrics."""
+        if job_array.jobscript_path is None:
+            return
+        metrics_dir = self.get_metrics_dir(job_array)
+        paths, runs = [], []
+        for arr_idx, elem_idx in enumerate(job_array.element_indices):
+            path = metrics_dir.joinpath(str(arr_idx))
+            if path.is_file():
+                paths.append(path)
+                runs.append(read_metrics_file(path, elem_idx))
+        workflow.metrics.append(job_array.task_index, runs)
+        for path in paths:
+            path.unlink()
+
+    def resolve_dependencies(self, workflow):
+        """Set the dependencies of each job array on earlier job arrays of the
+        submission, from the element dependency graph of the workflow.
+
+        A dependency is element-wise if each element of the downstream job array depends
+        (within the upstream job array) only on the upstream element at the same array
+        index, in which case the scheduler may start each downstream element as soon as
+        its own upstream element has finished.
+
+        Raises
+        ------
+        JobArrayOrderError
+            If a job array depends on a later job array of the submission, which would
+            not yet have been submitted when the dependent job array is submitted, or if
+            an element depends on another element of its own job array, which cannot be
+            expressed as a scheduler dependency.
+
+        """
+        dag = workflow.dag
+        # job array index and array position of each submitted element node:
+        node_array = np.full(dag.num_elements, -1, dtype=np.int64)
+        node_pos = np.full(dag.num_elements, -1, dtype=np.int64)
+        array_nodes = []
+        for js_idx, job_array in enumerate(self.job_arrays):
+            nodes = dag.get_element_nodes(
+                job_array.task_index, job_array.element_indices
+            )
+            node_array[nodes] = js_idx
+            node_pos[nodes] = np.arange(len(nodes))
+            array_nodes.append(nodes)
+
+        upstream_graph = dag.element_graph_T
+        for js_idx, job_array in enumerate(self.job_arrays):
+            nodes = array_nodes[js_idx]
+            counts = np.diff(upstream_graph.indptr)[nodes]
+            upstream = upstream_graph.get_neighbours(nodes)
+            positions = np.repeat(np.arange(len(nodes)), counts)
+            up_arrays = node_array[upstream]
+            if (up_arrays > js_idx).any():
+                raise JobArrayOrderError(
+                    f"Job array {js_idx} (task {job_array.task_index}) depends on job "
+                    f"array {up_arrays.max()}, which is submitted after it."
+                )
+            if (up_arrays == js_idx).any():
+                raise JobArrayOrderError(
+                    f"Job array {js_idx} (task {job_array.task_index}) has elements "
+                    f"that depend on other elements of the same job array."
+                )
+            keep = up_arrays >= 0
+            job_array.dependencies = []
+            for up_idx in np.unique(up_arrays[keep]).tolist():
+                is_up = up_arrays == up_idx
+                elementwise = self.job_arrays[up_idx].num_elements == len(
+                    nodes
+                ) and np.array_equal(node_pos[upstream[is_up]], positions[is_up])
+                job_array.dependencies.append((up_idx, bool(elementwise)))
+
+    def submit(self, workflow):
+        """Write jobscripts and submit each job array to the scheduler, with scheduler
+        dependencies on the job arrays that it depends on."""
+        self.write_jobscripts(workflow)
+        self.resolve_dependencies(workflow)
+        for job_array in self.job_arrays:
+            job_array.job_ID = self.scheduler.submit_job_array(
+                job_array.jobscript_path,
+                job_array.num_elements,
+                dependencies=[
+                    (self.job_arrays[i].job_ID, elementwise)
+                    for i, elementwise in job_array.dependencies
+                ],
+            )
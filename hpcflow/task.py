@@ -45,6 +45,7 @@ class TaskTemplate:
         "_nesting_order",
         "_groups",
         "_name",
+        "_memoise",
         "_defined_input_types",  # assigned in _validate()
     )
 
@@ -62,6 +63,7 @@ class TaskTemplate:
         input_sources: Optional[Dict[str, InputSource]] = None,
         nesting_order: Optional[Dict] = None,
         groups: Optional[List[ElementGroup]] = None,
+        memoise: Optional[bool] = True,
     ):
         self._schemas = schemas if isinstance(schemas, list) else [schemas]
         self._repeats = repeats
@@ -77,6 +79,7 @@ class TaskTemplate:
         self._input_sources = input_sources or {}
         self._nesting_order = nesting_order or {}
         self._groups = GroupList(*(groups or ()))
+        self._memoise = memoise  # if False, results are never taken from a cache
 
         print(f"tasktemplate init nesting_order: {nesting_order}")
 
@@ -252,6 +255,10 @@ class TaskTemplate:
     def groups(self):
         return self._groups
 
+    @property
+    def memoise(self):
+        return self._memoise
+
     @property
     def name(self):
         return self._name
@@ -1,7 +1,7 @@
 from dataclasses import dataclass, field
-from typing import List, Optional, Union
+from typing import List, Optional, Tuple, Union
 
-from hpcflow.actions import Action
+from hpcflow.actions import Action, ResolvedAction
 from hpcflow.errors import MissingActionsError
 from hpcflow.parameters import (
     Parameter,
@@ -47,6 +47,9 @@ class TaskSchema:
 
         self._validate()
 
+        # resolved actions, keyed by action-inclusion signature:
+        self._resolved_actions = {}
+
     def _validate(self):
 
         if isinstance(self.objective, str):
@@ -108,3 +111,43 @@ class TaskSchema:
             for key in out:
                 out[key].extend((act_idx, i) for i in deps[key])
         return out
+
+    def resolve_actions(
+        self, condition_signature: Optional[Tuple[bool]] = None
+    ) -> Tuple[ResolvedAction]:
+        """Get the resolved actions of the schema.
+
+        Parameters
+        ----------
+        condition_signature
+            One boolean per schema action, which is True if the conditions of that
+            action hold (i.e. if the action should be included). By default, all actions
+            are included.
+
+        Returns
+        -------
+        resolved_actions
+            A tuple of resolved actions that is shared between all callers passing the
+            same signature.
+
+        """
+        if condition_signature is None:
+            condition_signature = (True,) * len(self.actions)
+        else:
+            condition_signature = tuple(bool(i) for i in condition_signature)
+            if len(condition_signature) != len(self.actions):
+                raise ValueError(
+                    f"`condition_signature` must have one item per action "
+                    f"({len(self.actions)}), but has length {len(condition_signature)}."
+                )
+        try:
+            return self._resolved_actions[condition_signature]
+        except KeyError:
+            out = tuple(
+                res_act
+                for act, include in zip(self.actions, condition_signature)
+                if include
+                for res_act in act.resolve_actions()
+            )
+            self._resolved_actions[condition_signature] = out
+            return out
@@ -1,8 +1,11 @@
+from collections import OrderedDict
+from functools import lru_cache
 import keyword
-from pathlib import Path
+import os
 import random
 import re
 import string
+import time
 from datetime import datetime, timezone
 from typing import Mapping
 
@@ -182,16 +185,76 @@ def get_relative_path(path1, path2):
     return path1[len_path2:]
 
 
+def get_num_available_cores():
+    """Get the number of cores available to this process."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # not available on Windows or macOS:
+        return os.cpu_count() or 1
+
+
+compile_regex = lru_cache(maxsize=256)(re.compile)
+
+# map of absolute directory path to a listing entry, ordered by most recent use:
+_DIR_LISTING_CACHE = OrderedDict()
+DIR_LISTING_CACHE_SIZE = 1024
+
+# coarsest directory modification time resolution we expect (FAT and HFS+ use 2 s and
+# 1 s); a directory modified within this period of being listed might be modified
+# again without its modification time changing:
+DIR_MTIME_GRANULARITY_NS = 2_000_000_000
+
+
+def _get_dir_listing(directory):
+    """Get the cached listing entry of a directory, re-listing the directory if its
+    modification time, link count or size has changed since the entry was made.
+
+    Entries made within `DIR_MTIME_GRANULARITY_NS` of the directory's modification time
+    are not trusted, so a recently modified directory is re-listed on each call.
+
+    """
+    key = os.path.abspath(directory or ".")
+    stat = os.stat(key)
+    stat_key = (stat.st_mtime_ns, stat.st_nlink, stat.st_size)
+    entry = _DIR_LISTING_CACHE.get(key)
+    if entry is None or entry["stat"] != stat_key or entry["racy"]:
+        listed_at = time.time_ns()
+        with os.scandir(key) as it:
+            names = tuple(i.name for i in it)
+        entry = {
+            "stat": stat_key,
+            "racy": listed_at - stat.st_mtime_ns < DIR_MTIME_GRANULARITY_NS,
+            "names": names,
+            "matches": {},
+        }
+        _DIR_LISTING_CACHE[key] = entry
+        if len(_DIR_LISTING_CACHE) > DIR_LISTING_CACHE_SIZE:
+            _DIR_LISTING_CACHE.popitem(last=False)
+    _DIR_LISTING_CACHE.move_to_end(key)
+    return entry
+
+
+def clear_dir_listing_cache():
+    _DIR_LISTING_CACHE.clear()
+
+
 def search_dir_files_by_regex(pattern, group=0, directory="."):
-    vals = []
-    for i in Path(directory).iterdir():
-        match = re.search(pattern, i.name)
-        if match:
-            match_groups = match.groups()
-            if match_groups:
-                match = match_groups[group]
-                vals.append(match)
-    return vals
+    entry = _get_dir_listing(directory)
+    try:
+        vals = entry["matches"][(pattern, group)]
+    except KeyError:
+        regex = compile_regex(pattern)
+        vals = []
+        for name in entry["names"]:
+            match = regex.search(name)
+            if match:
+                match_groups = match.groups()
+                if match_groups:
+                    match = match_groups[group]
+                    vals.append(match)
+        entry["matches"][(pattern, group)] = vals
+    return list(vals)
 
 
 class classproperty(object):
@@ -1,15 +1,29 @@
-from dataclasses import dataclass
+import copy
+from dataclasses import dataclass, field
 from operator import itemgetter
-from typing import List, Optional
-from hpcflow.loop import Loop
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
 
+import zarr
+
+from hpcflow.blobs import BlobStore
+from hpcflow.command_files import InputFile
+from hpcflow.dag import WorkflowDAG, build_workflow_dag
+from hpcflow.history import WorkflowHistory, WorkflowInteraction
+from hpcflow.loop import Loop, run_loop
+from hpcflow.metrics import RunMetricsStore
 from hpcflow.object_list import TaskList
+from hpcflow.query import ParameterQuery, QueryResult
 from hpcflow.parameters import (
     InputSource,
     ParameterPropagationMode,
     SchemaInput,
     ValueSequence,
 )
+from hpcflow.schedulers import Scheduler, DirectScheduler
+from hpcflow.shredding import ShreddedParameterStore
+from hpcflow.storage import StoreConfig
+from hpcflow.submission import Submission, make_job_arrays
 from hpcflow.task import Task, TaskTemplate
 from hpcflow.utils import (
     get_in_container,
@@ -32,6 +46,14 @@ class WorkflowTemplate:
         self.tasks = TaskList()
         self.element_indices = []
         self.name_repeat_indices = []
+        self.loops = loops or []
+        self.parameter_version = 0  # incremented whenever parameter data is modified
+        # the value of `parameter_version` when each parameter of each task, keyed by
+        # task index and parameter root path (see `get_parameter_root`), was modified:
+        self.parameter_versions = {}
+        # for each output data index, the elements whose inputs reference that data, as
+        # tuples of task index, input root path and task-local element index:
+        self._output_dependents = {}
 
         for task_template in task_templates or []:
             self.add_task(task_template)
@@ -185,6 +207,29 @@ class WorkflowTemplate:
                 }
             )
 
+        # inputs sourced from the outputs of an upstream task vary over the upstream
+        # elements, and reference the upstream output data:
+        task_source_refs = self.get_task_source_references(task_template)
+        default_nesting = max([i["nesting_order"] for i in multi], default=-1) + 1
+        upstream_nesting = {}
+        for path, (upstream_idx, refs) in task_source_refs.items():
+            if len(refs) > 1:
+                nesting_order_i = task_template.nesting_order.get(path)
+                if nesting_order_i is None:
+                    # inputs from the same upstream task vary together:
+                    nesting_order_i = upstream_nesting.setdefault(
+                        upstream_idx, default_nesting + len(upstream_nesting)
+                    )
+            else:
+                nesting_order_i = -1
+            multi.append(
+                {
+                    "multiplicity": len(refs),
+                    "nesting_order": nesting_order_i,
+                    "address": path,
+                }
+            )
+
         init_multi = WorkflowTemplate.resolve_initial_elements(multi)
         output_map_indices = {}
         num_elems = len(init_multi)
@@ -195,21 +240,31 @@ class WorkflowTemplate:
                 out_data = [{"is_set": False, "data": None} for _ in range(num_elems)]
                 out_param_map = list(range(next_dat_idx, next_dat_idx + num_elems))
                 self.parameter_data.extend(out_data)
+                self._output_dependents.update((i, []) for i in out_param_map)
                 self.parameter_mapping.append(out_param_map)
                 output_map_indices[output.typ] = next_map_idx
 
         for i_idx, i in enumerate(init_multi):
+            inputs = []
+            for k, v in i["value_index"].items():
+                if k in task_source_refs:
+                    map_idx, dat_idx = task_source_refs[k][1][v]
+                    self._output_dependents[
+                        self.parameter_mapping[map_idx][dat_idx]
+                    ].append((len(self.tasks), self.get_parameter_root(k), i_idx))
+                else:
+                    map_idx, dat_idx = input_map_indices[tuple(k)], v
+                inputs.append(
+                    {
+                        "path": k,
+                        "parameter_mapping_index": map_idx,
+                        "data_index": dat_idx,
+                    }
+                )
             element_indices.append(len(self.elements))
             self.elements.append(
                 {
-                    "inputs": [
-                        {
-                            "path": k,
-                            "parameter_mapping_index": input_map_indices[tuple(k)],
-                            "data_index": v,
-                        }
-                        for k, v in i["value_index"].items()
-                    ],
+                    "inputs": inputs,
                     "outputs": [
                         {
                             "path": ("outputs", k),
@@ -227,6 +282,48 @@ class WorkflowTemplate:
         )
         task = Task(task_template, self, len(self.tasks))
         self.tasks.add_object(task)
+        self._bump_parameter_versions(
+            (task.index, i) for i in self.get_parameter_roots(task.index)
+        )
+
+    def get_task_source_index(self, input_source: InputSource) -> int:
+        """Get the index of the task referenced by a task input source."""
+        for task in self.tasks:
+            if task.unique_name.lower() == input_source.task_ref:
+                return task.index
+        raise ValueError(f"No task has unique name {input_source.task_ref!r}.")
+
+    def get_task_source_references(self, task_template: TaskTemplate):
+        """Get, for each input of a task template that is sourced from the outputs of an
+        upstream task (and is not defined locally), the index of the upstream task and
+        the parameter mapping index and data index of that output for each upstream
+        element.
+
+        Returns
+        -------
+        dict of (tuple, tuple of (int, list of tuple of (int, int)))
+            Keyed by input path.
+
+        """
+        out = {}
+        for input_type, sources in task_template.input_sources.items():
+            if (
+                not sources
+                or input_type in task_template.defined_input_types
+                or sources[0].source_type != "tasks"
+                or sources[0].task_source_type != "outputs"
+            ):
+                continue
+            upstream_idx = self.get_task_source_index(sources[0])
+            refs = []
+            for elem_idx in self.tasks[upstream_idx].element_indices:
+                for output in self.elements[elem_idx]["outputs"]:
+                    if output["path"] == ("outputs", input_type):
+                        refs.append(
+                            (output["parameter_mapping_index"], output["data_index"])
+                        )
+            out[("inputs", input_type)] = (upstream_idx, refs)
+        return out
 
     @staticmethod
     def resolve_initial_elements(multi):
@@ -280,19 +377,53 @@ class WorkflowTemplate:
     def remove_task(self, task):
         pass
 
-    def get_input_values(self, task_index, parameter_path):
-        """Get the value of an input for each element in a task."""
+    @staticmethod
+    def get_parameter_root(parameter_path) -> Tuple:
+        """Get the path of the input, output or resources parameter that contains a
+        (sub-)parameter path, e.g. `("inputs", "material")` for
+        `("inputs", "material", "elastic")`, or `("resources",)`."""
+        if parameter_path[0] == "resources":
+            return ("resources",)
+        return tuple(parameter_path[:2])
+
+    def get_parameter_roots(self, task_index) -> List[Tuple]:
+        """Get the root paths of the inputs, outputs and resources of a task."""
+        template = self.tasks[task_index].template
+        return [
+            *(("inputs", i) for i in sorted(template.all_schema_input_types)),
+            *(("outputs", i) for i in sorted(template.all_schema_output_types)),
+            ("resources",),
+        ]
+
+    def get_parameter_version(self, task_index, parameter_path) -> int:
+        """Get the version of the parameter of a task that contains a (sub-)parameter
+        path, which changes whenever the parameter's value of any element of the task
+        is modified, or elements are added to the task."""
+        key = (task_index, self.get_parameter_root(parameter_path))
+        return self.parameter_versions.get(key, 0)
+
+    def _bump_parameter_versions(self, keys):
+        self.parameter_version += 1
+        for key in keys:
+            self.parameter_versions[key] = self.parameter_version
+
+    def get_input_values(self, task_index, parameter_path, element_indices=None):
+        """Get the value of an input for each element in a task, or for each of the
+        given elements."""
+        if element_indices is None:
+            element_indices = range(self.tasks[task_index].num_elements)
         return [
             self.get_input_value(
                 task_index=task_index, element_index=i, parameter_path=parameter_path
             )
-            for i in range(self.tasks[task_index].num_elements)
+            for i in element_indices
         ]
 
     def get_input_value(self, task_index, element_index, parameter_path):
 
         element = self.elements[self.tasks[task_index].element_indices[element_index]]
         current_value = None
+        is_copy = False  # stored data must not be modified by sub-value updates
         for input_i in element["inputs"]:
 
             param_data_idx = self.parameter_mapping[input_i["parameter_mapping_index"]][
@@ -318,7 +449,8 @@ class WorkflowTemplate:
                     current_value = get_in_container(
                         self.parameter_data, final_data_path
                     )  # or use Zarr to get from persistent
-                except TypeError:
+                    is_copy = False
+                except (TypeError, KeyError):
                     # import traceback
 
                     # traceback.print_exc()
@@ -329,14 +461,225 @@ class WorkflowTemplate:
                 update_data = self.parameter_data[param_data_idx][
                     "data"
                 ]  # or use Zarr to get from persistent
+                if not is_copy:
+                    current_value = copy.deepcopy(current_value)
+                    is_copy = True
                 set_in_container(current_value, update_path, update_data)
 
         return current_value
 
-    def make_workflow(self, path):
-        # TODO: make the workflow and save to path
-        wk = Workflow(path)
-        return wk
+    def get_output_dependents(self, task_index, outputs) -> Dict[Tuple, List[int]]:
+        """Get the elements whose parameter values change when the given outputs are
+        set: the elements of the outputs themselves, and the elements whose inputs
+        reference them.
+
+        Parameters
+        ----------
+        task_index : int
+        outputs : dict of (int, dict)
+            Map of (task-local) element index to a dict of output values keyed by output
+            parameter type, as passed to `set_element_outputs`.
+
+        Returns
+        -------
+        dependents : dict of (tuple, list of int)
+            Task-local element indices, keyed by task index and parameter root path.
+
+        """
+        out = {}
+        for elem_idx, elem_outputs in outputs.items():
+            data_indices = self.get_element_output_data_indices(task_index, elem_idx)
+            for typ in elem_outputs:
+                if typ in data_indices:
+                    out.setdefault((task_index, ("outputs", typ)), []).append(elem_idx)
+                    for dep_task, dep_root, dep_elem in self._output_dependents.get(
+                        data_indices[typ], ()
+                    ):
+                        out.setdefault((dep_task, dep_root), []).append(dep_elem)
+        return {k: sorted(set(v)) for k, v in out.items()}
+
+    def set_element_outputs(self, task_index, outputs):
+        """Set output parameter data for multiple elements of a task.
+
+        Parameters
+        ----------
+        task_index : int
+        outputs : dict of (int, dict)
+            Map of (task-local) element index to a dict of output values keyed by output
+            parameter type.
+
+        """
+        changed = self.get_output_dependents(task_index, outputs)
+        for elem_idx, elem_outputs in outputs.items():
+            data_indices = self.get_element_output_data_indices(task_index, elem_idx)
+            for typ, value in elem_outputs.items():
+                if typ in data_indices:
+                    self.parameter_data[data_indices[typ]] = {
+                        "is_set": True,
+                        "data": value,
+                    }
+        self._bump_parameter_versions(changed)
+
+    def get_output_values(self, task_index, element_indices, output_type):
+        """Get the value of an output for each of the given elements of a task."""
+        return [
+            self.parameter_data[
+                self.get_element_output_data_indices(task_index, i)[output_type]
+            ]["data"]
+            for i in element_indices
+        ]
+
+    def add_loop_iteration(self, task_index, element_indices, parameter_type):
+        """Add a new iteration of the given elements of a task, in which the input
+        `parameter_type` of each new element is the output `parameter_type` of the
+        corresponding given element.
+
+        New elements reference the parameter data of the given elements, so no data of
+        earlier iterations is copied; only the looped input and new outputs are added.
+
+        Parameters
+        ----------
+        task_index : int
+        element_indices : list of int
+            Task-local indices of the elements to iterate.
+        parameter_type : str
+            Type of the parameter that is passed from each iteration to the next.
+
+        Returns
+        -------
+        new_element_indices : list of int
+            Task-local indices of the new elements.
+
+        """
+        task = self.tasks[task_index]
+        num_new = len(element_indices)
+        looped_path = ("inputs", parameter_type)
+
+        # the looped input of the new elements maps to outputs of the given elements:
+        looped_map_idx = len(self.parameter_mapping)
+        self.parameter_mapping.append(
+            [
+                self.get_element_output_data_indices(task_index, i)[parameter_type]
+                for i in element_indices
+            ]
+        )
+
+        # new (unset) output data for the new elements:
+        output_map_indices = {}
+        for schema in task.template.schemas:
+            for output in schema.outputs:
+                next_dat_idx = len(self.parameter_data)
+                self.parameter_data.extend(
+                    {"is_set": False, "data": None} for _ in range(num_new)
+                )
+                self._output_dependents.update(
+                    (i, []) for i in range(next_dat_idx, next_dat_idx + num_new)
+                )
+                output_map_indices[output.typ] = len(self.parameter_mapping)
+                self.parameter_mapping.append(
+                    list(range(next_dat_idx, next_dat_idx + num_new))
+                )
+
+        new_element_indices = []
+        for new_idx, elem_idx in enumerate(element_indices):
+            element = self.elements[task.element_indices[elem_idx]]
+            inputs = [
+                i for i in element["inputs"] if tuple(i["path"][:2]) != looped_path
+            ]
+            inputs.append(
+                {
+                    "path": looped_path,
+                    "parameter_mapping_index": looped_map_idx,
+                    "data_index": new_idx,
+                }
+            )
+            new_elem_idx = len(task.element_indices)
+            for input_i in inputs:
+                data_idx = self.parameter_mapping[input_i["parameter_mapping_index"]][
+                    input_i["data_index"]
+                ]
+                if data_idx in self._output_dependents:
+                    self._output_dependents[data_idx].append(
+                        (
+                            task_index,
+                            self.get_parameter_root(input_i["path"]),
+                            new_elem_idx,
+                        )
+                    )
+            new_element_indices.append(new_elem_idx)
+            task.element_indices.append(len(self.elements))
+            self.elements.append(
+                {
+                    "inputs": inputs,
+                    "outputs": [
+                        {
+                            "path": ("outputs", k),
+                            "parameter_mapping_index": v,
+                            "data_index": new_idx,
+                        }
+                        for k, v in output_map_indices.items()
+                    ],
+                    "iteration": element.get("iteration", 0) + 1,
+                    "loop_source": elem_idx,
+                }
+            )
+
+        self._bump_parameter_versions(
+            (task_index, i) for i in self.get_parameter_roots(task_index)
+        )
+        return new_element_indices
+
+    def set_element_resources(self, task_index, resources):
+        """Replace the resources of multiple elements of a task.
+
+        Elements that are given equal resources reference the same new parameter data.
+
+        Parameters
+        ----------
+        task_index : int
+        resources : dict of (int, dict)
+            Map of (task-local) element index to the element's new resources.
+
+        """
+        task = self.tasks[task_index]
+        map_idx = len(self.parameter_mapping)
+        distinct = []
+        for elem_idx, elem_res in resources.items():
+            try:
+                data_idx = distinct.index(elem_res)
+            except ValueError:
+                data_idx = len(distinct)
+                distinct.append(elem_res)
+            element = self.elements[task.element_indices[elem_idx]]
+            element["inputs"] = [
+                i for i in element["inputs"] if i["path"][0] != "resources"
+            ] + [
+                {
+                    "path": ("resources",),
+                    "parameter_mapping_index": map_idx,
+                    "data_index": data_idx,
+                }
+            ]
+        next_dat_idx = len(self.parameter_data)
+        self.parameter_data.extend({"is_set": True, "data": i} for i in distinct)
+        self.parameter_mapping.append(
+            list(range(next_dat_idx, next_dat_idx + len(distinct)))
+        )
+        self._bump_parameter_versions([(task_index, ("resources",))])
+
+    def get_element_output_data_indices(self, task_index, element_index):
+        """Get the parameter data index of each output of an element, keyed by output
+        parameter type."""
+        element = self.elements[self.tasks[task_index].element_indices[element_index]]
+        return {
+            i["path"][1]: self.parameter_mapping[i["parameter_mapping_index"]][
+                i["data_index"]
+            ]
+            for i in element["outputs"]
+        }
+
+    def make_workflow(self, path, overwrite=False, storage=None):
+        return Workflow.create(self, path, overwrite=overwrite, storage=storage)
 
     @classmethod
     def from_spec(cls, spec, all_schemas, all_parameters):
@@ -352,13 +695,243 @@ class WorkflowTemplate:
 
 @dataclass
 class Workflow:
-    tasks: List[Task]
+
+    template: WorkflowTemplate
+    path: Path
+    submissions: List[Submission] = field(default_factory=lambda: [])
+
+    _STORE_NAME = "workflow.zarr"
+    _BLOBS_DIR_NAME = "blobs"
+
+    def __post_init__(self):
+        self.path = Path(self.path)
+
+    @classmethod
+    def create(
+        cls,
+        template: WorkflowTemplate,
+        path: Union[Path, str],
+        overwrite=False,
+        storage: Optional[StoreConfig] = None,
+    ):
+        """Make a new workflow directory, including its persistent store.
+
+        Parameters
+        ----------
+        storage
+            Chunking and compression settings of the store's arrays, which are saved in
+            the store and used for all arrays that are later created in it.
+
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=overwrite)
+        root = zarr.group(
+            store=zarr.DirectoryStore(path.joinpath(cls._STORE_NAME)),
+            overwrite=overwrite,
+        )
+        root.attrs["storage"] = (storage or StoreConfig()).to_dict()
+        root.create_group("parameters")
+        root.create_group("metrics")
+        history = WorkflowHistory.create(root.create_group("history"))
+        history.append(WorkflowInteraction.CREATE)
+        workflow = cls(template, path)
+        for task_idx in range(len(template.tasks)):
+            workflow.parameters.create(task_idx)
+        return workflow
+
+    @property
+    def tasks(self):
+        return self.template.tasks
+
+    @property
+    def root(self):
+        return zarr.open_group(
+            store=zarr.DirectoryStore(self.path.joinpath(self._STORE_NAME)), mode="r+"
+        )
+
+    @property
+    def history(self):
+        return WorkflowHistory(self.root["history"])
+
+    @property
+    def storage(self) -> StoreConfig:
+        """Chunking and compression settings of the store's arrays."""
+        return StoreConfig.from_dict(self.root.attrs.get("storage", {}))
+
+    @property
+    def parameters(self) -> ShreddedParameterStore:
+        """Shredded parameter values of the elements of each task."""
+        return ShreddedParameterStore(self)
+
+    def set_element_outputs(self, task_index, outputs):
+        """Set output parameter data for multiple elements of a task (see
+        `WorkflowTemplate.set_element_outputs`), and shred the values of the modified
+        elements."""
+        template = self.template
+        modified = template.get_output_dependents(task_index, outputs)
+        versions = {k: template.get_parameter_version(*k) for k in modified}
+        template.set_element_outputs(task_index, outputs)
+        self.parameters.update(modified, versions)
+
+    def add_loop_iteration(self, task_index, element_indices, parameter_type):
+        """Add a new iteration of the given elements of a task (see
+        `WorkflowTemplate.add_loop_iteration`), and shred the values of the new
+        elements."""
+        template = self.template
+        roots = template.get_parameter_roots(task_index)
+        versions = {
+            (task_index, i): template.get_parameter_version(task_index, i)
+            for i in roots
+        }
+        new_elements = template.add_loop_iteration(
+            task_index, element_indices, parameter_type
+        )
+        self.parameters.update({k: new_elements for k in versions}, versions)
+        return new_elements
+
+    @property
+    def metrics(self) -> RunMetricsStore:
+        """Run metrics of executed elements, per task."""
+        return RunMetricsStore(
+            self.root.require_group("metrics"), self.storage.get("metrics")
+        )
+
+    @property
+    def dag(self) -> WorkflowDAG:
+        """The task and element dependency graphs, which are persisted in the workflow's
+        store, and are rebuilt if tasks or elements have been added since they were
+        saved."""
+        root = self.root
+        num_elements = len(self.template.elements)
+        if "dag" in root:
+            group = root["dag"]
+            if (
+                group.attrs.get("num_tasks") == len(self.tasks)
+                and group.attrs.get("num_elements") == num_elements
+            ):
+                return WorkflowDAG.load(group)
+        dag = build_workflow_dag(self.template)
+        group = root.require_group("dag")
+        dag.save(group, self.storage.get("dag"))
+        group.attrs.update({"num_tasks": len(self.tasks), "num_elements": num_elements})
+        return dag
+
+    def query(self, path: str, where=None) -> QueryResult:
+        """Find the elements of a task whose parameter values satisfy some conditions,
+        using indexes persisted in the workflow's store. See `ParameterQuery.query`.
+
+        Examples
+        --------
+        >>> workflow.query(
+        ...     "tasks.simulate.inputs.load_case",
+        ...     where={"inputs.size": Value.greater_than(100)},
+        ... )
+
+        """
+        return ParameterQuery(self).query(path, where=where)
+
+    def run_loops(self, executor):
+        """Run each loop of the workflow template in turn, using the given executor."""
+        return [run_loop(self, loop, executor) for loop in self.template.loops]
+
+    def get_element_dir(self, task_index, element_index) -> Path:
+        task = self.tasks[task_index]
+        return self.path.joinpath(
+            "execute",
+            f"task_{task_index}_{task.unique_name}",
+            f"element_{element_index}",
+        )
+
+    @property
+    def blob_store(self):
+        return BlobStore(self.path.joinpath(self._BLOBS_DIR_NAME))
+
+    def add_input_files_to_blob_store(self, task_index) -> List[Tuple[InputFile, str]]:
+        """Add the user-supplied input files of a task to the workflow's blob store, and
+        return each input file with the hash of its contents."""
+        blob_store = self.blob_store
+        out = []
+        for input_file in self.tasks[task_index].template.input_files:
+            if not isinstance(input_file, InputFile):
+                continue
+            if input_file.path is not None:
+                content_hash = blob_store.add_file(input_file.path)
+            else:
+                content_hash = blob_store.add_bytes(input_file.contents_bytes)
+            out.append((input_file, content_hash))
+        return out
+
+    def write_element_input_files(
+        self, task_index, element_indices, input_file_hashes=None
+    ):
+        """Link the user-supplied input files of a task into element directories.
+
+        Each input file is added to the workflow's blob store once, and then linked into
+        each element directory, so elements share a single copy on disk.
+
+        Parameters
+        ----------
+        input_file_hashes
+            Input files of the task and their content hashes, as returned by
+            `add_input_files_to_blob_store`. If not specified, the input files are
+            added to the blob store.
+
+        """
+        blob_store = self.blob_store
+        if input_file_hashes is None:
+            input_file_hashes = self.add_input_files_to_blob_store(task_index)
+        for input_file, content_hash in input_file_hashes:
+            for elem_idx in element_indices:
+                elem_dir = self.get_element_dir(task_index, elem_idx)
+                blob_store.link(
+                    content_hash, elem_dir / input_file.file.value(elem_dir)
+                )
 
     def rename(self, new_name):
         pass
 
-    def add_submission(self, filter):
-        pass
+    def add_submission(
+        self,
+        filter: Optional[Dict[int, Optional[List[int]]]] = None,
+        scheduler: Optional[Scheduler] = None,
+        policy=None,
+    ) -> Submission:
+        """Submit elements to a scheduler, using one job array per group of elements
+        (within a task) that share resources and executable instances.
+
+        Parameters
+        ----------
+        filter
+            Map of task index to the element indices to submit for that task (or `None`
+            for all elements). If not specified, all elements of all tasks are submitted.
+        scheduler
+            Scheduler to submit to. By default, elements are executed directly.
+        policy
+            If specified, a scheduling policy (e.g. `CriticalPathPolicy`) whose
+            `order_job_arrays` method gives the order in which job arrays are submitted.
+
+        """
+        if filter is None:
+            filter = {i: None for i in range(len(self.tasks))}
+
+        job_arrays = []
+        for task_idx, elem_indices in sorted(filter.items()):
+            if elem_indices is None:
+                elem_indices = list(range(self.tasks[task_idx].num_elements))
+            job_arrays.extend(make_job_arrays(self, task_idx, elem_indices))
+        if policy is not None:
+            job_arrays = policy.order_job_arrays(self, job_arrays)
+
+        submission = Submission(
+            index=len(self.submissions),
+            scheduler=scheduler or DirectScheduler(),
+            job_arrays=job_arrays,
+        )
+        submission.submit(self)
+        self.submissions.append(submission)
+        self.history.append(WorkflowInteraction.SUBMIT, ref=submission.index)
+
+        return submission
 
 
 @dataclass
@@ -0,0 +1,137 @@
+import pytest
+
+from hpcflow.actions import Action, ActionEnvironment, ActionScope, ActionScopeType
+from hpcflow.command_files import (
+    FileSpec,
+    InputFileGenerator,
+    InputFileGeneratorSource,
+    OutputFileParser,
+    OutputFileParserSource,
+)
+from hpcflow.commands import Command
+from hpcflow.environment import Environment
+from hpcflow.parameters import InputValue, Parameter, ValueSequence
+from hpcflow.task import TaskTemplate
+from hpcflow.task_schema import TaskSchema
+from hpcflow.workflow import WorkflowTemplate
+
+GENERATOR_SOURCE = """
+def generate_input_file(path, inputs):
+    (value,) = inputs.values()
+    path.write_text(str(value))
+"""
+
+PARSER_SOURCE = """
+import numpy as np
+
+def parse_output(files, options):
+    value = int(files["out_file"].read_text()) * options.get("factor", 1)
+    if options.get("as_array"):
+        return np.full(4, value)
+    return value
+"""
+
+
+def make_sweep_template(
+    sequences,
+    outputs=(),
+    commands=None,
+    actions=None,
+    environment=None,
+    generate_input=False,
+    parse_output=False,
+    parser_options=None,
+    loops=None,
+    objective="simulate",
+    **task_kwargs,
+):
+    """Make a template of a single task whose elements sweep over the given input
+    values.
+
+    Parameters
+    ----------
+    sequences
+        Map of input types to the values of that input for each element.
+    outputs
+        Output types of the task schema.
+    commands
+        Commands of the single action of the task schema. By default, the first input
+        is echoed.
+    actions
+        Actions of the task schema, used instead of a single action of `commands`.
+    environment
+        Environment of the single action; by default, "env_1".
+    generate_input
+        If True, the first input is written to "in.txt" by an input file generator.
+    parse_output
+        If True, the first output is parsed from "out.txt" by an output file parser.
+    parser_options
+        Options passed to the output file parser.
+    loops
+        Loops of the workflow template.
+    task_kwargs
+        Additional arguments of the task template, such as `resources`.
+    """
+    inputs = [Parameter(i) for i in sequences]
+    outputs = [Parameter(i) for i in outputs]
+    source_kwargs = {}
+    if actions is None:
+        generators = []
+        parsers = []
+        if generate_input:
+            generator = InputFileGenerator(
+                input_file=FileSpec("inp_file", name="in.txt"), inputs=inputs[:1]
+            )
+            generators.append(generator)
+            source_kwargs["input_file_generator_sources"] = [
+                InputFileGeneratorSource(generator, contents=GENERATOR_SOURCE)
+            ]
+        if parse_output:
+            parser = OutputFileParser(
+                output=outputs[0],
+                output_files=[FileSpec("out_file", name="out.txt")],
+                options=parser_options,
+            )
+            parsers.append(parser)
+            source_kwargs["output_file_parser_sources"] = [
+                OutputFileParserSource(parser, contents=PARSER_SOURCE)
+            ]
+        commands = commands or [f"echo <<parameter:{inputs[0].typ}>>"]
+        actions = [
+            Action(
+                commands=[Command(i) for i in commands],
+                environments=[
+                    ActionEnvironment(
+                        environment or Environment("env_1"),
+                        ActionScope(ActionScopeType.ALL),
+                    )
+                ],
+                input_file_generators=generators,
+                output_file_parsers=parsers,
+            )
+        ]
+    schema = TaskSchema(objective, actions=actions, inputs=inputs, outputs=outputs)
+    task = TaskTemplate(
+        schema,
+        inputs=[InputValue(i, value=None) for i in inputs],
+        sequences=[
+            ValueSequence(["inputs", typ], values, nesting_order=0)
+            for typ, values in sequences.items()
+        ],
+        nesting_order={("inputs", typ): 0 for typ in sequences},
+        **source_kwargs,
+        **task_kwargs,
+    )
+    return WorkflowTemplate([task], loops=loops)
+
+
+@pytest.fixture
+def sweep_workflow(tmp_path):
+    """Factory of single-task workflows, made in a temporary directory named `name`;
+    see `make_sweep_template`."""
+
+    def make(*args, name="wk", storage=None, **kwargs):
+        template = make_sweep_template(*args, **kwargs)
+        return template.make_workflow(tmp_path / name, storage=storage)
+
+    return make
@@ -1,8 +1,9 @@
 import pytest
 
-from hpcflow.actions import Action
+from hpcflow.actions import Action, ActionEnvironment, ActionScope, ActionScopeType
 from hpcflow.command_files import FileSpec, InputFileGenerator
 from hpcflow.commands import Command
+from hpcflow.environment import Environment
 from hpcflow.errors import MissingActionEnvironment
 from hpcflow.parameters import Parameter
 
@@ -55,3 +56,35 @@ def test_spec_raise_on_no_envs(dummy_action_spec_no_env):
 
 def test_1(dummy_action_kwargs_pre_proc):
     act = Action(**dummy_action_kwargs_pre_proc)
+
+
+def test_get_commands_action_env_most_specific_scope():
+    env_all = Environment("env_all")
+    env_main = Environment("env_main")
+    act = Action(
+        commands=[Command("ls")],
+        environments=[
+            ActionEnvironment(env_all, ActionScope(ActionScopeType.ALL)),
+            ActionEnvironment(env_main, ActionScope.main()),
+        ],
+    )
+    assert act.get_commands_action_env().environment.name == "env_main"
+
+
+@pytest.fixture
+def env_all():
+    return ActionEnvironment(Environment("env_1"), ActionScope(ActionScopeType.ALL))
+
+
+def test_resolve_actions_returns_shared_tuple(dummy_action_kwargs_pre_proc, env_all):
+    act = Action(environments=[env_all], **dummy_action_kwargs_pre_proc)
+    resolved = act.resolve_actions()
+    assert isinstance(resolved, tuple) and len(resolved) == 2
+    assert act.resolve_actions() is resolved
+
+
+def test_resolved_actions_are_immutable(dummy_commands_kwargs, env_all):
+    act = Action(environments=[env_all], **dummy_commands_kwargs)
+    (cmd_act,) = act.resolve_actions()
+    with pytest.raises(AttributeError):
+        cmd_act.commands = ()
@@ -0,0 +1,85 @@
+import errno
+import os
+
+import pytest
+
+from hpcflow import blobs
+from hpcflow.blobs import BlobStore
+from hpcflow.command_files import FileSpec, InputFile
+
+
+@pytest.fixture
+def blob_store(tmp_path):
+    return BlobStore(tmp_path / "blobs")
+
+
+def test_add_bytes_stored_once(blob_store):
+    hash_1 = blob_store.add_bytes(b"mesh")
+    hash_2 = blob_store.add_bytes(b"mesh")
+    assert hash_1 == hash_2 and hash_1 in blob_store
+    assert len([i for i in blob_store.root.rglob("*") if i.is_file()]) == 1
+
+
+def test_link_is_hard_link(blob_store, tmp_path):
+    content_hash = blob_store.add_bytes(b"mesh")
+    dests = [tmp_path / f"e{i}" / "mesh.txt" for i in range(3)]
+    for i in dests:
+        blob_store.link(content_hash, i)
+    assert all(i.read_bytes() == b"mesh" for i in dests)
+    assert os.stat(blob_store.get_blob_path(content_hash)).st_nlink == 4
+
+
+def test_link_falls_back_to_symlink(blob_store, tmp_path, monkeypatch):
+    content_hash = blob_store.add_bytes(b"mesh")
+
+    def no_link(src, dst):
+        raise OSError(errno.EXDEV, "cross-device link")
+
+    monkeypatch.setattr(os, "link", no_link)
+    dest = tmp_path / "e0" / "mesh.txt"
+    blob_store.link(content_hash, dest)
+    assert dest.is_symlink() and dest.read_bytes() == b"mesh"
+
+
+def test_ingest_deduplicates_existing_files(blob_store, tmp_path):
+    paths = [tmp_path / f"f{i}.txt" for i in range(3)]
+    for i in paths:
+        i.write_text("same")
+    hashes = {blob_store.ingest(i) for i in paths}
+    assert len(hashes) == 1
+    assert all(i.read_text() == "same" for i in paths)
+    assert len({os.stat(i).st_ino for i in paths}) == 1
+
+
+def test_rewritten_input_file_stored_under_new_hash(sweep_workflow, tmp_path):
+    path = tmp_path / "mesh.txt"
+    path.write_bytes(b"mesh_1")
+    input_file = InputFile(FileSpec("mesh", name="mesh.txt"), path=path)
+    workflow = sweep_workflow({"p1": [1]}, input_files=[input_file])
+    input_file.contents_hash  # cached by modification time and size
+    # a rewrite of the same size within the modification time granularity:
+    mtime_ns = path.stat().st_mtime_ns
+    path.write_bytes(b"mesh_2")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    ((_, content_hash),) = workflow.add_input_files_to_blob_store(0)
+    assert content_hash == blobs.hash_file(path)
+    assert workflow.blob_store.get_blob_path(content_hash).read_bytes() == b"mesh_2"
+
+
+def test_binary_input_file_hashed(tmp_path):
+    path = tmp_path / "mesh.bin"
+    path.write_bytes(bytes(range(256)))
+    input_file = InputFile(FileSpec("mesh", name="mesh.bin"), path=path)
+    assert input_file.contents_hash == blobs.hash_file(path)
+
+
+def test_input_files_shared_between_elements(sweep_workflow):
+    workflow = sweep_workflow(
+        {"p1": [1, 2, 3]},
+        commands=["cat mesh.txt > out.txt"],
+        input_files=[InputFile(FileSpec("mesh", name="mesh.txt"), contents="nodes")],
+    )
+    workflow.add_submission()
+    elem_dirs = [workflow.get_element_dir(0, i) for i in range(3)]
+    assert all(i.joinpath("out.txt").read_text() == "nodes" for i in elem_dirs)
+    assert len({os.stat(i / "mesh.txt").st_ino for i in elem_dirs}) == 1
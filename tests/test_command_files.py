@@ -0,0 +1,74 @@
+import hashlib
+import os
+
+import pytest
+
+from hpcflow import command_files
+from hpcflow.command_files import (
+    FileSpec,
+    InputFile,
+    clear_file_contents_cache,
+    get_file_contents,
+)
+
+
+@pytest.fixture
+def input_file(tmp_path):
+    clear_file_contents_cache()
+    path = tmp_path / "template.txt"
+    path.write_text("a = 1\n")
+    return InputFile(FileSpec("inp", name="in.txt"), path=path)
+
+
+def test_contents_served_from_cache(input_file):
+    assert input_file.contents == "a = 1\n"
+    stat = os.stat(input_file.path)
+    input_file.path.write_text("a = 2\n")  # same size
+    os.utime(input_file.path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert input_file.contents == "a = 1\n"
+
+
+def test_contents_reread_on_change(input_file):
+    assert input_file.contents == "a = 1\n"
+    input_file.path.write_text("a = 10\n")
+    assert input_file.contents == "a = 10\n"
+
+
+def test_memory_mapped_read(input_file, monkeypatch):
+    monkeypatch.setattr(command_files, "MMAP_THRESHOLD", 1)
+    input_file.path.write_bytes(b"a = 1\r\nb = 2\r\n")
+    assert input_file.contents == "a = 1\nb = 2\n"
+    assert (
+        input_file.contents_hash
+        == hashlib.sha256(input_file.path.read_bytes()).hexdigest()
+    )
+
+
+def test_contents_hash_path_matches_direct(input_file):
+    direct = InputFile(FileSpec("inp", name="in.txt"), contents="a = 1\n")
+    assert input_file.contents_hash == direct.contents_hash
+
+
+def test_contents_hash_path_matches_direct_in_locale_encoding(input_file, monkeypatch):
+    monkeypatch.setattr(
+        command_files.locale, "getpreferredencoding", lambda *args: "latin-1"
+    )
+    input_file.path.write_bytes("é = 1\n".encode("latin-1"))
+    direct = InputFile(FileSpec("inp", name="in.txt"), contents="é = 1\n")
+    assert input_file.contents == direct.contents
+    assert input_file.contents_hash == direct.contents_hash
+
+
+def test_cache_bounded_by_bytes(tmp_path, monkeypatch):
+    clear_file_contents_cache()
+    monkeypatch.setattr(command_files, "FILE_CONTENTS_CACHE_BYTES", 10)
+    paths = []
+    for name, text in (("a.txt", "123456"), ("b.txt", "123456"), ("c.txt", "x" * 20)):
+        paths.append(tmp_path / name)
+        paths[-1].write_text(text)
+        assert get_file_contents(paths[-1])["contents"] == text
+    cache = command_files._FILE_CONTENTS_CACHE
+    # "a.txt" is evicted, and the contents of "c.txt" are too large to cache:
+    assert [os.path.basename(i) for i in cache] == ["b.txt", "c.txt"]
+    assert "contents" not in cache[os.path.abspath(paths[2])]
+    assert command_files._file_contents_cache_bytes == 6
@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from hpcflow.command_files import FileSpec
+from hpcflow.commands import Command, CommandArgument, Placeholder
+from hpcflow.environment import ExecutableInstance
+from hpcflow.parameters import Parameter
+
+N = Placeholder("parameter", "n")
+INP = Placeholder("file", "inp")
+P1 = Placeholder("parameter", "p1")
+
+
+@pytest.fixture
+def executables():
+    return {"sim": ExecutableInstance(None, 4, "mpirun -np 4 sim")}
+
+
+@pytest.fixture
+def command():
+    return Command(
+        "<<executable:sim>> --n <<parameter:n>>",
+        arguments=[CommandArgument(["--input=", FileSpec("inp", name="in.txt")])],
+        stdout="log_<<parameter:n>>.txt",
+    )
+
+
+def test_template_compiled_once(command):
+    assert command.template is command.template
+    assert command.template.placeholders == (N, INP)
+
+
+def test_render_lines(command, executables):
+    columns = {N: [1, "a b"], INP: ["in.txt", "in.txt"]}
+    assert command.template.render(executables, columns, 2) == [
+        "mpirun -np 4 sim --n 1 --input=in.txt > log_1.txt",
+        "mpirun -np 4 sim --n 'a b' --input=in.txt > log_'a b'.txt",
+    ]
+
+
+def test_render_argv(command, executables):
+    columns = {N: [1, "a b"], INP: ["in.txt", "in.txt"]}
+    assert command.template.render_argv(executables, columns, 2) == [
+        ["mpirun", "-np", "4", "sim", "--n", "1", "--input=in.txt"],
+        ["mpirun", "-np", "4", "sim", "--n", "a b", "--input=in.txt"],
+    ]
+
+
+def test_render_shell_variables(command, executables):
+    line = command.template.render_shell(executables, {N: "ARG_0", INP: "ARG_1"})
+    assert (
+        line
+        == 'mpirun -np 4 sim --n "${ARG_0}" --input="${ARG_1}" > log_"${ARG_0}".txt'
+    )
+
+
+def test_executable_labels_in_arguments():
+    cmd = Command(
+        "<<executable:sim>>",
+        arguments=["--post=<<executable:post>>", "<<executable:sim>>"],
+    )
+    assert cmd.executable_labels == ("sim", "post")
+
+
+def test_parameter_argument_part():
+    cmd = Command("echo", arguments=[CommandArgument([Parameter("p1")])])
+    assert cmd.template.render({}, {P1: [3]}, 1) == ["echo 3"]
+
+
+def test_render_many_elements(command, executables):
+    num = 100_000
+    columns = {N: list(range(num)), INP: ["in.txt"] * num}
+    start = time.perf_counter()
+    lines = command.template.render(executables, columns, num)
+    assert time.perf_counter() - start < 5
+    assert (
+        lines[-1]
+        == f"mpirun -np 4 sim --n {num - 1} --input=in.txt > log_{num - 1}.txt"
+    )
+
+
+@pytest.mark.parametrize(
+    "string",
+    ["echo <<parameter:p1>>  # don't quote", "echo $'it\\'s' <<parameter:p1>>"],
+)
+def test_shell_rendering_does_not_split_command(string):
+    template = Command(string).template
+    assert template.placeholders == (P1,)
+    assert template.render_shell({}, {P1: "ARG_0"}).startswith("echo ")
+    with pytest.raises(ValueError):
+        template.render_argv({}, {P1: [1]}, 1)
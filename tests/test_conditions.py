@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from valida.conditions import Value
+
+from hpcflow.actions import (
+    Action,
+    ActionCondition,
+    ActionEnvironment,
+    ActionScope,
+    ActionScopeType,
+)
+from hpcflow.commands import Command
+from hpcflow.conditions import evaluate_action_conditions, evaluate_condition
+from hpcflow.environment import Environment
+from hpcflow.schedulers import DirectScheduler
+from hpcflow.submission import make_job_arrays
+
+
+@pytest.fixture
+def workflow(sweep_workflow):
+    env = ActionEnvironment(Environment("env_1"), ActionScope(ActionScopeType.ALL))
+    act_small = Action(
+        commands=[Command("echo small > out.txt")],
+        environments=[env],
+        conditions=[ActionCondition(["inputs", "p1"], Value.lt(3))],
+    )
+    act_large = Action(
+        commands=[Command("echo large > out.txt")],
+        environments=[env],
+        conditions=[ActionCondition(["inputs", "p1"], Value.gte(3))],
+    )
+    return sweep_workflow({"p1": [1, 2, 3, 4]}, actions=[act_small, act_large])
+
+
+@pytest.mark.parametrize(
+    "condition,expected",
+    [
+        (Value.gt(2), [False, False, True, True]),
+        (Value.in_([1, 4]), [True, False, False, True]),
+        (Value.in_range(2, 4), [False, True, True, False]),
+        (Value.gt(1) & Value.lt(4), [False, True, True, False]),
+        (Value.lt(2) | Value.gt(3), [True, False, False, True]),
+    ],
+)
+def test_vectorised_matches_valida(condition, expected):
+    values = [1, 2, 3, 4]
+    assert evaluate_condition(condition, values).tolist() == expected
+    assert [condition.test(i) for i in values] == expected
+
+
+def test_non_numeric_column_falls_back_to_valida():
+    condition = Value.equal_to("a")
+    values = ["a", "b", None, "a"]
+    assert evaluate_condition(condition, values).tolist() == [True, False, False, True]
+
+
+def test_action_inclusion_bitmap(workflow):
+    inclusion = evaluate_action_conditions(workflow.template, 0)
+    assert inclusion.dtype == np.bool_
+    assert inclusion.tolist() == [
+        [True, False],
+        [True, False],
+        [False, True],
+        [False, True],
+    ]
+    subset = evaluate_action_conditions(workflow.template, 0, element_indices=[3, 0])
+    assert subset.tolist() == [[False, True], [True, False]]
+
+
+def test_job_arrays_split_by_included_actions(workflow):
+    job_arrays = make_job_arrays(workflow, 0, [0, 1, 2, 3])
+    assert [i.element_indices for i in job_arrays] == [[0, 1], [2, 3]]
+    assert [i.condition_signatures for i in job_arrays] == [
+        ((True, False),),
+        ((False, True),),
+    ]
+
+
+def test_submitted_elements_run_included_actions(workflow):
+    workflow.add_submission(scheduler=DirectScheduler())
+    outputs = [
+        workflow.get_element_dir(0, i).joinpath("out.txt").read_text().strip()
+        for i in range(4)
+    ]
+    assert outputs == ["small", "small", "large", "large"]
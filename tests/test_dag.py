@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from hpcflow.actions import Action, ActionEnvironment, ActionScope
+from hpcflow.commands import Command
+from hpcflow.dag import CSRGraph, ReadyCounter, WorkflowDAG
+from hpcflow.environment import Environment
+from hpcflow.errors import DependencyCycleError
+from hpcflow.parameters import InputValue, Parameter, ValueSequence
+from hpcflow.task import TaskTemplate
+from hpcflow.task_schema import TaskSchema
+from hpcflow.workflow import WorkflowTemplate
+
+
+def make_schema(objective, input_type, output_type):
+    act = Action(
+        commands=[Command("echo 1")],
+        environments=[ActionEnvironment(Environment("env_1"), ActionScope.main())],
+    )
+    return TaskSchema(
+        objective,
+        actions=[act],
+        inputs=[Parameter(input_type)],
+        outputs=[Parameter(output_type)],
+    )
+
+
+@pytest.fixture
+def workflow_template():
+    task_1 = TaskTemplate(
+        make_schema("t1", "p1", "p2"),
+        inputs=[InputValue(Parameter("p1"), value=0)],
+        sequences=[ValueSequence(["inputs", "p1"], [1, 2, 3], nesting_order=0)],
+        nesting_order={("inputs", "p1"): 0},
+    )
+    task_2 = TaskTemplate(make_schema("t2", "p2", "p2"))
+    return WorkflowTemplate([task_1, task_2])
+
+
+@pytest.fixture
+def graph():
+    # 0 -> 1 -> 3, 0 -> 2 -> 3, 4 (isolated)
+    return CSRGraph.from_edges(5, [0, 0, 1, 2, 0], [1, 2, 3, 3, 1])
+
+
+def test_from_edges_removes_duplicates(graph):
+    assert graph.num_edges == 4
+    assert graph.successors(0).tolist() == [1, 2]
+    assert graph.transpose().successors(3).tolist() == [1, 2]
+
+
+def test_topological_order(graph):
+    assert graph.get_levels().tolist() == [0, 1, 1, 2, 0]
+    assert graph.topological_order().tolist() == [0, 4, 1, 2, 3]
+
+
+def test_cycle_raises():
+    with pytest.raises(DependencyCycleError):
+        CSRGraph.from_edges(3, [0, 1, 2], [1, 2, 1]).get_levels()
+
+
+def test_closure(graph):
+    assert graph.closure([1]).tolist() == [3]
+    assert graph.transpose().closure([3]).tolist() == [0, 1, 2]
+
+
+def test_ready(graph):
+    completed = np.zeros(5, dtype=bool)
+    assert graph.get_ready(completed).tolist() == [0, 4]
+    completed[[0, 1]] = True
+    assert graph.get_ready(completed).tolist() == [2, 4]
+
+
+def test_ready_counter(graph):
+    completed = np.zeros(5, dtype=bool)
+    completed[4] = True
+    counter = ReadyCounter(graph, completed)
+    assert counter.num_incomplete.tolist() == [0, 1, 1, 2, 0]
+    assert counter.complete([0]).tolist() == [1, 2]
+    assert counter.complete([1]).tolist() == []
+    assert counter.complete([2]).tolist() == [3]
+
+
+def test_task_outputs_source_wired_per_element(workflow_template):
+    assert workflow_template.tasks[1].num_elements == 3
+    workflow_template.set_element_outputs(0, {1: {"p2": 42}})
+    assert workflow_template.get_input_value(1, 1, ("inputs", "p2")) == 42
+
+
+def test_workflow_dag(tmp_path, workflow_template):
+    dag = workflow_template.make_workflow(tmp_path / "wk").dag
+    assert dag.task_graph.successors(0).tolist() == [1]
+    nodes_1 = dag.get_element_nodes(0)
+    nodes_2 = dag.get_element_nodes(1)
+    assert [dag.element_graph.successors(i).tolist() for i in nodes_1] == [
+        [i] for i in nodes_2
+    ]
+    assert dag.get_upstream_elements([nodes_2[2]]).tolist() == [nodes_1[2]]
+    assert dag.get_element_local_indices(nodes_2).tolist() == [0, 1, 2]
+    assert dag.element_task[nodes_2].tolist() == [1, 1, 1]
+
+
+def test_workflow_dag_persisted_and_rebuilt(tmp_path, workflow_template):
+    workflow = workflow_template.make_workflow(tmp_path / "wk")
+    dag = workflow.dag
+    loaded = WorkflowDAG.load(workflow.root["dag"])
+    assert np.array_equal(loaded.element_graph.indices, dag.element_graph.indices)
+
+    new_elems = workflow_template.add_loop_iteration(1, [0], "p2")
+    rebuilt = workflow.dag
+    assert rebuilt.num_elements == dag.num_elements + 1
+    new_node = rebuilt.get_element_nodes(1, new_elems)[0]
+    assert rebuilt.element_graph_T.successors(new_node).tolist() == [
+        rebuilt.get_element_nodes(1, [0])[0]
+    ]
@@ -0,0 +1,85 @@
+import pytest
+
+from hpcflow.env_snapshot import (
+    EnvironmentSnapshotCache,
+    capture_environment_snapshot,
+    get_setup_hash,
+)
+from hpcflow.environment import Environment
+from hpcflow.executor import LocalExecutor
+from hpcflow.schedulers import DirectScheduler
+
+
+@pytest.fixture
+def make_workflow(sweep_workflow):
+    def make(count_path, snapshot_setup=True):
+        env = Environment(
+            "env_1",
+            setup=[f"echo run >> {count_path}", "export HPCFLOW_TEST_VAR=abc"],
+            snapshot_setup=snapshot_setup,
+        )
+        return sweep_workflow(
+            {"p1": [1, 2, 3]},
+            commands=['echo "${HPCFLOW_TEST_VAR}" > out.txt'],
+            environment=env,
+        )
+
+    return make
+
+
+def get_element_outputs(workflow):
+    return [
+        workflow.get_element_dir(0, i).joinpath("out.txt").read_text().strip()
+        for i in range(3)
+    ]
+
+
+def test_capture_records_changed_and_removed_variables(monkeypatch):
+    monkeypatch.setenv("HPCFLOW_TEST_A", "1")
+    monkeypatch.setenv("HPCFLOW_TEST_B", "2")
+    setup = [
+        "echo a=b",
+        "export HPCFLOW_TEST_A=3",
+        "unset HPCFLOW_TEST_B",
+        "export HPCFLOW_TEST_C=$'x\\ny'",
+    ]
+    snapshot = capture_environment_snapshot(setup)
+    assert snapshot.setup_hash == get_setup_hash(setup)
+    assert snapshot.set_vars == {"HPCFLOW_TEST_A": "3", "HPCFLOW_TEST_C": "x\ny"}
+    assert snapshot.unset_vars == ["HPCFLOW_TEST_B"]
+    env = snapshot.apply({"HPCFLOW_TEST_B": "2", "OTHER": "4"})
+    assert env == {"OTHER": "4", "HPCFLOW_TEST_A": "3", "HPCFLOW_TEST_C": "x\ny"}
+
+
+def test_cache_captures_once(tmp_path):
+    count_path = tmp_path / "count.txt"
+    cache = EnvironmentSnapshotCache()
+    setup = (f"echo run >> {count_path}",)
+    assert cache.get(setup) is cache.get(setup)
+    assert len(cache) == 1
+    assert count_path.read_text().splitlines() == ["run"]
+
+
+def test_executor_runs_setup_once(tmp_path, make_workflow):
+    count_path = tmp_path / "count.txt"
+    workflow = make_workflow(count_path)
+    results = LocalExecutor(max_cores=2).execute(workflow, task_index=0)
+    assert all(i.success for i in results)
+    assert get_element_outputs(workflow) == ["abc"] * 3
+    assert len(count_path.read_text().splitlines()) == 1
+
+
+def test_executor_runs_setup_per_element_without_snapshot(tmp_path, make_workflow):
+    count_path = tmp_path / "count.txt"
+    workflow = make_workflow(count_path, snapshot_setup=False)
+    LocalExecutor(max_cores=2).execute(workflow, task_index=0)
+    assert get_element_outputs(workflow) == ["abc"] * 3
+    assert len(count_path.read_text().splitlines()) == 3
+
+
+def test_jobscript_replays_snapshot(tmp_path, make_workflow):
+    count_path = tmp_path / "count.txt"
+    workflow = make_workflow(count_path)
+    workflow.add_submission(scheduler=DirectScheduler())
+    assert get_element_outputs(workflow) == ["abc"] * 3
+    assert len(count_path.read_text().splitlines()) == 1
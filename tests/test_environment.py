@@ -0,0 +1,72 @@
+import pytest
+
+from hpcflow.environment import (
+    Environment,
+    Executable,
+    ExecutableInstance,
+    NumCores,
+)
+
+
+@pytest.fixture
+def executable():
+    return Executable(
+        label="sim",
+        instances=[
+            ExecutableInstance("serial", 1, "sim"),
+            ExecutableInstance(
+                "mpi", {"start": 2, "stop": 16, "step": 2}, "mpirun sim"
+            ),
+            ExecutableInstance("openmp", {"start": 1, "stop": 8}, "sim_omp"),
+        ],
+    )
+
+
+def test_num_cores_contains_with_step():
+    num_cores = NumCores(start=2, stop=10, step=4)
+    assert [i for i in range(12) if i in num_cores] == [2, 6, 10]
+
+
+def test_num_cores_contains_default_step():
+    num_cores = NumCores(start=1, stop=4)
+    assert 0 not in num_cores and 1 in num_cores and 4 in num_cores
+    assert 5 not in num_cores
+
+
+def test_filter_instances_by_parallel_mode_and_num_cores(executable):
+    assert [i.command for i in executable.filter_instances("mpi", 4)] == ["mpirun sim"]
+    assert executable.filter_instances("mpi", 3) == []
+    assert [i.command for i in executable.filter_instances(num_cores=1)] == [
+        "sim",
+        "sim_omp",
+    ]
+    assert len(executable.filter_instances()) == 3
+
+
+def test_filter_instances_memoised_result_not_shared(executable):
+    out = executable.filter_instances("serial", 1)
+    out.clear()
+    assert len(executable.filter_instances("serial", 1)) == 1
+
+
+def test_filter_instances_index_rebuilt_on_add(executable):
+    assert executable.filter_instances("mpi", 32) == []
+    executable.add_instance(ExecutableInstance("mpi", 32, "mpirun sim_big"))
+    assert [i.command for i in executable.filter_instances("mpi", 32)] == [
+        "mpirun sim_big"
+    ]
+
+
+def test_filter_instances_index_rebuilt_on_reassignment(executable):
+    assert len(executable.filter_instances("serial")) == 1
+    executable.instances = [ExecutableInstance("mpi", 4, "mpirun sim")]
+    assert executable.filter_instances("serial") == []
+    assert len(executable.filter_instances("mpi", 4)) == 1
+
+
+def test_environment_get_executable_instance(executable):
+    env = Environment(name="env_1", executables=[executable])
+    assert env.get_executable_instance("sim", "openmp", 8).command == "sim_omp"
+    assert env.get_executable_instance("sim", "openmp", 9) is None
+    with pytest.raises(AttributeError):
+        env.get_executable_instance("other")
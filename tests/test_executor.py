@@ -0,0 +1,171 @@
+import time
+
+import pytest
+
+from hpcflow.actions import Action, ActionEnvironment, ActionScope, ActionScopeType
+from hpcflow.commands import Command
+from hpcflow.environment import Environment
+from hpcflow.errors import InsufficientCoresError
+from hpcflow.executor import ElementRun, LocalExecutor
+from hpcflow.metrics import RunMetricsStore
+from hpcflow.parameters import InputValue, Parameter, ValueSequence
+from hpcflow.task import TaskTemplate
+from hpcflow.task_schema import TaskSchema
+from hpcflow.workflow import WorkflowTemplate
+
+
+@pytest.fixture
+def workflow(sweep_workflow):
+    return sweep_workflow(
+        {"p1": [1, 2, 3, 4, 5]},
+        outputs=["p2"],
+        commands=["echo $(( $(cat in.txt) + 1 )) > out.txt"],
+        generate_input=True,
+        parse_output=True,
+        parser_options={"factor": 2},
+    )
+
+
+def get_outputs(workflow):
+    template = workflow.template
+    map_idx = template.elements[0]["outputs"][0]["parameter_mapping_index"]
+    return [template.parameter_data[i] for i in template.parameter_mapping[map_idx]]
+
+
+def test_execute_writes_outputs(workflow):
+    results = LocalExecutor(max_cores=2).execute(workflow, task_index=0)
+    assert all(i.success for i in results)
+    assert get_outputs(workflow) == [
+        {"is_set": True, "data": (i + 1) * 2} for i in [1, 2, 3, 4, 5]
+    ]
+
+
+def test_outputs_written_in_batches(workflow):
+    batches = []
+    executor = LocalExecutor(max_cores=2, batch_size=2)
+    executor.run(
+        [ElementRun(0, i, workflow.get_element_dir(0, i), steps=[]) for i in range(5)],
+        on_batch=lambda batch: batches.append(len(batch)),
+    )
+    assert sum(batches) == 5 and max(batches) <= 3 and len(batches) >= 2
+
+
+def test_failed_step_reported(workflow, tmp_path):
+    run = ElementRun(
+        0, 0, tmp_path / "e0", steps=[{"type": "shell", "lines": ["exit 3"]}]
+    )
+    (result,) = LocalExecutor(max_cores=1).run([run])
+    assert not result.success and result.exit_code == 3
+
+
+def test_killed_step_exit_code(tmp_path):
+    run = ElementRun(
+        0, 0, tmp_path / "e0", steps=[{"type": "shell", "lines": ["kill -9 $$"]}]
+    )
+    (result,) = LocalExecutor(max_cores=1).run([run])
+    assert result.exit_code == -9
+
+
+def test_core_slots_limit_concurrency(tmp_path):
+    # each element records the number of concurrently running elements:
+    lines = [
+        "touch ../running_$$",
+        "ls ../ | grep -c running_ > count.txt",
+        "sleep 0.2",
+        "rm ../running_$$",
+    ]
+    runs = [
+        ElementRun(
+            0,
+            i,
+            tmp_path / f"e{i}",
+            steps=[{"type": "shell", "lines": lines}],
+            num_cores=2,
+        )
+        for i in range(4)
+    ]
+    results = LocalExecutor(max_cores=4).run(runs)
+    assert all(i.success for i in results)
+    counts = [int((tmp_path / f"e{i}" / "count.txt").read_text()) for i in range(4)]
+    assert max(counts) <= 2
+
+
+def test_raise_on_insufficient_cores(tmp_path):
+    run = ElementRun(0, 0, tmp_path, steps=[], num_cores=8)
+    with pytest.raises(InsufficientCoresError):
+        LocalExecutor(max_cores=4).run([run])
+
+
+def make_two_task_workflow(path, sleep_times):
+    env = ActionEnvironment(Environment("env_1"), ActionScope(ActionScopeType.ALL))
+    schema_1 = TaskSchema(
+        "upstream",
+        actions=[
+            Action(
+                commands=[Command("sleep <<parameter:p1>>")],
+                environments=[env],
+            )
+        ],
+        inputs=[Parameter("p1")],
+        outputs=[Parameter("p2")],
+    )
+    schema_2 = TaskSchema(
+        "downstream",
+        actions=[
+            Action(commands=[Command("date +%s.%N > end.txt")], environments=[env])
+        ],
+        inputs=[Parameter("p2")],
+    )
+    task_1 = TaskTemplate(
+        schema_1,
+        inputs=[InputValue(Parameter("p1"), value=0)],
+        sequences=[ValueSequence(["inputs", "p1"], sleep_times, nesting_order=0)],
+        nesting_order={("inputs", "p1"): 0},
+    )
+    task_2 = TaskTemplate(schema_2)
+    return WorkflowTemplate([task_1, task_2]).make_workflow(path)
+
+
+def get_end_time(workflow, task_index, element_index):
+    elem_dir = workflow.get_element_dir(task_index, element_index)
+    return float(elem_dir.joinpath("end.txt").read_text())
+
+
+def test_execute_workflow_pipelines_elements(tmp_path):
+    workflow = make_two_task_workflow(tmp_path / "wk", [1.5, 0, 0])
+    start = time.time()
+    results = LocalExecutor(max_cores=3).execute_workflow(workflow)
+    assert len(results) == 6 and all(i.success for i in results)
+    # downstream elements of fast upstream elements do not wait for the slow one:
+    assert get_end_time(workflow, 1, 1) < start + 1.5
+    assert get_end_time(workflow, 1, 0) >= start + 1.5
+
+
+def test_execute_workflow_skips_downstream_of_failure(tmp_path):
+    workflow = make_two_task_workflow(tmp_path / "wk", [0, "bad", 0])
+    results = LocalExecutor(max_cores=2).execute_workflow(workflow)
+    failed = [(i.task_index, i.element_index) for i in results if not i.success]
+    assert failed == [(0, 1)]
+    assert sorted((i.task_index, i.element_index) for i in results) == [
+        (0, 0),
+        (0, 1),
+        (0, 2),
+        (1, 0),
+        (1, 2),
+    ]
+
+
+def test_execute_workflow_stores_metrics_in_batches(tmp_path, monkeypatch):
+    workflow = make_two_task_workflow(tmp_path / "wk", [0, 0, 0])
+    appended = []
+    append = RunMetricsStore.append
+
+    def record_append(self, task_index, results):
+        appended.append((task_index, len(results)))
+        return append(self, task_index, results)
+
+    monkeypatch.setattr(RunMetricsStore, "append", record_append)
+    LocalExecutor(max_cores=2, batch_size=6).execute_workflow(workflow)
+    # a single batch of all six elements, stored per task:
+    assert sorted(appended) == [(0, 3), (1, 3)]
+    assert len(workflow.metrics.read(1)) == 3
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from hpcflow.executor import ElementRunResult
+from hpcflow.export import (
+    export_hdf5,
+    export_parquet,
+    get_task_columns,
+    iter_column_batches,
+    iter_record_batches,
+    make_column,
+)
+from hpcflow.metrics import RunMetrics
+
+MATERIALS = [
+    {"name": "Al", "elastic": {"C11": 108.0, "C12": 62.0}},
+    {"name": "Ti", "elastic": {"C11": 162.0}},
+    {"name": "Mg", "elastic": {"C11": 59.0, "C12": 26.0}, "phases": ["a", "b"]},
+]
+
+
+@pytest.fixture
+def workflow(sweep_workflow):
+    workflow = sweep_workflow(
+        {"size": [1, 2, 3], "material": MATERIALS}, outputs=["stress"]
+    )
+    workflow.template.set_element_outputs(0, {0: {"stress": 1.5}, 2: {"stress": 0.5}})
+    workflow.metrics.append(
+        0,
+        [
+            ElementRunResult(0, i, 0, metrics=RunMetrics(0.0, 2.0, 2.0, 1.0, 10, "n1"))
+            for i in (0, 2)
+        ],
+    )
+    return workflow
+
+
+def test_make_column_types():
+    assert make_column([1, 2]).dtype == np.int64
+    assert make_column([1, 2.5]).dtype == float
+    assert make_column([True, False]).dtype == bool
+    assert make_column(["a", "b"]).tolist() == ["a", "b"]
+    assert make_column([[1], {"a": 1}]).tolist() == ["[1]", '{"a": 1}']
+    col = make_column([1.0, None], present=np.array([True, False]))
+    assert col.mask.tolist() == [False, True]
+
+
+def test_task_columns(workflow):
+    columns = get_task_columns(workflow, 0)
+    assert list(columns)[:1] == ["element_index"]
+    assert columns["inputs.size"].tolist() == [1, 2, 3]
+    assert columns["inputs.material.name"].tolist() == ["Al", "Ti", "Mg"]
+    assert columns["inputs.material.elastic.C11"].dtype == float
+    assert columns["inputs.material.elastic.C12"].tolist() == [62.0, None, 26.0]
+    assert columns["inputs.material.phases"].tolist() == [None, None, '["a", "b"]']
+    assert columns["outputs.stress"].tolist() == [1.5, None, 0.5]
+    assert columns["metrics.wall_time"].tolist() == [2.0, None, 2.0]
+    assert columns["metrics.hostname"].tolist() == ["n1", None, "n1"]
+
+
+def test_task_columns_parameters_only(workflow):
+    columns = get_task_columns(workflow, 0, include=("parameters",))
+    assert not any(i.startswith("metrics.") for i in columns)
+
+
+def test_column_batches(workflow):
+    columns = get_task_columns(workflow, 0)
+    batches = list(iter_column_batches(workflow, 0, batch_size=2))
+    assert [len(i["element_index"]) for i in batches] == [2, 1]
+    for name, column in columns.items():
+        # columns have the same dtype in all batches, even if a batch has no values:
+        assert [i[name].dtype for i in batches] == [column.dtype] * 2
+        joined = np.ma.concatenate([i[name] for i in batches])
+        assert joined.tolist() == column.tolist()
+
+
+def test_record_batches(workflow):
+    pa = pytest.importorskip("pyarrow")
+    batches = list(iter_record_batches(workflow, 0, batch_size=2))
+    assert [i.num_rows for i in batches] == [2, 1]
+    table = pa.Table.from_batches(batches)
+    assert table.column("inputs.material.elastic.C12").to_pylist() == [62.0, None, 26.0]
+    assert table.column("outputs.stress").null_count == 1
+
+
+def test_export_parquet(workflow, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    export_parquet(workflow, 0, tmp_path / "out.parquet", batch_size=2)
+    table = pq.read_table(tmp_path / "out.parquet")
+    assert table.column("inputs.size").to_pylist() == [1, 2, 3]
+
+
+def test_export_hdf5(workflow, tmp_path):
+    h5py = pytest.importorskip("h5py")
+    export_hdf5(workflow, 0, tmp_path / "out.h5", batch_size=2)
+    with h5py.File(tmp_path / "out.h5", "r") as fh:
+        group = fh["simulate"]
+        assert group["inputs.size"][:].tolist() == [1, 2, 3]
+        assert group["present"]["outputs.stress"][:].tolist() == [True, False, True]
+
+
+def test_missing_optional_dependency(workflow, tmp_path):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        with pytest.raises(ImportError, match="pyarrow"):
+            export_parquet(workflow, 0, tmp_path / "out.parquet")
+    else:
+        pytest.skip("pyarrow is installed")
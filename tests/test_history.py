@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import zarr
+
+from hpcflow.history import HistoryRecord, WorkflowHistory, WorkflowInteraction
+
+
+@pytest.fixture
+def history_group(tmp_path):
+    root = zarr.group(store=zarr.DirectoryStore(tmp_path / "wk.zarr"))
+    return root.create_group("history")
+
+
+def test_append_and_replay_order(history_group):
+    history = WorkflowHistory.create(history_group)
+    history.append(WorkflowInteraction.CREATE)
+    history.append(WorkflowInteraction.SUBMIT, ref=0)
+    history.append(WorkflowInteraction.STATUS_CHANGE, ref=0)
+    assert [(i.interaction, i.ref) for i in history.replay()] == [
+        (WorkflowInteraction.CREATE, -1),
+        (WorkflowInteraction.SUBMIT, 0),
+        (WorkflowInteraction.STATUS_CHANGE, 0),
+    ]
+
+
+def test_timestamp_round_trip_preserves_utc_offset(history_group):
+    history = WorkflowHistory.create(history_group)
+    ts = datetime(2022, 3, 1, 12, 30, 15, 123456, tzinfo=timezone(timedelta(hours=-5)))
+    history.append(WorkflowInteraction.EDIT, timestamp=ts)
+    record = next(history.replay())
+    assert record.timestamp == ts and record.timestamp.utcoffset() == ts.utcoffset()
+
+
+def test_compact_preserves_records(history_group):
+    history = WorkflowHistory.create(history_group)
+    for i in range(5):
+        history.append(WorkflowInteraction.EDIT, ref=i)
+    before = history.read()
+    history.compact()
+    assert history.tail.shape[0] == 0
+    assert history.log.shape[0] == 5
+    assert (history.read() == before).all()
+
+
+def test_automatic_compaction(history_group):
+    history = WorkflowHistory.create(history_group, compact_every=3)
+    for i in range(7):
+        history.append(WorkflowInteraction.EDIT, ref=i)
+    assert history.log.shape[0] == 6 and history.tail.shape[0] == 1
+    assert [i.ref for i in history.replay()] == list(range(7))
+
+
+def test_extend_single_write(history_group):
+    history = WorkflowHistory.create(history_group)
+    now = datetime.now(timezone.utc)
+    history.extend(
+        [HistoryRecord(now, WorkflowInteraction.SUBMIT, ref=i) for i in range(100)]
+    )
+    assert len(history) == 100
+    assert history.read()["ref"].tolist() == list(range(100))
+
+
+def test_reopen_existing_history(history_group):
+    WorkflowHistory.create(history_group).append(WorkflowInteraction.CREATE)
+    history = WorkflowHistory(history_group)
+    assert len(history) == 1
@@ -0,0 +1,54 @@
+import pytest
+from valida.conditions import Value
+
+from hpcflow.executor import LocalExecutor
+from hpcflow.loop import Loop, StoppingCriterion
+from hpcflow.parameters import Parameter
+
+
+@pytest.fixture
+def make_workflow(sweep_workflow):
+    def make(max_iterations=10):
+        loop = Loop(
+            parameter=Parameter("p1"),
+            stopping_criteria=StoppingCriterion(Parameter("p1"), Value.gte(10)),
+            maximum_iterations=max_iterations,
+        )
+        return sweep_workflow(
+            {"p1": [1, 3, 6]},
+            outputs=["p1"],
+            commands=["echo $(( $(cat in.txt) * 2 )) > out.txt"],
+            generate_input=True,
+            parse_output=True,
+            loops=[loop],
+        )
+
+    return make
+
+
+def test_converged_elements_drop_out(make_workflow):
+    workflow = make_workflow()
+    (result,) = workflow.run_loops(LocalExecutor(max_cores=2))
+    assert result.num_iterations.tolist() == [4, 2, 1]
+    assert result.converged.all() and not result.failed.any()
+    assert workflow.tasks[0].num_elements == 3 + 2 + 1 + 1
+    final = workflow.template.get_output_values(0, result.element_indices, "p1")
+    assert final == [16, 12, 12]
+
+
+def test_iterations_reference_earlier_data(make_workflow):
+    workflow = make_workflow(max_iterations=2)
+    template = workflow.template
+    num_data = len(template.parameter_data)
+    (result,) = workflow.run_loops(LocalExecutor(max_cores=1))
+    # one new output per unconverged element:
+    assert len(template.parameter_data) == num_data + 2
+    assert template.get_input_value(0, 3, ("inputs", "p1")) == 2
+    assert template.elements[template.tasks[0].element_indices[3]]["iteration"] == 1
+
+
+def test_maximum_iterations(make_workflow):
+    workflow = make_workflow(max_iterations=1)
+    (result,) = workflow.run_loops(LocalExecutor(max_cores=1))
+    assert result.num_iterations.tolist() == [1, 1, 1]
+    assert result.converged.tolist() == [False, False, True]
@@ -0,0 +1,71 @@
+import asyncio
+import socket
+import sys
+
+import numpy as np
+
+from hpcflow.executor import LocalExecutor
+from hpcflow.metrics import read_metrics_file
+from hpcflow.monitor import StatusMonitor
+from hpcflow.schedulers import DirectScheduler
+
+# allocate and touch the given number of mebibytes:
+ALLOCATE = (
+    "import sys; b = bytearray(int(sys.argv[1]) * 2**20); "
+    "b[::4096] = b'1' * len(b[::4096])"
+)
+ALLOCATE_COMMAND = f'{sys.executable} -c "{ALLOCATE}" <<parameter:p1>>'
+
+
+def test_metrics_recorded(sweep_workflow):
+    workflow = sweep_workflow({"p1": [1, 200]}, commands=[ALLOCATE_COMMAND])
+    LocalExecutor(max_cores=2).execute(workflow, task_index=0)
+    records = np.sort(workflow.metrics.read(0), order="element_index")
+    assert records["element_index"].tolist() == [0, 1]
+    assert records["exit_code"].tolist() == [0, 0]
+    assert np.all(records["wall_time"] > 0)
+    assert np.all(records["end_time"] >= records["start_time"])
+    assert np.all(records["cpu_time"] >= 0)
+    assert records["peak_rss"][1] > 200 * 2**20 > records["peak_rss"][0]
+    assert records["hostname"][0].decode() == socket.gethostname()[:64]
+
+
+def test_failed_run_metrics_recorded(sweep_workflow):
+    workflow = sweep_workflow({"p1": [1, "x"]}, commands=[ALLOCATE_COMMAND])
+    LocalExecutor(max_cores=1).execute(workflow, task_index=0)
+    assert workflow.metrics.read(0, element_indices=[1])["exit_code"].tolist() == [1]
+    assert workflow.metrics.get_column(0, "exit_code").size == 2
+
+
+def test_no_metrics_for_unexecuted_task(sweep_workflow):
+    workflow = sweep_workflow({"p1": [1]}, commands=[ALLOCATE_COMMAND])
+    assert workflow.metrics.read(0).size == 0
+
+
+def test_jobscript_metrics_ingested_when_job_array_finishes(sweep_workflow):
+    workflow = sweep_workflow({"p1": [1, 20]}, commands=[ALLOCATE_COMMAND, "exit 0"])
+    submission = workflow.add_submission(scheduler=DirectScheduler())
+    assert workflow.metrics.read(0).size == 0
+    asyncio.run(StatusMonitor(workflow).poll_once())
+    records = workflow.metrics.read(0)
+    assert records["element_index"].tolist() == [0, 1]
+    assert records["exit_code"].tolist() == [0, 0]
+    assert np.all(records["wall_time"] > 0)
+    assert np.all(records["cpu_time"] > 0)
+    assert np.all(records["peak_rss"] == -1)
+    assert records["hostname"][0].decode() == socket.gethostname()[:64]
+    # ingested metrics files are removed, so they are not ingested again:
+    job_array = submission.job_arrays[0]
+    assert not any(submission.get_metrics_dir(job_array).iterdir())
+    asyncio.run(StatusMonitor(workflow).poll_once())
+    assert workflow.metrics.read(0).size == 2
+
+
+def test_read_metrics_file(tmp_path):
+    path = tmp_path / "0"
+    path.write_text("3 100.25 102.5 node1\n0m0.010s 0m0.000s\n1m1.500s 0m0.250s\n")
+    run = read_metrics_file(path, element_index=4)
+    assert (run.element_index, run.exit_code) == (4, 3)
+    assert run.metrics.wall_time == 2.25
+    assert run.metrics.cpu_time == 61.75
+    assert run.metrics.hostname == "node1"
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import sys
+
+import pytest
+
+from hpcflow.monitor import StatusMonitor
+from hpcflow.schedulers import JobStatus, SGEScheduler, SlurmScheduler
+from hpcflow.submission import JobArray, Submission
+
+
+def make_scripted_exe(directory, name, outputs):
+    """Write an executable that prints the next of a sequence of outputs on each call,
+    and records its arguments."""
+    state_path = directory.joinpath(f"{name}_state.json")
+    state_path.write_text(json.dumps({"calls": [], "outputs": outputs}))
+    exe_path = directory.joinpath(name)
+    exe_path.write_text(
+        f"#!{sys.executable}\n"
+        f"import json, sys\n"
+        f"state = json.load(open({str(state_path)!r}))\n"
+        f"idx = min(len(state['calls']), len(state['outputs']) - 1)\n"
+        f"state['calls'].append(sys.argv[1:])\n"
+        f"json.dump(state, open({str(state_path)!r}, 'w'))\n"
+        f"print(state['outputs'][idx], end='')\n"
+    )
+    exe_path.chmod(0o755)
+    return exe_path, state_path
+
+
+@pytest.fixture
+def workflow(sweep_workflow):
+    return sweep_workflow({"p1": [0, 1, 2]}, commands=["ls"])
+
+
+def add_submitted(workflow, scheduler, job_arrays):
+    sub = Submission(len(workflow.submissions), scheduler, job_arrays)
+    workflow.submissions.append(sub)
+    return sub
+
+
+def test_single_query_for_all_job_arrays(workflow, tmp_path):
+    outputs = ["10_0 RUNNING\n10_1 PENDING\n11_0 PENDING\n"]
+    exe, state_path = make_scripted_exe(tmp_path, "squeue", outputs)
+    scheduler = SlurmScheduler(status_cmd=str(exe))
+    add_submitted(
+        workflow,
+        scheduler,
+        [
+            JobArray(0, [0, 1], {}, {}, job_ID="10"),
+            JobArray(0, [2], {}, {}, job_ID="11"),
+        ],
+    )
+    changes = asyncio.run(StatusMonitor(workflow).poll_once())
+    calls = json.loads(state_path.read_text())["calls"]
+    assert len(calls) == 1 and calls[0][-1] == "--jobs=10,11"
+    assert changes == {
+        (0, 0): JobStatus.RUNNING,
+        (0, 1): JobStatus.PENDING,
+        (0, 2): JobStatus.PENDING,
+    }
+
+
+def test_only_changes_reported(workflow, tmp_path):
+    outputs = [
+        "10_0 RUNNING\n10_1 PENDING\n",
+        "10_0 RUNNING\n10_1 RUNNING\n",
+        "10_1 RUNNING\n",
+        "",
+    ]
+    exe, _ = make_scripted_exe(tmp_path, "squeue", outputs)
+    add_submitted(
+        workflow,
+        SlurmScheduler(status_cmd=str(exe)),
+        [JobArray(0, [0, 1], {}, {}, job_ID="10")],
+    )
+    reported = []
+    monitor = StatusMonitor(
+        workflow, min_interval=0, max_interval=0, on_change=reported.append
+    )
+    monitor.watch()
+    assert reported == [
+        {(0, 0): JobStatus.RUNNING, (0, 1): JobStatus.PENDING},
+        {(0, 1): JobStatus.RUNNING},
+        {(0, 0): JobStatus.FINISHED},
+        {(0, 1): JobStatus.FINISHED},
+    ]
+    assert not monitor.get_active_job_arrays()
+
+
+def test_adaptive_interval(workflow, tmp_path):
+    outputs = ["10_0 RUNNING\n", "10_0 RUNNING\n", "10_0 RUNNING\n", ""]
+    exe, _ = make_scripted_exe(tmp_path, "squeue", outputs)
+    add_submitted(
+        workflow,
+        SlurmScheduler(status_cmd=str(exe)),
+        [JobArray(0, [0], {}, {}, job_ID="10")],
+    )
+    monitor = StatusMonitor(workflow, min_interval=1, max_interval=3, backoff=2)
+    intervals = []
+    for _ in range(4):
+        asyncio.run(monitor.poll_once())
+        intervals.append(monitor.interval)
+    assert intervals == [1, 2, 3, 1]
+
+
+def test_failed_status_query_keeps_statuses(workflow, tmp_path):
+    exe, _ = make_scripted_exe(tmp_path, "squeue", ["10_0 RUNNING\n"])
+    failing_exe = tmp_path.joinpath("squeue_failing")
+    failing_exe.write_text(
+        f"#!{sys.executable}\nimport sys\nsys.exit('socket timed out')\n"
+    )
+    failing_exe.chmod(0o755)
+    scheduler = SlurmScheduler(status_cmd=str(exe))
+    add_submitted(workflow, scheduler, [JobArray(0, [0, 1], {}, {}, job_ID="10")])
+    monitor = StatusMonitor(workflow)
+    asyncio.run(monitor.poll_once())
+
+    scheduler.status_cmd = str(failing_exe)
+    assert asyncio.run(monitor.poll_once()) == {}
+    assert monitor.element_status == {
+        (0, 0): JobStatus.RUNNING,
+        (0, 1): JobStatus.FINISHED,
+    }
+    assert len(monitor.get_active_job_arrays()) == 1
+
+
+def test_slurm_unknown_jobs_not_a_failure():
+    scheduler = SlurmScheduler()
+    assert scheduler.is_status_query_failure(1, "socket timed out")
+    assert not scheduler.is_status_query_failure(
+        1, "slurm_load_jobs error: Invalid job id specified"
+    )
+
+
+def test_sge_status_parsing():
+    stdout = (
+        "job-ID  prior   name       user         state submit/start at     queue    "
+        "                      slots ja-task-ID\n"
+        "------------------------------------------------------------------------\n"
+        "   20 0.55500 js_0.sh    user         r     03/01/2022 12:00:00 all.q@node1 "
+        "                       1 1\n"
+        "   20 0.00000 js_0.sh    user         qw    03/01/2022 12:00:00             "
+        "                       1 2-4:1\n"
+        "   21 0.00000 other.sh   user         Eqw   03/01/2022 12:00:00             "
+        "                       1\n"
+    )
+    assert SGEScheduler().parse_status_output(stdout) == {
+        "20": {
+            0: JobStatus.RUNNING,
+            1: JobStatus.PENDING,
+            2: JobStatus.PENDING,
+            3: JobStatus.PENDING,
+        },
+        "21": {0: JobStatus.ERROR},
+    }
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+import zarr
+
+from hpcflow.parsing import OutputParsingPipeline, build_parse_jobs
+
+
+@pytest.fixture
+def make_workflow(sweep_workflow):
+    def make(parser_options=None):
+        workflow = sweep_workflow(
+            {"p1": [1, 2, 3]},
+            outputs=["p2"],
+            commands=["echo 1 > out.txt"],
+            parse_output=True,
+            parser_options=parser_options,
+        )
+        for i in range(3):
+            elem_dir = workflow.get_element_dir(0, i)
+            elem_dir.mkdir(parents=True)
+            elem_dir.joinpath("out.txt").write_text(str(10 * i))
+        return workflow
+
+    return make
+
+
+def get_outputs(workflow):
+    return [
+        workflow.template.parameter_data[
+            workflow.template.get_element_output_data_indices(0, i)["p2"]
+        ]
+        for i in range(3)
+    ]
+
+
+def test_build_parse_jobs(make_workflow):
+    workflow = make_workflow()
+    jobs = build_parse_jobs(workflow, 0, [0, 2])
+    assert [(i.element_index, i.output) for i in jobs] == [(0, "p2"), (2, "p2")]
+
+
+def test_parse_writes_outputs(make_workflow):
+    workflow = make_workflow()
+    results = OutputParsingPipeline(max_workers=2, batch_size=2).parse(workflow, 0)
+    assert all(i.success for i in results)
+    assert get_outputs(workflow) == [{"is_set": True, "data": i} for i in (0, 10, 20)]
+
+
+def test_stream_yields_all_results(make_workflow):
+    workflow = make_workflow()
+    jobs = build_parse_jobs(workflow, 0, [0, 1, 2])
+    results = OutputParsingPipeline(max_workers=1).stream(iter(jobs))
+    assert sorted(i.value for i in results) == [0, 10, 20]
+
+
+def test_parse_error_reported(make_workflow):
+    workflow = make_workflow()
+    workflow.get_element_dir(0, 1).joinpath("out.txt").unlink()
+    results = OutputParsingPipeline(max_workers=1).parse(workflow, 0)
+    failed = [i for i in results if not i.success]
+    assert [i.element_index for i in failed] == [1]
+    assert "FileNotFoundError" in failed[0].error
+    assert get_outputs(workflow)[1]["is_set"] is False
+
+
+def test_large_array_stored_in_zarr(make_workflow):
+    workflow = make_workflow(parser_options={"as_array": True})
+    results = OutputParsingPipeline(max_workers=1, array_threshold=0).parse(workflow, 0)
+    assert all(i.array_path is not None and i.value is None for i in results)
+    outputs = get_outputs(workflow)
+    assert all(isinstance(i["data"], zarr.Array) for i in outputs)
+    assert np.array_equal(outputs[2]["data"][:], np.full(4, 20))
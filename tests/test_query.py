@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from valida.conditions import Value
+
+from hpcflow.query import ParameterQuery, parse_query_path
+
+SIZES = [5, 1, 3, 8, 3, 10]
+LOAD_CASES = ["uniaxial", "biaxial", "shear", "uniaxial", "shear", "biaxial"]
+
+
+@pytest.fixture
+def workflow(sweep_workflow):
+    return sweep_workflow({"size": SIZES, "load_case": LOAD_CASES}, outputs=["stress"])
+
+
+def test_parse_query_path(workflow):
+    assert parse_query_path(workflow.template, "tasks.simulate.inputs.size") == (
+        0,
+        ("inputs", "size"),
+    )
+    with pytest.raises(ValueError):
+        parse_query_path(workflow.template, "tasks.missing.inputs.size")
+    with pytest.raises(ValueError):
+        parse_query_path(workflow.template, "simulate.inputs.size")
+
+
+def test_query_range(workflow):
+    result = workflow.query(
+        "tasks.simulate.inputs.load_case",
+        where={"inputs.size": Value.greater_than(3)},
+    )
+    assert result.element_indices.tolist() == [0, 3, 5]
+    assert result.values == ["uniaxial", "uniaxial", "biaxial"]
+
+
+def test_query_equality_categorical(workflow):
+    result = workflow.query(
+        "tasks.simulate.inputs.size",
+        where={"inputs.load_case": Value.in_(["shear", "biaxial"])},
+    )
+    assert result.element_indices.tolist() == [1, 2, 4, 5]
+    assert result.values.tolist() == [1, 3, 3, 10]
+
+
+@pytest.mark.parametrize(
+    "condition",
+    [
+        Value.equal_to(3),
+        Value.not_equal_to(3),
+        Value.less_than(3),
+        Value.less_than_or_equal_to(3),
+        Value.greater_than_or_equal_to(3),
+        Value.in_([1, 10, 11]),
+        Value.greater_than(1) & Value.less_than(8),
+        Value.less_than(3) | Value.greater_than(5),
+        Value.in_range(2, 6),  # not indexed
+    ],
+)
+def test_query_matches_scan(workflow, condition):
+    result = workflow.query("tasks.simulate.inputs.size", where=condition)
+    expected = [idx for idx, i in enumerate(SIZES) if condition.test(i)]
+    assert result.element_indices.tolist() == expected
+
+
+def test_query_outputs_with_missing_values(workflow):
+    workflow.template.set_element_outputs(0, {0: {"stress": 2.5}, 3: {"stress": 0.5}})
+    result = workflow.query("tasks.simulate.outputs.stress", where=Value.less_than(3))
+    assert result.element_indices.tolist() == [0, 3]
+    assert result.values.tolist() == [2.5, 0.5]
+    # unset outputs are missing, and so do not satisfy order conditions:
+    result = workflow.query(
+        "tasks.simulate.outputs.stress", where=Value.greater_than(0)
+    )
+    assert result.element_indices.tolist() == [0, 3]
+
+
+def test_index_persisted_and_rebuilt(workflow):
+    query = ParameterQuery(workflow)
+    query.query("tasks.simulate.inputs.size", where=Value.greater_than(3))
+    group = workflow.root["parameters/columns/0/inputs.size"]
+    assert np.array_equal(group["sorted_values"][:], np.sort(SIZES))
+
+    # a column is rebuilt (without its index) only once its parameter is modified:
+    query.query("tasks.simulate.outputs.stress", where=Value.greater_than(0))
+    workflow.set_element_outputs(0, {0: {"stress": 1.0}})
+    assert "sorted_values" in query.get_column(0, ("inputs", "size")).group
+    column = query.get_column(0, ("outputs", "stress"))
+    assert "sorted_values" not in column.group
+    assert column.select(Value.equal_to(1.0)).tolist() == [0]
+    assert "sorted_values" in column.group
+
+
+def test_query_ints_outside_int64_range(sweep_workflow):
+    workflow = sweep_workflow({"p1": [1, 2**70, 3]})
+    result = workflow.query("tasks.simulate.inputs.p1", where=Value.equal_to(2**70))
+    assert result.element_indices.tolist() == [1]
+    assert result.values == [2**70]
+    result = workflow.query("tasks.simulate.inputs.p1", where=Value.greater_than(2))
+    assert result.element_indices.tolist() == [1, 2]
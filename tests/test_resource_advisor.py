@@ -0,0 +1,132 @@
+import numpy as np
+import pytest
+
+from hpcflow.executor import ElementRunResult
+from hpcflow.metrics import RunMetrics
+from hpcflow.resource_advisor import ResourceAdvisor, fit_resource
+from hpcflow.schedulers import SGEScheduler, SlurmScheduler
+from hpcflow.submission import make_job_arrays
+
+RESOURCES = {"main": {"num_cores": 1}}
+
+
+def record_metrics(workflow, wall_times, peak_rss, exit_codes=None):
+    exit_codes = exit_codes or [0] * len(wall_times)
+    workflow.metrics.append(
+        0,
+        [
+            ElementRunResult(
+                task_index=0,
+                element_index=idx,
+                exit_code=code,
+                metrics=RunMetrics(0.0, wall, wall, wall, rss, "node1"),
+            )
+            for idx, (wall, rss, code) in enumerate(
+                zip(wall_times, peak_rss, exit_codes)
+            )
+        ],
+    )
+
+
+@pytest.fixture
+def history(sweep_workflow):
+    # wall time is 10 s per unit of p1, plus 5 s; memory is 100 MiB per unit of p1:
+    sizes = [1, 2, 3, 4, 5, 6]
+    workflow = sweep_workflow({"p1": sizes}, name="history", resources=RESOURCES)
+    record_metrics(
+        workflow, [10 * i + 5 for i in sizes], [i * 100 * 2**20 for i in sizes]
+    )
+    return workflow
+
+
+def test_fit_resource_linear():
+    fit = fit_resource([[1], [2], [3], [4]], [15, 25, 35, 45], ["p1"])
+    assert np.allclose(fit.coefficients, [5, 10])
+    assert fit.margin == pytest.approx(0)
+    assert fit.predict([[10]]) == pytest.approx([105])
+
+
+def test_fit_resource_too_few_samples():
+    fit = fit_resource([[1], [2]], [15, 25], ["p1"])
+    assert fit.parameters == []
+    assert fit.predict(np.zeros((3, 0))).tolist() == [25, 25, 25]
+
+
+def test_advise(sweep_workflow, history):
+    workflow = sweep_workflow({"p1": [10, 20]}, name="new", resources=RESOURCES)
+    advisor = ResourceAdvisor([history], headroom=1.2)
+    advice = advisor.advise(workflow, 0)
+    # 105 s * 1.2 rounded up to whole minutes; 1000 MiB * 1.2 rounded up to 64 MiB:
+    assert advice.walltime.tolist() == [180, 300]
+    assert advice.memory.tolist() == [1216, 2432]
+    assert advice.resources == {"walltime": 300, "memory": 2432}
+
+
+def test_advise_not_below_similar_samples(sweep_workflow):
+    # wall time decreases with p1, so the linear fit extrapolates below zero:
+    sizes = [1, 2, 3, 4, 5, 6]
+    history = sweep_workflow({"p1": sizes}, name="history", resources=RESOURCES)
+    record_metrics(history, [700 - 100 * i for i in sizes], [2**20] * 6)
+    workflow = sweep_workflow({"p1": [20, 1]}, name="new", resources=RESOURCES)
+    advice = ResourceAdvisor([history], headroom=1.2).advise(workflow, 0)
+    # floored at the sample of the nearest p1 (100 s and 600 s), times the headroom:
+    assert advice.walltime.tolist() == [120, 720]
+
+
+def test_advise_ignores_failed_runs(sweep_workflow):
+    history = sweep_workflow({"p1": [1, 2]}, name="history", resources=RESOURCES)
+    record_metrics(history, [60, 3600], [2**20, 2**20], exit_codes=[0, 1])
+    workflow = sweep_workflow({"p1": [1]}, name="new", resources=RESOURCES)
+    advice = ResourceAdvisor([history], headroom=1).advise(workflow, 0)
+    assert advice.walltime.tolist() == [60]
+
+
+def test_advise_without_history(sweep_workflow):
+    workflow = sweep_workflow({"p1": [1]}, name="new", resources=RESOURCES)
+    advice = ResourceAdvisor([]).advise(workflow, 0)
+    assert advice.walltime.tolist() == [-1]
+    assert advice.resources == {}
+
+
+def test_apply_shared(sweep_workflow, history):
+    workflow = sweep_workflow({"p1": [10, 20]}, name="new", resources=RESOURCES)
+    ResourceAdvisor([history]).apply(workflow, 0)
+    for elem_idx in range(2):
+        assert workflow.template.get_input_value(0, elem_idx, ("resources",)) == {
+            "main": {"num_cores": 1, "walltime": 300, "memory": 2432}
+        }
+    assert len(make_job_arrays(workflow, 0, [0, 1])) == 1
+
+
+def test_apply_per_element(sweep_workflow, history):
+    workflow = sweep_workflow({"p1": [10, 20, 10]}, name="new", resources=RESOURCES)
+    ResourceAdvisor([history]).apply(workflow, 0, per_element=True)
+    main_res = [
+        workflow.template.get_input_value(0, i, ("resources", "main")) for i in range(3)
+    ]
+    assert (
+        main_res[0] == main_res[2] == {"num_cores": 1, "walltime": 180, "memory": 1216}
+    )
+    assert main_res[1]["walltime"] == 300
+    job_arrays = make_job_arrays(workflow, 0, [0, 1, 2])
+    assert sorted(i.element_indices for i in job_arrays) == [[0, 2], [1]]
+
+
+def test_resource_directives():
+    resources = {"walltime": 90061, "memory": 1216}
+    assert SlurmScheduler().format_directives(2, resources)[1:] == [
+        "#SBATCH --time=25:01:01",
+        "#SBATCH --mem=1216M",
+    ]
+    # resident memory is not requested as SGE's virtual memory limit:
+    assert SGEScheduler().format_directives(2, resources)[-1] == "#$ -l h_rt=25:01:01"
+    # SGE virtual memory is per slot:
+    resources = {"vmem": 1216, "num_cores": 4}
+    assert SGEScheduler().format_directives(2, resources)[-1] == "#$ -l h_vmem=304M"
+
+
+def test_sge_parallel_environment_directive():
+    resources = {"num_cores": 4}
+    assert SGEScheduler().format_directives(2, resources)[-1] == "#$ -pe smp.pe 4"
+    scheduler = SGEScheduler(parallel_environment="mpi-rr")
+    assert scheduler.format_directives(2, resources)[-1] == "#$ -pe mpi-rr 4"
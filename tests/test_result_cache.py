@@ -0,0 +1,61 @@
+import pytest
+
+from hpcflow.executor import LocalExecutor
+from hpcflow.result_cache import ResultCache, get_element_fingerprint
+
+
+@pytest.fixture
+def make_workflow(sweep_workflow):
+    def make(values, name="wk", memoise=True):
+        return sweep_workflow(
+            {"p1": values},
+            name=name,
+            outputs=["p2"],
+            commands=["echo $(( $HPCFLOW_NUM_CORES * 7 )) > out.txt"],
+            parse_output=True,
+            memoise=memoise,
+        )
+
+    return make
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(tmp_path / "cache")
+
+
+def test_results_reused_between_workflows(make_workflow, cache):
+    executor = LocalExecutor(max_cores=2, result_cache=cache)
+    first = executor.execute(make_workflow([1, 2], name="wk1"), 0)
+    assert not any(i.from_cache for i in first)
+
+    workflow = make_workflow([1, 2], name="wk2")
+    second = executor.execute(workflow, 0)
+    assert all(i.from_cache for i in second)
+    assert [i.outputs for i in second] == [{"p2": 7}, {"p2": 7}]
+    assert workflow.get_element_dir(0, 1).joinpath("out.txt").read_text() == "7\n"
+
+
+def test_fingerprint_depends_on_inputs(make_workflow):
+    workflow = make_workflow([1, 1, 2])
+    fingerprints = [get_element_fingerprint(workflow, 0, i) for i in range(3)]
+    assert fingerprints[0] == fingerprints[1] != fingerprints[2]
+
+
+def test_task_opt_out(make_workflow, cache):
+    executor = LocalExecutor(max_cores=1, result_cache=cache)
+    for name in ("wk1", "wk2"):
+        workflow = make_workflow([1], name=name, memoise=False)
+        results = executor.execute(workflow, 0)
+        assert not results[0].from_cache
+    assert cache.size == 0
+
+
+def test_lru_eviction(tmp_path):
+    cache = ResultCache(tmp_path / "cache", max_size=200)
+    cache.put("aa01", {"p": "x" * 50})
+    cache.put("aa02", {"p": "y" * 50})
+    assert cache.get("aa01") is not None  # now most recently used
+    cache.put("aa03", {"p": "z" * 50})
+    assert "aa01" in cache and "aa03" in cache and "aa02" not in cache
+    assert not cache.get_entry_dir("aa02").exists()
@@ -0,0 +1,154 @@
+import numpy as np
+import pytest
+
+from hpcflow.actions import Action, ActionEnvironment, ActionScope
+from hpcflow.commands import Command
+from hpcflow.dag import CSRGraph
+from hpcflow.environment import Environment
+from hpcflow.executor import ElementRun, LocalExecutor
+from hpcflow.parameters import InputValue, Parameter, ValueSequence
+from hpcflow.scheduling import (
+    CriticalPathPolicy,
+    RuntimeHistory,
+    compare_policies,
+    get_critical_path_priorities,
+    get_schema_key,
+    simulate_makespan,
+)
+from hpcflow.submission import make_job_arrays
+from hpcflow.task import TaskTemplate
+from hpcflow.task_schema import TaskSchema
+from hpcflow.workflow import Workflow, WorkflowTemplate
+
+
+def make_two_task_workflow(path):
+    env = ActionEnvironment(Environment("env_1"), ActionScope.main())
+    schema_1 = TaskSchema(
+        "upstream",
+        actions=[Action(commands=[Command("echo 1")], environments=[env])],
+        inputs=[Parameter("p1")],
+        outputs=[Parameter("p2")],
+    )
+    schema_2 = TaskSchema(
+        "downstream",
+        actions=[Action(commands=[Command("echo 2")], environments=[env])],
+        inputs=[Parameter("p2")],
+    )
+    task_1 = TaskTemplate(
+        schema_1,
+        inputs=[InputValue(Parameter("p1"), value=0)],
+        sequences=[ValueSequence(["inputs", "p1"], [0, 1, 2], nesting_order=0)],
+        nesting_order={("inputs", "p1"): 0},
+    )
+    return WorkflowTemplate([task_1, TaskTemplate(schema_2)]).make_workflow(path)
+
+
+@pytest.fixture
+def graph():
+    # three short independent nodes, and a short node followed by a long node:
+    return CSRGraph.from_edges(5, [3], [4])
+
+
+RUNTIMES = [1, 1, 1, 1, 10]
+
+
+def test_critical_path_priorities(graph):
+    priorities = get_critical_path_priorities(graph, RUNTIMES)
+    assert priorities.tolist() == [1, 1, 1, 11, 10]
+
+
+def test_critical_path_priorities_chain():
+    graph = CSRGraph.from_edges(4, [0, 0, 1, 2], [1, 2, 3, 3])
+    priorities = get_critical_path_priorities(graph, [1, 2, 5, 1])
+    assert priorities.tolist() == [7, 3, 6, 1]
+
+
+def test_simulated_makespan(graph):
+    assert simulate_makespan(graph, RUNTIMES, max_cores=2) == 12
+    assert compare_policies(graph, RUNTIMES, max_cores=2) == {
+        "fifo": 12,
+        "critical_path": 11,
+    }
+
+
+def test_runtime_history(tmp_path):
+    history = RuntimeHistory(tmp_path / "runtimes.sqlite")
+    assert history.estimate("simulate") is None
+    history.record("simulate", [1.0, 2.0, 4.0])
+    assert sorted(history.get_runtimes("simulate")) == [1.0, 2.0, 4.0]
+    assert history.estimate("simulate") == 2.0
+
+
+def test_runs_started_in_priority_order(tmp_path):
+    log = tmp_path / "order.txt"
+    runs = [
+        ElementRun(
+            0,
+            i,
+            tmp_path / f"e{i}",
+            steps=[{"type": "shell", "lines": [f"echo {i} >> {log}"]}],
+            priority=priority,
+        )
+        for i, priority in enumerate([0, 5, 1])
+    ]
+    LocalExecutor(max_cores=1).run(runs)
+    assert log.read_text().split() == ["1", "2", "0"]
+
+
+def test_policy_uses_recorded_runtimes(tmp_path):
+    workflow = make_two_task_workflow(tmp_path / "wk")
+    history = RuntimeHistory(tmp_path / "runtimes.sqlite")
+    LocalExecutor(max_cores=2, runtime_history=history).execute_workflow(workflow)
+    assert history.get_runtimes(get_schema_key(workflow.tasks[0].template)).size == 3
+
+    history.record(get_schema_key(workflow.tasks[1].template), [100.0] * 10)
+    policy = CriticalPathPolicy(history, default_runtime=1.0)
+    runtimes = policy.estimate_runtimes(workflow)
+    assert np.all(runtimes[workflow.dag.get_element_nodes(1)] == 100.0)
+    priorities = policy.get_priorities(workflow)
+    assert np.all(priorities[workflow.dag.get_element_nodes(0)] > 100.0)
+
+
+def test_dag_loaded_once_per_execution(tmp_path, monkeypatch):
+    workflow = make_two_task_workflow(tmp_path / "wk")
+    policy = CriticalPathPolicy(RuntimeHistory(tmp_path / "runtimes.sqlite"))
+    dag_property = Workflow.dag
+    loads = []
+
+    def load_dag(workflow):
+        loads.append(workflow)
+        return dag_property.fget(workflow)
+
+    monkeypatch.setattr(Workflow, "dag", property(load_dag))
+    executor = LocalExecutor(max_cores=2, policy=policy)
+    executor.execute(workflow, 0, element_indices=[0])
+    executor.execute(workflow, 0, element_indices=[1, 2])
+    assert len(loads) == 2
+    executor.execute_workflow(workflow, filter={1: None})
+    assert len(loads) == 3
+
+
+def test_job_arrays_ordered_by_task_depth(tmp_path):
+    workflow = make_two_task_workflow(tmp_path / "wk")
+    job_arrays = make_job_arrays(workflow, 1, [0, 1, 2]) + make_job_arrays(
+        workflow, 0, [0, 1, 2]
+    )
+    policy = CriticalPathPolicy(RuntimeHistory(tmp_path / "runtimes.sqlite"))
+    ordered = policy.order_job_arrays(workflow, job_arrays)
+    assert [i.task_index for i in ordered] == [0, 1]
+
+
+def test_job_arrays_of_loop_iterations_ordered_by_dependency(tmp_path, sweep_workflow):
+    workflow = sweep_workflow(
+        {"p1": [0, 1]}, outputs=["p1"], commands=["echo 1"], objective="iterate"
+    )
+    new_elements = workflow.template.add_loop_iteration(0, [0, 1], "p1")
+    # both iterations are of the same task, and have equal priorities:
+    job_arrays = make_job_arrays(workflow, 0, new_elements) + make_job_arrays(
+        workflow, 0, [0, 1]
+    )
+    policy = CriticalPathPolicy(
+        RuntimeHistory(tmp_path / "runtimes.sqlite"), default_runtime=0.0
+    )
+    ordered = policy.order_job_arrays(workflow, job_arrays)
+    assert [i.element_indices for i in ordered] == [[0, 1], new_elements]
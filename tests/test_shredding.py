@@ -0,0 +1,200 @@
+import numpy as np
+import pytest
+import zarr
+
+from hpcflow.export import get_task_columns
+from hpcflow.parameters import Parameter
+from hpcflow.shredding import (
+    ShreddedParameter,
+    ShreddedParameterStore,
+    flatten_value,
+    get_column_kind,
+    shred_values,
+)
+from hpcflow.task import TaskTemplate
+from hpcflow.task_schema import TaskSchema
+
+MATERIALS = [
+    {"name": "Al", "elastic": {"C11": 108.0, "C12": 62.0}, "grains": [1, 2, 3]},
+    {"name": "Ti", "elastic": {"C11": 162.0}},
+    {"name": "Mg", "elastic": {"C11": 59.0, "C12": 26.0}, "phases": ["a", "b"]},
+    {"name": "Fe", "elastic": {"C11": 230.0}, "grains": [4]},
+]
+
+
+@pytest.fixture
+def workflow(sweep_workflow):
+    return sweep_workflow({"material": MATERIALS}, outputs=["stress"])
+
+
+def test_flatten_value():
+    assert flatten_value(MATERIALS[2], ("inputs", "material")) == {
+        ("inputs", "material", "name"): "Mg",
+        ("inputs", "material", "elastic", "C11"): 59.0,
+        ("inputs", "material", "elastic", "C12"): 26.0,
+        ("inputs", "material", "phases"): ["a", "b"],
+    }
+    assert flatten_value(1.0) == {(): 1.0}
+
+
+def test_column_kinds():
+    assert get_column_kind([1, 2]) == "int"
+    assert get_column_kind([1, 2.5]) == "float"
+    assert get_column_kind([True, False]) == "bool"
+    assert get_column_kind(["a"]) == "str"
+    assert get_column_kind([[1, 2.5], []]) == "list"
+    assert get_column_kind([["a"], {"b": 1}]) == "json"
+    assert get_column_kind([np.zeros(2), [1]]) == "object"
+    assert get_column_kind([1, 2**70]) == get_column_kind([[1, -(2**63) - 1]]) == "json"
+
+
+def test_ints_outside_int64_range(sweep_workflow):
+    workflow = sweep_workflow({"p1": [1, 2**70]})
+    store = ShreddedParameterStore(workflow)
+    assert store.get_values(0, ("inputs", "p1")) == [1, 2**70]
+
+
+def test_shred_values():
+    columns = shred_values(MATERIALS, present=np.array([True, True, False, True]))
+    assert columns[("elastic", "C12")][0] == [62.0, None, None, None]
+    assert columns[("elastic", "C12")][1].tolist() == [True, False, False, False]
+    assert ("phases",) not in columns  # only present elements are shredded
+
+
+def test_read_sub_parameter(workflow):
+    store = ShreddedParameterStore(workflow)
+    path = ("inputs", "material", "elastic", "C11")
+    assert store.get_values(0, path) == [108.0, 162.0, 59.0, 230.0]
+    assert store.get_values(0, path, element_indices=[3, 1]) == [230.0, 162.0]
+    assert store.get_values(0, path[:3] + ("C12",)) == [62.0, None, 26.0, None]
+
+
+def test_sub_parameter_reads_only_its_columns(workflow):
+    param = ShreddedParameterStore(workflow).get_parameter(0, ("inputs", "material"))
+    c11_idx = param.paths.index(("elastic", "C11"))
+    for col_idx in range(len(param.paths)):
+        if col_idx != c11_idx:
+            del param.group[str(col_idx)]
+    assert param.get_values(("elastic", "C11")) == [108.0, 162.0, 59.0, 230.0]
+
+
+def test_reassemble_values(workflow):
+    store = ShreddedParameterStore(workflow)
+    assert store.get_values(0, ("inputs", "material")) == MATERIALS
+    assert store.get_values(0, ("inputs", "material", "elastic"), [1]) == [
+        {"C11": 162.0}
+    ]
+
+
+def test_ragged_list_column(workflow):
+    store = ShreddedParameterStore(workflow)
+    param = store.get_parameter(0, ("inputs", "material"))
+    col_idx = param.paths.index(("grains",))
+    assert param.kinds[col_idx] == "list"
+    assert param.group[str(col_idx)]["offsets"][:].tolist() == [0, 3, 3, 3, 4]
+    column = param.read_column(col_idx, element_indices=[3, 0])
+    assert [i.tolist() for i in column.data] == [[4], [1, 2, 3]]
+    assert store.get_values(0, ("inputs", "material", "grains", 1)) == [
+        2,
+        None,
+        None,
+        None,
+    ]
+    assert store.get_values(0, ("inputs", "material", "phases")) == [
+        None,
+        None,
+        ["a", "b"],
+        None,
+    ]
+
+
+def test_outputs_presence(workflow):
+    workflow.template.set_element_outputs(0, {1: {"stress": {"xx": 1.5}}})
+    store = ShreddedParameterStore(workflow)
+    assert store.get_values(0, ("outputs", "stress", "xx")) == [None, 1.5, None, None]
+
+
+def test_reshred_after_modification(workflow):
+    store = ShreddedParameterStore(workflow)
+    assert store.get_values(0, ("outputs", "stress")) == [None] * 4
+    workflow.template.set_element_outputs(0, {0: {"stress": 2.0}})
+    assert store.get_values(0, ("outputs", "stress")) == [2.0, None, None, None]
+
+
+def test_array_output(workflow, tmp_path):
+    # parsed array outputs may be NumPy arrays or arrays in a Zarr store:
+    stored = zarr.open_array(str(tmp_path / "stress.zarr"), mode="w", shape=(3,))
+    stored[:] = np.arange(3.0)
+    stress = {0: np.zeros(3), 2: stored}
+    workflow.template.set_element_outputs(
+        0, {k: {"stress": v} for k, v in stress.items()}
+    )
+    values = ShreddedParameterStore(workflow).get_values(0, ("outputs", "stress"))
+    assert [i is None for i in values] == [False, True, False, True]
+    assert values[2][:].tolist() == [0.0, 1.0, 2.0]
+
+    result = workflow.query("tasks.simulate.outputs.stress")
+    assert result.values[0].tolist() == [0.0, 0.0, 0.0]
+    columns = get_task_columns(workflow, 0, include=("parameters",))
+    assert columns["outputs.stress"].mask.tolist() == [False, True, False, True]
+
+
+def _no_full_shredding(*args, **kwargs):
+    raise AssertionError("parameter values were re-shredded in full")
+
+
+def test_outputs_shredded_on_write(workflow, monkeypatch):
+    store = workflow.parameters
+    template = workflow.template
+    input_version = template.get_parameter_version(0, ("inputs", "material"))
+    monkeypatch.setattr(ShreddedParameter, "create", _no_full_shredding)
+
+    workflow.set_element_outputs(0, {1: {"stress": {"xx": 1}}, 3: {"stress": 2.0}})
+    workflow.set_element_outputs(0, {1: {"stress": {"xx": 1.5}}})
+    workflow.set_element_outputs(0, {3: {"stress": {"xx": 2.5, "yy": 0.5}}})
+    assert store.get_values(0, ("outputs", "stress")) == [
+        None,
+        {"xx": 1.5},
+        None,
+        {"xx": 2.5, "yy": 0.5},
+    ]
+    param = store.get_parameter(0, ("outputs", "stress"))
+    assert param.kinds[param.paths.index(("xx",))] == "float"
+    assert param.group.attrs["version"] == template.get_parameter_version(
+        0, ("outputs", "stress")
+    )
+    # other parameters of the task are not invalidated:
+    assert template.get_parameter_version(0, ("inputs", "material")) == input_version
+    assert store.get_values(0, ("inputs", "material")) == MATERIALS
+
+
+def test_downstream_inputs_shredded_on_write(sweep_workflow, monkeypatch):
+    workflow = sweep_workflow({"p1": [1, 2, 3]}, outputs=["p2"])
+    schema = TaskSchema(
+        "post",
+        actions=workflow.tasks[0].template.schemas[0].actions,
+        inputs=[Parameter("p2")],
+        outputs=[Parameter("p3")],
+    )
+    workflow.template.add_task(TaskTemplate(schema))
+    store = workflow.parameters
+    store.create(1)
+    assert store.get_values(1, ("inputs", "p2")) == [None] * 3
+
+    monkeypatch.setattr(ShreddedParameter, "create", _no_full_shredding)
+    workflow.set_element_outputs(0, {0: {"p2": 10}, 2: {"p2": 30}})
+    assert store.get_values(1, ("inputs", "p2")) == [10, None, 30]
+    assert store.get_values(1, ("outputs", "p3")) == [None] * 3
+
+
+def test_loop_iteration_shredded_on_write(sweep_workflow, monkeypatch):
+    workflow = sweep_workflow({"p1": [1, 2]}, outputs=["p1"])
+    store = workflow.parameters
+    monkeypatch.setattr(ShreddedParameter, "create", _no_full_shredding)
+    workflow.set_element_outputs(0, {0: {"p1": 5}, 1: {"p1": 6}})
+    new_elements = workflow.add_loop_iteration(0, [1, 0], "p1")
+    assert new_elements == [2, 3]
+    assert store.get_values(0, ("inputs", "p1")) == [1, 2, 6, 5]
+    assert store.get_values(0, ("outputs", "p1")) == [5, 6, None, None]
+    workflow.set_element_outputs(0, {3: {"p1": 7}})
+    assert store.get_values(0, ("outputs", "p1")) == [5, 6, None, 7]
@@ -0,0 +1,108 @@
+import numcodecs
+import numpy as np
+import pytest
+from click.testing import CliRunner
+from valida.conditions import Value
+
+from hpcflow.cli import cli
+from hpcflow.executor import ElementRunResult
+from hpcflow.metrics import RUN_METRICS_DTYPE, RunMetrics
+from hpcflow.storage import (
+    MIN_CHUNK_SIZE,
+    ArrayStorage,
+    StoreConfig,
+    get_auto_chunk_size,
+)
+from hpcflow.store_benchmark import (
+    format_benchmark_results,
+    make_parameter_mix,
+    run_store_benchmark,
+)
+
+
+def test_auto_chunk_size():
+    # about 1 MiB of float64 items, rounded down to a power of two:
+    assert get_auto_chunk_size(10**7, "f8") == 2**17
+    assert get_auto_chunk_size(None, "f8") == 2**17
+    assert get_auto_chunk_size(10**7, "f8", target_chunk_bytes=2**16) == 2**13
+    # small arrays get a single small chunk:
+    assert get_auto_chunk_size(1000, "f8") == 1024
+    assert get_auto_chunk_size(1, "f8") == MIN_CHUNK_SIZE
+    # records are larger than scalars, so fewer fit in a chunk:
+    assert get_auto_chunk_size(None, RUN_METRICS_DTYPE) == 2**13
+
+
+def test_compressors():
+    assert ArrayStorage(compressor="none").get_compressor() is None
+    blosc = ArrayStorage(compressor="blosc-zstd", clevel=3).get_compressor()
+    assert (blosc.cname, blosc.clevel) == ("zstd", 3)
+    assert isinstance(ArrayStorage(compressor="lz4").get_compressor(), numcodecs.LZ4)
+    with pytest.raises(ValueError):
+        ArrayStorage(compressor="snappy-ish")
+
+
+def test_store_config_round_trip():
+    config = StoreConfig(
+        arrays={"metrics": ArrayStorage(chunk_size=128, compressor="zstd")},
+        default=ArrayStorage(target_chunk_bytes=2**16),
+    )
+    assert StoreConfig.from_dict(config.to_dict()) == config
+    assert config.get("metrics").chunk_size == 128
+    assert config.get("dag").target_chunk_bytes == 2**16
+    with pytest.raises(ValueError):
+        StoreConfig(arrays={"unknown": ArrayStorage()})
+
+
+def test_workflow_store_config(sweep_workflow):
+    config = StoreConfig(
+        arrays={
+            "metrics": ArrayStorage(chunk_size=128, compressor="none"),
+            "parameters": ArrayStorage(compressor="zstd"),
+        }
+    )
+    workflow = sweep_workflow({"p1": [1, 2, 3]}, storage=config)
+    assert workflow.storage == config
+
+    workflow.metrics.append(
+        0, [ElementRunResult(0, 0, 0, metrics=RunMetrics(0, 1, 1, 1, 1, "n1"))]
+    )
+    metrics_arr = workflow.root["metrics/0"]
+    assert metrics_arr.chunks == (128,) and metrics_arr.compressor is None
+
+    workflow.query("tasks.simulate.inputs.p1", where=Value.greater_than(1))
+    column = workflow.root["parameters/columns/0/inputs.p1"]
+    assert isinstance(column["values"].compressor, numcodecs.Zstd)
+    assert isinstance(column["sorted_order"].compressor, numcodecs.Zstd)
+
+    workflow.dag
+    assert workflow.root["dag/element_task"].chunks == (MIN_CHUNK_SIZE,)
+
+
+def test_store_benchmark(tmp_path):
+    storages = {
+        "blosc-lz4": ArrayStorage(),
+        "none": ArrayStorage(compressor="none"),
+    }
+    results = run_store_benchmark(
+        tmp_path / "bench", storages, num_elements=5000, num_element_ops=10
+    )
+    assert [i.label for i in results] == ["blosc-lz4", "none"]
+    assert results[0].stored_bytes < results[1].stored_bytes
+    assert all(i.write_throughput > 0 and i.element_read_time > 0 for i in results)
+    assert not list((tmp_path / "bench").iterdir())  # benchmark stores are removed
+    assert "blosc-lz4" in format_benchmark_results(results)
+
+
+def test_parameter_mix():
+    mix = make_parameter_mix(1000)
+    assert all(len(i) == 1000 for i in mix.values())
+    assert np.all(mix["metrics"]["end_time"] >= mix["metrics"]["start_time"])
+
+
+def test_benchmark_store_command(tmp_path):
+    result = CliRunner().invoke(
+        cli,
+        ["benchmark-store", str(tmp_path), "--num-elements", "1000"],
+    )
+    assert result.exit_code == 0
+    assert "blosc-zstd" in result.output
@@ -0,0 +1,285 @@
+import json
+import sys
+
+import pytest
+
+from hpcflow.actions import Action, ActionEnvironment, ActionScope
+from hpcflow.commands import Command
+from hpcflow.environment import Environment, Executable, ExecutableInstance
+from hpcflow.errors import (
+    JobArrayOrderError,
+    MissingCompatibleExecutableInstance,
+    SubmissionFailure,
+)
+from hpcflow.history import WorkflowInteraction
+from hpcflow.parameters import InputValue, Parameter, ValueSequence
+from hpcflow.schedulers import DirectScheduler, SGEScheduler, SlurmScheduler
+from hpcflow.submission import Submission, make_job_arrays
+from hpcflow.task import TaskTemplate
+from hpcflow.task_schema import TaskSchema
+from hpcflow.workflow import WorkflowTemplate
+
+
+def make_fake_scheduler_exe(directory, name, stdout, exit_code=0):
+    """Write an executable that records its arguments and prints a job ID."""
+    log_path = directory.joinpath(f"{name}_calls.jsonl")
+    exe_path = directory.joinpath(name)
+    exe_path.write_text(
+        f"#!{sys.executable}\n"
+        f"import json, sys\n"
+        f"with open({str(log_path)!r}, 'a') as fh:\n"
+        f"    fh.write(json.dumps(sys.argv[1:]) + '\\n')\n"
+        f"print({stdout!r})\n"
+        f"sys.exit({exit_code})\n"
+    )
+    exe_path.chmod(0o755)
+    return exe_path, log_path
+
+
+def read_calls(log_path):
+    return [json.loads(i) for i in log_path.read_text().splitlines()]
+
+
+@pytest.fixture
+def environment():
+    return Environment(
+        name="env_1",
+        setup="source /opt/env_1/activate",
+        executables=[
+            Executable(
+                label="sim",
+                instances=[
+                    ExecutableInstance("serial", 1, "sim_serial"),
+                    ExecutableInstance("mpi", {"start": 2, "stop": 8}, "mpirun sim"),
+                ],
+            )
+        ],
+    )
+
+
+@pytest.fixture
+def schema(environment):
+    act = Action(
+        commands=[Command("<<executable:sim>> run")],
+        environments=[ActionEnvironment(environment, ActionScope.main())],
+    )
+    return TaskSchema("simulate", actions=[act], inputs=[Parameter("p1")])
+
+
+def make_workflow(tmp_path, schema, resources_seq=None, num_p1=4):
+    sequences = [ValueSequence(["inputs", "p1"], list(range(num_p1)), nesting_order=0)]
+    nesting_order = {("inputs", "p1"): 0}
+    if resources_seq:
+        sequences.append(
+            ValueSequence(["resources", "main"], resources_seq, nesting_order=0)
+        )
+        nesting_order[("resources", "main")] = 0
+    task = TaskTemplate(
+        schema,
+        inputs=[InputValue(Parameter("p1"), value=0)],
+        sequences=sequences,
+        nesting_order=nesting_order,
+    )
+    return WorkflowTemplate([task]).make_workflow(tmp_path / "wk")
+
+
+def test_single_job_array_for_identical_resources(tmp_path, schema):
+    exe, log = make_fake_scheduler_exe(tmp_path, "sbatch", "123;cluster")
+    wk = make_workflow(tmp_path, schema)
+    sub = wk.add_submission(scheduler=SlurmScheduler(submit_cmd=str(exe)))
+    calls = read_calls(log)
+    assert len(sub.job_arrays) == 1 and len(calls) == 1
+    assert sub.job_arrays[0].element_indices == [0, 1, 2, 3]
+    assert sub.job_arrays[0].job_ID == "123"
+    assert calls[0] == ["--parsable", str(sub.job_arrays[0].jobscript_path)]
+
+
+def test_job_arrays_grouped_by_resources(tmp_path, schema):
+    exe, log = make_fake_scheduler_exe(tmp_path, "sbatch", "123")
+    resources = [
+        {"num_cores": 1, "parallel_mode": "serial"},
+        {"num_cores": 4, "parallel_mode": "mpi"},
+        {"num_cores": 1, "parallel_mode": "serial"},
+        {"num_cores": 4, "parallel_mode": "mpi"},
+    ]
+    wk = make_workflow(tmp_path, schema, resources_seq=resources)
+    sub = wk.add_submission(scheduler=SlurmScheduler(submit_cmd=str(exe)))
+    assert [i.element_indices for i in sub.job_arrays] == [[0, 2], [1, 3]]
+    assert [i.executable_instances["sim"].command for i in sub.job_arrays] == [
+        "sim_serial",
+        "mpirun sim",
+    ]
+    assert len(read_calls(log)) == 2
+    js_2 = sub.job_arrays[1].jobscript_path.read_text()
+    assert "#SBATCH --array=0-1" in js_2 and "#SBATCH --cpus-per-task=4" in js_2
+    assert "mpirun sim run" in js_2
+
+
+def test_sge_job_ID_and_array_directive(tmp_path, schema):
+    exe, log = make_fake_scheduler_exe(tmp_path, "qsub", "456.1-4:1")
+    wk = make_workflow(tmp_path, schema)
+    sub = wk.add_submission(scheduler=SGEScheduler(submit_cmd=str(exe)))
+    assert sub.job_arrays[0].job_ID == "456"
+    assert "#$ -t 1-4" in sub.job_arrays[0].jobscript_path.read_text()
+
+
+def test_sge_jobscript_runs_in_bash(tmp_path, schema):
+    exe, _ = make_fake_scheduler_exe(tmp_path, "qsub", "456.1-4:1")
+    wk = make_workflow(tmp_path, schema)
+    sub = wk.add_submission(scheduler=SGEScheduler(submit_cmd=str(exe)))
+    lines = sub.job_arrays[0].jobscript_path.read_text().splitlines()
+    # directives only take effect before the first command:
+    num_directives = next(i for i, j in enumerate(lines) if not j.startswith("#"))
+    assert "#$ -S /bin/bash" in lines[:num_directives]
+    assert "< <(sed" in lines[num_directives + 1]  # the index lookup requires bash
+
+
+def test_submission_filter(tmp_path, schema):
+    exe, _ = make_fake_scheduler_exe(tmp_path, "sbatch", "1")
+    wk = make_workflow(tmp_path, schema)
+    sub = wk.add_submission(
+        filter={0: [1, 3]}, scheduler=SlurmScheduler(submit_cmd=str(exe))
+    )
+    assert sub.job_arrays[0].element_indices == [1, 3]
+
+
+def test_submission_recorded_in_history(tmp_path, schema):
+    exe, _ = make_fake_scheduler_exe(tmp_path, "sbatch", "1")
+    wk = make_workflow(tmp_path, schema)
+    wk.add_submission(scheduler=SlurmScheduler(submit_cmd=str(exe)))
+    wk.add_submission(scheduler=SlurmScheduler(submit_cmd=str(exe)))
+    assert [(i.interaction, i.ref) for i in wk.history.replay()] == [
+        (WorkflowInteraction.CREATE, -1),
+        (WorkflowInteraction.SUBMIT, 0),
+        (WorkflowInteraction.SUBMIT, 1),
+    ]
+
+
+def test_raise_on_failed_submission(tmp_path, schema):
+    exe, _ = make_fake_scheduler_exe(tmp_path, "sbatch", "", exit_code=1)
+    wk = make_workflow(tmp_path, schema)
+    with pytest.raises(SubmissionFailure):
+        wk.add_submission(scheduler=SlurmScheduler(submit_cmd=str(exe)))
+
+
+def test_raise_on_incompatible_executable_instance(tmp_path, schema):
+    wk = make_workflow(tmp_path, schema, resources_seq=[{"num_cores": 16}] * 4)
+    with pytest.raises(MissingCompatibleExecutableInstance):
+        wk.add_submission(scheduler=SlurmScheduler(submit_cmd="sbatch"))
+
+
+def test_direct_scheduler_runs_each_element(tmp_path, environment):
+    act = Action(
+        commands=[Command("pwd > out.txt")],
+        environments=[ActionEnvironment(Environment("env_2"), ActionScope.main())],
+    )
+    schema = TaskSchema("simulate", actions=[act], inputs=[Parameter("p1")])
+    wk = make_workflow(tmp_path, schema, num_p1=3)
+    wk.add_submission(scheduler=DirectScheduler())
+    for elem_idx in range(3):
+        elem_dir = wk.get_element_dir(0, elem_idx)
+        assert elem_dir.joinpath("out.txt").read_text().strip() == str(elem_dir)
+
+
+def test_direct_scheduler_renders_parameter_placeholders(tmp_path):
+    act = Action(
+        commands=[Command("echo <<parameter:p1>> > out.txt")],
+        environments=[ActionEnvironment(Environment("env_2"), ActionScope.main())],
+    )
+    schema = TaskSchema("simulate", actions=[act], inputs=[Parameter("p1")])
+    wk = make_workflow(tmp_path, schema, num_p1=3)
+    wk.add_submission(scheduler=DirectScheduler())
+    outputs = [
+        wk.get_element_dir(0, i).joinpath("out.txt").read_text().strip()
+        for i in range(3)
+    ]
+    assert outputs == ["0", "1", "2"]
+
+
+def test_jobscript_independent_of_number_of_elements(tmp_path, schema):
+    exe, _ = make_fake_scheduler_exe(tmp_path, "sbatch", "1")
+    wk_1 = make_workflow(tmp_path / "a", schema, num_p1=2)
+    wk_2 = make_workflow(tmp_path / "b", schema, num_p1=50)
+    sub_1 = wk_1.add_submission(scheduler=SlurmScheduler(submit_cmd=str(exe)))
+    sub_2 = wk_2.add_submission(scheduler=SlurmScheduler(submit_cmd=str(exe)))
+    js_1 = sub_1.job_arrays[0].jobscript_path.read_text()
+    js_2 = sub_2.job_arrays[0].jobscript_path.read_text()
+    assert js_1.count("\n") == js_2.count("\n")
+    assert js_2.count("sim_serial run") == 1
+    index = sub_2.job_arrays[0].jobscript_path.with_suffix(".idx").read_text()
+    assert index.splitlines()[7].split("\x1f")[0] == str(wk_2.get_element_dir(0, 7))
+    assert len(index.splitlines()) == 50
+
+
+def make_two_task_workflow(tmp_path, resources_seq):
+    env = ActionEnvironment(Environment("env_2"), ActionScope.main())
+    schema_1 = TaskSchema(
+        "upstream",
+        actions=[Action(commands=[Command("echo 1")], environments=[env])],
+        inputs=[Parameter("p1")],
+        outputs=[Parameter("p2")],
+    )
+    schema_2 = TaskSchema(
+        "downstream",
+        actions=[Action(commands=[Command("echo 2")], environments=[env])],
+        inputs=[Parameter("p2")],
+    )
+    task_1 = TaskTemplate(
+        schema_1,
+        inputs=[InputValue(Parameter("p1"), value=0)],
+        sequences=[
+            ValueSequence(["inputs", "p1"], [0, 1, 2, 3], nesting_order=0),
+            ValueSequence(["resources", "main"], resources_seq, nesting_order=0),
+        ],
+        nesting_order={("inputs", "p1"): 0, ("resources", "main"): 0},
+    )
+    task_2 = TaskTemplate(schema_2)
+    return WorkflowTemplate([task_1, task_2]).make_workflow(tmp_path / "wk")
+
+
+def test_elementwise_job_array_dependency(tmp_path):
+    exe, log = make_fake_scheduler_exe(tmp_path, "sbatch", "123")
+    wk = make_two_task_workflow(tmp_path, [{"num_cores": 1}] * 4)
+    sub = wk.add_submission(scheduler=SlurmScheduler(submit_cmd=str(exe)))
+    assert [i.dependencies for i in sub.job_arrays] == [[], [(0, True)]]
+    assert "--dependency=aftercorr:123" in read_calls(log)[1]
+
+
+def test_non_elementwise_job_array_dependency(tmp_path):
+    exe, log = make_fake_scheduler_exe(tmp_path, "qsub", "456.1-4:1")
+    resources = [{"num_cores": 1}, {"num_cores": 2}] * 2
+    wk = make_two_task_workflow(tmp_path, resources)
+    sub = wk.add_submission(scheduler=SGEScheduler(submit_cmd=str(exe)))
+    assert [i.element_indices for i in sub.job_arrays] == [[0, 2], [1, 3], [0, 1, 2, 3]]
+    assert sub.job_arrays[2].dependencies == [(0, False), (1, False)]
+    assert read_calls(log)[2][:3] == ["-terse", "-hold_jid", "456,456"]
+
+
+def test_raise_on_dependency_on_later_job_array(tmp_path):
+    wk = make_two_task_workflow(tmp_path, [{"num_cores": 1}] * 4)
+    job_arrays = make_job_arrays(wk, 1, [0, 1, 2, 3]) + make_job_arrays(
+        wk, 0, [0, 1, 2, 3]
+    )
+    sub = Submission(0, DirectScheduler(), job_arrays)
+    with pytest.raises(JobArrayOrderError):
+        sub.resolve_dependencies(wk)
+
+
+def test_loop_iterations_in_dependent_job_arrays(sweep_workflow):
+    wk = sweep_workflow({"p1": [0, 1]}, outputs=["p1"], commands=["echo 1"])
+    new_elements = wk.template.add_loop_iteration(0, [0, 1], "p1")
+    job_arrays = make_job_arrays(wk, 0, new_elements + [0, 1])
+    assert [i.element_indices for i in job_arrays] == [[0, 1], new_elements]
+    sub = Submission(0, DirectScheduler(), job_arrays)
+    sub.resolve_dependencies(wk)
+    assert [i.dependencies for i in sub.job_arrays] == [[], [(0, True)]]
+
+
+def test_raise_on_dependency_within_job_array(sweep_workflow):
+    wk = sweep_workflow({"p1": [0, 1]}, outputs=["p1"], commands=["echo 1"])
+    new_elements = wk.template.add_loop_iteration(0, [0, 1], "p1")
+    job_array, _ = make_job_arrays(wk, 0, [0, 1] + new_elements)
+    job_array.element_indices = [0, 1] + new_elements
+    sub = Submission(0, DirectScheduler(), [job_array])
+    with pytest.raises(JobArrayOrderError):
+        sub.resolve_dependencies(wk)
@@ -1,7 +1,8 @@
 from multiprocessing import dummy
 import pytest
-from hpcflow.actions import Action
+from hpcflow.actions import Action, ActionEnvironment, ActionScope
 from hpcflow.commands import Command
+from hpcflow.environment import Environment
 
 from hpcflow.errors import InvalidIdentifier, MissingActionsError
 from hpcflow.task_schema import TaskObjective, TaskSchema
@@ -57,3 +58,39 @@ def test_method_lowercasing(dummy_schema_args):
     assert TaskSchema(method="MyMethod", **dummy_schema_args) == TaskSchema(
         method="mymethod", **dummy_schema_args
     )
+
+
+@pytest.fixture
+def schema_two_actions():
+    env = ActionEnvironment(Environment("env_1"), ActionScope.main())
+    return TaskSchema(
+        "simulate",
+        actions=[
+            Action(commands=[Command("ls")], environments=[env]),
+            Action(commands=[Command("pwd")], environments=[env]),
+        ],
+    )
+
+
+def test_resolve_actions_all_included_by_default(schema_two_actions):
+    resolved = schema_two_actions.resolve_actions()
+    assert [i.commands[0].command for i in resolved] == ["ls", "pwd"]
+
+
+def test_resolve_actions_excludes_by_signature(schema_two_actions):
+    resolved = schema_two_actions.resolve_actions((False, True))
+    assert [i.commands[0].command for i in resolved] == ["pwd"]
+
+
+def test_resolve_actions_shared_per_signature(schema_two_actions):
+    assert schema_two_actions.resolve_actions(
+        (True, False)
+    ) is schema_two_actions.resolve_actions([1, 0])
+    assert schema_two_actions.resolve_actions() is schema_two_actions.resolve_actions(
+        (True, True)
+    )
+
+
+def test_resolve_actions_raise_on_bad_signature_length(schema_two_actions):
+    with pytest.raises(ValueError):
+        schema_two_actions.resolve_actions((True,))
@@ -1,12 +1,38 @@
+import os
+
 import pytest
 
+from hpcflow.command_files import FileNameSpec
 from hpcflow.utils import (
+    clear_dir_listing_cache,
     get_duplicate_items,
     check_valid_py_identifier,
     group_by_dict_key_values,
+    search_dir_files_by_regex,
 )
 
 
+@pytest.fixture
+def count_scandir(monkeypatch):
+    clear_dir_listing_cache()
+    calls = []
+    real_scandir = os.scandir
+
+    def scandir(path):
+        calls.append(path)
+        return real_scandir(path)
+
+    monkeypatch.setattr(os, "scandir", scandir)
+    return calls
+
+
+def _make_old(directory):
+    """Set the modification time of a directory well before now, so its listing may be
+    cached."""
+    mtime = os.stat(directory).st_mtime_ns - 60 * 1_000_000_000
+    os.utime(directory, ns=(mtime, mtime))
+
+
 def test_get_list_duplicate_items_no_duplicates():
     lst = [1, 2, 3]
     assert not get_duplicate_items(lst)
@@ -131,3 +157,39 @@ def test_expected_return_group_by_dict_key_values_excluded_items_for_missing_key
         [item_1, item_3],
         [item_2],
     ]
+
+
+def test_search_dir_files_by_regex_lists_directory_once(tmp_path, count_scandir):
+    tmp_path.joinpath("out_1.txt").touch()
+    tmp_path.joinpath("out_2.txt").touch()
+    _make_old(tmp_path)
+    for _ in range(3):
+        vals = search_dir_files_by_regex(r"out_(\d+)\.txt", directory=tmp_path)
+        assert sorted(vals) == ["1", "2"]
+    assert len(count_scandir) == 1
+
+
+def test_search_dir_files_by_regex_relists_on_change(tmp_path, count_scandir):
+    tmp_path.joinpath("out_1.txt").touch()
+    assert search_dir_files_by_regex(r"out_(\d+)", directory=tmp_path) == ["1"]
+    tmp_path.joinpath("out_2.txt").touch()
+    vals = search_dir_files_by_regex(r"out_(\d+)", directory=tmp_path)
+    assert sorted(vals) == ["1", "2"]
+    assert len(count_scandir) == 2
+
+
+def test_search_dir_files_by_regex_relists_on_rename(tmp_path, count_scandir):
+    # a rename changes neither the link count nor (typically) the size of a directory:
+    tmp_path.joinpath("out_1.txt").touch()
+    assert search_dir_files_by_regex(r"out_(\d+)", directory=tmp_path) == ["1"]
+    tmp_path.joinpath("out_1.txt").rename(tmp_path.joinpath("out_2.txt"))
+    assert search_dir_files_by_regex(r"out_(\d+)", directory=tmp_path) == ["2"]
+
+
+def test_file_name_spec_regex_single_listing(tmp_path, count_scandir):
+    tmp_path.joinpath("result.dat").touch()
+    _make_old(tmp_path)
+    name = FileNameSpec(r"(result\.\w+)", is_regex=True)
+    assert name.value(tmp_path) == ["result.dat"]
+    name.value(tmp_path)
+    assert len(count_scandir) == 1
@@ -0,0 +1,33 @@
+import pytest
+
+from hpcflow.actions import Action, ActionEnvironment, ActionScope
+from hpcflow.commands import Command
+from hpcflow.environment import Environment
+from hpcflow.parameters import InputValue, Parameter, ValueSequence
+from hpcflow.task import TaskTemplate
+from hpcflow.task_schema import TaskSchema
+from hpcflow.workflow import WorkflowTemplate
+
+
+@pytest.fixture
+def schema():
+    act = Action(
+        commands=[Command("ls")],
+        environments=[ActionEnvironment(Environment("env_1"), ActionScope.main())],
+    )
+    return TaskSchema("simulate", actions=[act], inputs=[Parameter("p1")])
+
+
+def test_get_input_value_sub_value_update_does_not_modify_stored_data(schema):
+    task = TaskTemplate(
+        schema,
+        inputs=[InputValue(Parameter("p1"), value={"a": 0, "b": 1})],
+        sequences=[ValueSequence(["inputs", "p1", "a"], [1, 2], nesting_order=0)],
+        nesting_order={("inputs", "p1", "a"): 0},
+    )
+    wkt = WorkflowTemplate([task])
+    assert wkt.get_input_values(0, ("inputs", "p1")) == [
+        {"a": 1, "b": 1},
+        {"a": 2, "b": 1},
+    ]
+    assert wkt.parameter_data[0]["data"] == {"p1": {"a": 0, "b": 1}}